@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Address Canonicalization Utilities
+Vectorized pandas normalization of raw NPPES addresses into USPS standard forms before they are hashed.
+"""
+
+import re
+import time
+from typing import Callable, Dict
+
+import pandas as pd
+
+
+# USPS Publication 28 Appendix C1: common street suffixes and their misspellings -> standard abbreviation
+STREET_SUFFIXES = {
+    'ALLEY': 'ALY', 'ALLEE': 'ALY', 'ALLY': 'ALY',
+    'AVENUE': 'AVE', 'AV': 'AVE', 'AVEN': 'AVE', 'AVENU': 'AVE', 'AVN': 'AVE', 'AVNUE': 'AVE',
+    'BOULEVARD': 'BLVD', 'BOUL': 'BLVD', 'BOULV': 'BLVD',
+    'CENTER': 'CTR', 'CENTRE': 'CTR', 'CENTR': 'CTR', 'CNTR': 'CTR', 'CENT': 'CTR',
+    'CIRCLE': 'CIR', 'CIRC': 'CIR', 'CIRCL': 'CIR', 'CRCL': 'CIR',
+    'COURT': 'CT', 'CRT': 'CT',
+    'COVE': 'CV',
+    'CREEK': 'CRK',
+    'CROSSING': 'XING', 'CRSSNG': 'XING',
+    'DRIVE': 'DR', 'DRIV': 'DR', 'DRV': 'DR',
+    'EXPRESSWAY': 'EXPY', 'EXPRESS': 'EXPY', 'EXPW': 'EXPY', 'EXPR': 'EXPY',
+    'FREEWAY': 'FWY', 'FREEWY': 'FWY', 'FRWAY': 'FWY', 'FRWY': 'FWY',
+    'GARDENS': 'GDNS', 'GARDEN': 'GDN',
+    'GROVE': 'GRV',
+    'HEIGHTS': 'HTS', 'HTS': 'HTS',
+    'HIGHWAY': 'HWY', 'HIGHWY': 'HWY', 'HIWAY': 'HWY', 'HIWY': 'HWY', 'HWAY': 'HWY',
+    'HILL': 'HL',
+    'HOLLOW': 'HOLW',
+    'JUNCTION': 'JCT', 'JCTION': 'JCT', 'JUNCTN': 'JCT',
+    'LAKE': 'LK',
+    'LANE': 'LN',
+    'MEADOWS': 'MDWS',
+    'MOUNTAIN': 'MTN', 'MOUNT': 'MT',
+    'PARKWAY': 'PKWY', 'PARKWY': 'PKWY', 'PKWAY': 'PKWY', 'PKY': 'PKWY',
+    'PLACE': 'PL',
+    'PLAZA': 'PLZ', 'PLZA': 'PLZ',
+    'POINT': 'PT',
+    'RIDGE': 'RDG',
+    'ROAD': 'RD',
+    'ROUTE': 'RTE',
+    'SPRINGS': 'SPGS',
+    'SQUARE': 'SQ', 'SQR': 'SQ', 'SQRE': 'SQ',
+    'STATION': 'STA', 'STATN': 'STA',
+    'STREET': 'ST', 'STRT': 'ST', 'STR': 'ST',
+    'TERRACE': 'TER', 'TERR': 'TER',
+    'TRAIL': 'TRL', 'TRAILS': 'TRL',
+    'TURNPIKE': 'TPKE', 'TRNPK': 'TPKE', 'TURNPK': 'TPKE',
+    'VALLEY': 'VLY',
+    'VIEW': 'VW',
+    'VILLAGE': 'VLG',
+}
+
+# USPS Publication 28 Appendix B
+DIRECTIONALS = {
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
+}
+
+# USPS Publication 28 Appendix C2: secondary unit designators
+UNIT_DESIGNATORS = {
+    'APARTMENT': 'APT', 'BASEMENT': 'BSMT', 'BUILDING': 'BLDG', 'BLD': 'BLDG', 'DEPARTMENT': 'DEPT',
+    'FLOOR': 'FL', 'FLR': 'FL', 'FRONT': 'FRNT', 'HANGAR': 'HNGR', 'LOBBY': 'LBBY', 'LOWER': 'LOWR',
+    'OFFICE': 'OFC', 'PENTHOUSE': 'PH', 'ROOM': 'RM', 'SPACE': 'SPC', 'SUITE': 'STE', 'SUIT': 'STE',
+    'TRAILER': 'TRLR', 'UPPER': 'UPPR',
+}
+
+ADDRESS_COLUMNS = ['address_line_1', 'address_line_2', 'city', 'state', 'postal_code', 'country_code']
+
+
+class AddressNormalizer:
+    """Address canonicalization and processing utilities"""
+
+    # Bump whenever a rule below changes what an address canonicalizes to. Step50 keys its cached
+    # canonical forms on this and re-keys the existing addresses when it changes.
+    NORMALIZER_VERSION = '2'
+
+    _DESIGNATOR_ABBREVIATIONS = {
+        **UNIT_DESIGNATORS, **{abbreviation: abbreviation for abbreviation in UNIT_DESIGNATORS.values()}, 'UNIT': 'UNIT',
+    }
+    _DESIGNATOR_WORDS = '|'.join(sorted(_DESIGNATOR_ABBREVIATIONS, key=len, reverse=True))
+    _DIRECTIONAL_WORDS = '|'.join(sorted(set(DIRECTIONALS) | set(DIRECTIONALS.values()), key=len, reverse=True))
+    # A unit number: "200", "4B", "A-1", "B12" or a single letter as in "STE A"
+    _UNIT_ID = r'(?:[A-Z]{0,2}-?\d[A-Z0-9-]*|[A-Z])'
+    # Zero or more "STE 200" / "# 4" segments running to the end of the line
+    _TRAILING_UNITS = r'(?:\s+(?:(?:' + _DESIGNATOR_WORDS + r')\s*#?\s*|#\s*)' + _UNIT_ID + r')*$'
+
+    # "SUITE # 200" -> "STE 200", only when a unit number follows, so "FRONT ST" and "OFFICE PARK DR" keep their words
+    _UNIT_PATTERN = re.compile(
+        r'\b(' + _DESIGNATOR_WORDS + r')\s*#?\s*(' + _UNIT_ID + r')(?=' + _TRAILING_UNITS + r')'
+    )
+    # A suffix is abbreviated as the last word of the street, i.e. only followed by a post-directional and units
+    _SUFFIX_PATTERN = re.compile(
+        r'(?<=\S )(' + '|'.join(sorted(STREET_SUFFIXES, key=len, reverse=True)) + r')'
+        r'(?=(?:\s+(?:' + _DIRECTIONAL_WORDS + r'))?' + _TRAILING_UNITS + r')'
+    )
+    # Pre-directional after the house number with at least a street name and suffix after it ("100 NORTH MAIN ST"),
+    # so "100 SOUTH ST" keeps SOUTH as its street name
+    _PRE_DIRECTIONAL_PATTERN = re.compile(
+        r'^((?:\d\S*\s+)?)(' + '|'.join(sorted(DIRECTIONALS, key=len, reverse=True)) + r')(?=\s+\S+\s+\S)'
+    )
+    # Post-directional after a street word and before any units ("MAIN ST NORTH STE 2")
+    _POST_DIRECTIONAL_PATTERN = re.compile(
+        r'(?<=[A-Z] )(' + '|'.join(sorted(DIRECTIONALS, key=len, reverse=True)) + r')(?=' + _TRAILING_UNITS + r')'
+    )
+    _PO_BOX_PATTERN = re.compile(r'\b(?:P\s?O|POST\s+OFFICE)\s+BOX\b')
+
+    @staticmethod
+    def _for_each_distinct(values: pd.Series, canonicalize: Callable[[pd.Series], pd.Series]) -> pd.Series:
+        """
+        Apply a vectorized canonicalization to the distinct values only and broadcast the result back
+        NPPES repeats the same city, state and street lines across many NPIs, so this does most of the
+        string work once per distinct value instead of once per row.
+        """
+        codes, distinct_values = pd.factorize(values)
+        canonical_values = canonicalize(pd.Series(distinct_values, dtype='string')).to_numpy(dtype=object)
+        result = pd.Series(pd.NA, index=values.index, dtype='string')
+        is_present = codes >= 0
+        result[is_present] = canonical_values[codes[is_present]]
+        return result
+
+    @staticmethod
+    def _clean_text(text: pd.Series) -> pd.Series:
+        """Upper case, punctuation (except decimal points) removed, whitespace collapsed and empty strings made NULL"""
+        text = text.str.upper()
+        # A period between digits is a decimal point: "1.5 MILE RD" is not "15 MILE RD"
+        text = text.str.replace(r'(?<!\d)\.|\.(?!\d)', '', regex=True)
+        text = text.str.replace(r'[\'`"]', '', regex=True)
+        text = text.str.replace(r'[,;:]', ' ', regex=True)
+        text = text.str.replace(r'\s+', ' ', regex=True).str.strip()
+        return text.mask(text == '')
+
+    @staticmethod
+    def canonicalize_street_lines(lines: pd.Series) -> pd.Series:
+        """
+        USPS standard form of street lines, e.g. "123 North Main Street, Suite #200" -> "123 N MAIN ST STE 200"
+        Words are only abbreviated in their USPS position: unit designators before a trailing unit number,
+        suffixes as the last street word, and directionals before the street name or after the suffix.
+        "100 Front Street" is "100 FRONT ST", not "100 FRNT ST".
+        """
+        def canonicalize(text: pd.Series) -> pd.Series:
+            text = AddressNormalizer._clean_text(text.str.replace('#', ' # ', regex=False))
+            text = text.str.replace(AddressNormalizer._PO_BOX_PATTERN, 'PO BOX', regex=True)
+            text = text.str.replace(
+                AddressNormalizer._UNIT_PATTERN,
+                lambda match: f"{AddressNormalizer._DESIGNATOR_ABBREVIATIONS[match.group(1)]} {match.group(2)}",
+                regex=True
+            )
+            text = text.str.replace(
+                AddressNormalizer._SUFFIX_PATTERN, lambda match: STREET_SUFFIXES[match.group(1)], regex=True
+            )
+            text = text.str.replace(
+                AddressNormalizer._PRE_DIRECTIONAL_PATTERN,
+                lambda match: match.group(1) + DIRECTIONALS[match.group(2)],
+                regex=True
+            )
+            return text.str.replace(
+                AddressNormalizer._POST_DIRECTIONAL_PATTERN, lambda match: DIRECTIONALS[match.group(1)], regex=True
+            )
+        return AddressNormalizer._for_each_distinct(lines, canonicalize)
+
+    @staticmethod
+    def canonicalize_text(values: pd.Series) -> pd.Series:
+        """Case, punctuation and whitespace normalization for city, state and country values"""
+        return AddressNormalizer._for_each_distinct(values, AddressNormalizer._clean_text)
+
+    @staticmethod
+    def canonicalize_postal_codes(postal_codes: pd.Series, is_us: pd.Series) -> pd.Series:
+        """
+        US postal codes are cut to their 5 digit ZIP, dropping the +4
+        Other postal codes only get case and whitespace normalization.
+        """
+        us_zip = AddressNormalizer._for_each_distinct(
+            postal_codes, lambda codes: codes.str.replace(r'\D', '', regex=True).str.slice(0, 5)
+        )
+        us_zip = us_zip.mask(us_zip == '')
+        return us_zip.where(is_us, AddressNormalizer.canonicalize_text(postal_codes))
+
+    @staticmethod
+    def canonicalize_frame(address_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Canonicalize a chunk of intake.raw_address_import addresses in one pass
+        Expects the columns address_line_1, address_line_2, city, state, postal_code and country_code;
+        other columns (such as the raw address_hash) are passed through unchanged.
+        Returns: a new DataFrame with the address columns in canonical form
+        """
+        canonical_df = address_df.copy()
+        canonical_df['country_code'] = AddressNormalizer.canonicalize_text(address_df['country_code'].astype('string'))
+        # Step50 treats a missing country as US, so spell it out and let both forms hash alike
+        is_us = (canonical_df['country_code'].isna() | (canonical_df['country_code'] == 'US')).astype(bool)
+        canonical_df['country_code'] = canonical_df['country_code'].mask(is_us, 'US')
+        canonical_df['address_line_1'] = AddressNormalizer.canonicalize_street_lines(address_df['address_line_1'].astype('string'))
+        canonical_df['address_line_2'] = AddressNormalizer.canonicalize_street_lines(address_df['address_line_2'].astype('string'))
+        canonical_df['city'] = AddressNormalizer.canonicalize_text(address_df['city'].astype('string'))
+        canonical_df['state'] = AddressNormalizer.canonicalize_text(address_df['state'].astype('string'))
+        canonical_df['postal_code'] = AddressNormalizer.canonicalize_postal_codes(
+            address_df['postal_code'].astype('string'), is_us
+        )
+        return canonical_df
+
+    @staticmethod
+    def distinct_address_count(address_df: pd.DataFrame) -> int:
+        """Distinct addresses as the Step50 hash sees them: case-insensitive, NULL and '' alike"""
+        return len(
+            address_df[ADDRESS_COLUMNS].astype('string').fillna('').apply(lambda column: column.str.lower())
+            .drop_duplicates()
+        )
+
+    @staticmethod
+    def benchmark(address_df: pd.DataFrame) -> Dict[str, float]:
+        """
+        Canonicalize address_df once and measure the throughput and the distinct-address reduction
+        Returns: dict with rows, seconds, rows_per_second, distinct_before and distinct_after
+        """
+        start_time = time.time()
+        canonical_df = AddressNormalizer.canonicalize_frame(address_df)
+        seconds = time.time() - start_time
+        return {
+            'rows': len(address_df),
+            'seconds': seconds,
+            'rows_per_second': len(address_df) / seconds if seconds > 0 else 0,
+            'distinct_before': AddressNormalizer.distinct_address_count(address_df),
+            'distinct_after': AddressNormalizer.distinct_address_count(canonical_df),
+        }
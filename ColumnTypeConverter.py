@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Column Type Conversion Utilities
+Shared by the Step05 post-import fixers to retype VARCHAR import columns in a single table rewrite.
+"""
+
+from typing import Dict, Optional
+
+
+class ColumnTypeConverter:
+    """Build one ALTER TABLE ... ALTER COLUMN ... TYPE ... USING statement for all pending conversions on a table"""
+
+    @staticmethod
+    def cast_expression(column_name: str, column_type: dict) -> str:
+        """
+        SQL expression that casts a VARCHAR column to its target type
+        column_type uses the metadata "column_types" format, e.g. {"type": "DATE", "format": "MM/DD/YYYY"}.
+        Empty strings become NULL before the cast.
+        """
+        quoted_name = f'"{column_name}"'
+        target_type = column_type['type'].upper()
+        parse_format = column_type.get('format')
+        if target_type == 'DATE' and parse_format:
+            return f"to_date(NULLIF({quoted_name}, ''), '{parse_format}')"
+        if target_type in ('TIMESTAMP', 'TIMESTAMPTZ') and parse_format:
+            return f"to_timestamp(NULLIF({quoted_name}, ''), '{parse_format}')::{target_type}"
+        return f"NULLIF({quoted_name}, '')::{target_type}"
+
+    @staticmethod
+    def get_column_types(engine, db_table) -> Dict[str, str]:
+        """Current column name -> type string, via sqlalchemy.inspect"""
+        import sqlalchemy
+        inspector = sqlalchemy.inspect(engine)
+        columns = inspector.get_columns(db_table.table, schema=db_table.schema)
+        return {c['name']: str(c['type']) for c in columns}
+
+    @staticmethod
+    def pending_conversions(column_types: Dict[str, str], conversions: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        The conversions that still need to run
+        Columns that are missing or already have the target type are skipped, which keeps the Step05 scripts idempotent.
+        """
+        pending = {}
+        for column_name, column_type in conversions.items():
+            current_type = column_types.get(column_name)
+            if current_type is None:
+                continue
+            if column_type['type'].upper() in current_type.upper():
+                continue
+            pending[column_name] = column_type
+        return pending
+
+    @staticmethod
+    def alter_column_types_sql(db_table, pending: Dict[str, dict]) -> str:
+        """One ALTER TABLE statement that converts every pending column, so the table is rewritten only once"""
+        alter_clauses = ',\n'.join(
+            f'ALTER COLUMN "{column_name}" TYPE {column_type["type"].upper()} '
+            f'USING {ColumnTypeConverter.cast_expression(column_name, column_type)}'
+            for column_name, column_type in pending.items()
+        )
+        return f"""
+ALTER TABLE {db_table}
+{alter_clauses};
+"""
+
+    @staticmethod
+    def add_conversion_sql(sql, engine, db_table, conversions: Dict[str, dict]) -> Optional[str]:
+        """
+        Add the single ALTER TABLE conversion for db_table to a FrostDict, if anything is pending
+        Returns: the FrostDict key that was added, or None when every column already has its target type
+        """
+        pending = ColumnTypeConverter.pending_conversions(
+            ColumnTypeConverter.get_column_types(engine, db_table), conversions
+        )
+        if not pending:
+            print(f"All columns in {db_table} already have their target types")
+            return None
+        print(f"Converting {', '.join(pending)} in {db_table} with one ALTER TABLE")
+        sql_key = f"convert column types on {db_table.table}"
+        sql[sql_key] = ColumnTypeConverter.alter_column_types_sql(db_table, pending)
+        return sql_key
+
+    @staticmethod
+    def get_table_size_bytes(engine, db_table) -> int:
+        """Total on-disk size of the table, including indexes and TOAST"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            return conn.execute(
+                text("SELECT pg_total_relation_size(CAST(:table_name AS regclass))"),
+                {'table_name': f"{db_table.schema}.{db_table.table}"}
+            ).scalar()
+
+    @staticmethod
+    def report_table_size(engine, db_table, size_before_bytes: int) -> None:
+        """Print the table size before and after the conversion"""
+        size_after_bytes = ColumnTypeConverter.get_table_size_bytes(engine, db_table)
+        print(f"{db_table} size: {size_before_bytes / 1024 / 1024:.1f} MB before, "
+              f"{size_after_bytes / 1024 / 1024:.1f} MB after")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Concurrent Index Builder
+Builds a FrostDict of CREATE INDEX statements table by table, with different tables built at the same time.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+class ConcurrentIndexBuilder:
+    """
+    Index-build scheduler for the post-import scripts
+    Indexes on one table are built one after another on one connection, which keeps that table's pages
+    in cache and avoids CONCURRENTLY builds on the same table waiting on each other. Tables are spread
+    over a pool of worker threads, largest first, each with its own connection from the engine's pool.
+    Every session gets its own maintenance_work_mem, so peak memory is about
+    workers * maintenance_work_mem.
+    """
+
+    CREATE_INDEX_PATTERN = re.compile(
+        r'CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+(?P<concurrently>CONCURRENTLY\s+)?(?P<if_not_exists>IF\s+NOT\s+EXISTS\s+)?'
+        r'(?P<index_name>[\w."]+)\s+ON\s+(?:ONLY\s+)?(?P<table_name>[\w."]+)',
+        re.IGNORECASE
+    )
+
+    def __init__(self, engine, workers: int = 4, maintenance_work_mem: str = '1GB',
+                 max_parallel_maintenance_workers: int = 2, is_concurrently: bool = False):
+        self.engine = engine
+        self.workers = workers
+        self.maintenance_work_mem = maintenance_work_mem
+        self.max_parallel_maintenance_workers = max_parallel_maintenance_workers
+        self.is_concurrently = is_concurrently
+
+    @staticmethod
+    def parse_create_index(statement: str) -> Optional[Tuple[str, str]]:
+        """
+        The (index_name, table_name) a CREATE INDEX statement builds
+        Returns None for anything that is not a CREATE INDEX statement.
+        """
+        match = ConcurrentIndexBuilder.CREATE_INDEX_PATTERN.search(statement)
+        if match is None:
+            return None
+        return match.group('index_name'), match.group('table_name')
+
+    @staticmethod
+    def group_by_table(sql_dict) -> 'OrderedDict[str, List[Tuple[str, str]]]':
+        """
+        Plan steps grouped by the table they index, in plan order within each table
+        Steps that are not CREATE INDEX statements get a group of their own, keyed by step name.
+        """
+        groups: 'OrderedDict[str, List[Tuple[str, str]]]' = OrderedDict()
+        for key, statement in sql_dict.items():
+            parsed = ConcurrentIndexBuilder.parse_create_index(statement)
+            group_name = parsed[1] if parsed is not None else key
+            groups.setdefault(group_name, []).append((key, statement))
+        return groups
+
+    @staticmethod
+    def with_concurrently(statement: str) -> str:
+        """Rewrite CREATE [UNIQUE] INDEX ... as CREATE [UNIQUE] INDEX CONCURRENTLY ..."""
+        return re.sub(r'(CREATE\s+(?:UNIQUE\s+)?INDEX)\s+(?!CONCURRENTLY\b)', r'\1 CONCURRENTLY ', statement,
+                      count=1, flags=re.IGNORECASE)
+
+    def session_settings_sql(self) -> str:
+        """Per-session settings applied before the first index on a connection is built"""
+        return (f"SET maintenance_work_mem = '{self.maintenance_work_mem}'; "
+                f"SET max_parallel_maintenance_workers = {int(self.max_parallel_maintenance_workers)};")
+
+    def _table_sizes(self, table_names: List[str]) -> Dict[str, int]:
+        """Total size of each table in bytes, 0 for tables that do not exist yet"""
+        from sqlalchemy import text
+        sizes = {}
+        with self.engine.connect() as conn:
+            for table_name in table_names:
+                sizes[table_name] = conn.execute(
+                    text("SELECT COALESCE(pg_total_relation_size(to_regclass(:table_name)), 0)"),
+                    {'table_name': table_name}
+                ).scalar()
+        return sizes
+
+    def _build_table_indexes(self, group_name: str, steps: List[Tuple[str, str]]) -> Dict[str, float]:
+        """Build one table's indexes in plan order on a single autocommit connection"""
+        from sqlalchemy import text
+        step_seconds = {}
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(self.session_settings_sql()))
+            try:
+                for key, statement in steps:
+                    parsed = self.parse_create_index(statement)
+                    if self.is_concurrently and parsed is not None:
+                        # A failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS would skip
+                        index_name, table_name = parsed
+                        if '.' in table_name and '.' not in index_name:
+                            index_name = f"{table_name.split('.')[0]}.{index_name}"
+                        is_invalid = conn.execute(text(
+                            "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)"
+                        ), {'index_name': index_name}).scalar()
+                        if is_invalid:
+                            print(f"Dropping invalid index {index_name} left by an earlier build")
+                            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+                        statement = self.with_concurrently(statement)
+                    start_time = time.time()
+                    conn.exec_driver_sql(statement)
+                    step_seconds[key] = time.time() - start_time
+                    print(f"{key} on {group_name}: {step_seconds[key]:.1f} seconds")
+            finally:
+                conn.execute(text("RESET maintenance_work_mem; RESET max_parallel_maintenance_workers;"))
+        return step_seconds
+
+    def build(self, sql_dict, is_just_print: bool = False) -> Dict[str, float]:
+        """
+        Build every index in sql_dict, one table per worker at a time
+        Returns: seconds taken by each step key
+        """
+        groups = self.group_by_table(sql_dict)
+        if is_just_print:
+            print(f"-- {self.session_settings_sql()}")
+            for group_name, steps in groups.items():
+                print(f"-- {group_name}: {len(steps)} step(s), built in order on one connection")
+                for key, statement in steps:
+                    print(f"-- {key}")
+                    print(self.with_concurrently(statement) if self.is_concurrently else statement)
+            return {}
+
+        # Largest tables first, so the longest builds are not left for the end
+        table_sizes = self._table_sizes([
+            group_name for group_name, steps in groups.items() if self.parse_create_index(steps[0][1]) is not None
+        ])
+        ordered_groups = sorted(groups.items(), key=lambda group: table_sizes.get(group[0], 0), reverse=True)
+        print(f"Building {sum(len(steps) for steps in groups.values())} indexes on {len(groups)} tables "
+              f"with {self.workers} workers{' CONCURRENTLY' if self.is_concurrently else ''}")
+
+        start_time = time.time()
+        step_seconds = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self._build_table_indexes, group_name, steps) for group_name, steps in ordered_groups]
+            for future in futures:
+                step_seconds.update(future.result())
+        print(f"Built all indexes in {time.time() - start_time:.1f} seconds "
+              f"(serial time would have been {sum(step_seconds.values()):.1f} seconds)")
+        return step_seconds
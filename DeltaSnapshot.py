@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Delta Snapshot Utilities
+Writes and applies base and delta snapshots of raw tables as gzip-compressed COPY files, keyed by row hash.
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class DeltaSnapshot:
+    """
+    Base + delta snapshots of raw import tables
+    A base snapshot holds every row of each table; a delta holds only the rows whose hash is new or
+    whose number of copies changed since the previous snapshot, plus the hashes to delete. Every
+    snapshot also keeps the full list of row hashes it ends with, which the next delta is diffed against.
+    Tables with a row_hash column (nppes_raw.main_file after Step07) are keyed on it; other tables are
+    keyed on the MD5 of their whole row. Each table's export runs in one transaction and commits at the
+    end, so the connection should be REPEATABLE READ for its COPYs to see the same rows.
+    """
+
+    MANIFEST_FILE = 'manifest.json'
+
+    @staticmethod
+    def table_columns(connection, schema: str, table: str) -> List[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position",
+                (schema, table)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def schema_tables(connection, schema: str) -> List[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = %s AND table_type = 'BASE TABLE' ORDER BY table_name",
+                (schema,)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def hash_expression(columns: List[str], alias: str) -> str:
+        """The change key of a row: its row_hash column if it has one, else the MD5 of the whole row"""
+        if 'row_hash' in columns:
+            return f'{alias}.row_hash'
+        return f'MD5({alias}::TEXT)'
+
+    @staticmethod
+    def column_list(columns: List[str]) -> str:
+        return ', '.join(f'"{column}"' for column in columns)
+
+    @staticmethod
+    def file_names(schema: str, table: str) -> Dict[str, str]:
+        return {
+            'rows': f'{schema}.{table}.rows.gz',
+            'deleted': f'{schema}.{table}.deleted.gz',
+            'hashes': f'{schema}.{table}.hashes.gz',
+        }
+
+    @staticmethod
+    def changed_hash_sql() -> str:
+        """
+        Hashes whose number of rows differs between base_hash and current_hash (temp tables of row hashes)
+        Comparing counts rather than membership keeps tables with duplicate rows exact: every row with a
+        changed hash is deleted and that hash's current rows are written again.
+        """
+        return """
+        CREATE TEMP TABLE changed_hash ON COMMIT DROP AS
+        SELECT
+            COALESCE(base_counts.row_hash, current_counts.row_hash) AS row_hash,
+            base_counts.row_count AS base_count,
+            current_counts.row_count AS current_count
+        FROM (SELECT row_hash, COUNT(*) AS row_count FROM base_hash GROUP BY row_hash) AS base_counts
+        FULL OUTER JOIN (SELECT row_hash, COUNT(*) AS row_count FROM current_hash GROUP BY row_hash) AS current_counts
+            ON current_counts.row_hash = base_counts.row_hash
+        WHERE base_counts.row_count IS DISTINCT FROM current_counts.row_count;
+        ANALYZE changed_hash;
+        """
+
+    @staticmethod
+    def _copy_out(cursor, copy_sql: str, path: str, compress_level: int) -> int:
+        with gzip.open(path, 'wb', compresslevel=compress_level) as f:
+            cursor.copy_expert(copy_sql, f)
+        return cursor.rowcount
+
+    @staticmethod
+    def _copy_in(cursor, copy_sql: str, path: str) -> int:
+        with gzip.open(path, 'rb') as f:
+            cursor.copy_expert(copy_sql, f)
+        return cursor.rowcount
+
+    @staticmethod
+    def export_base_table(connection, snapshot_dir: str, schema: str, table: str, compress_level: int = 6) -> Dict:
+        """Write every row of a table and its row hashes. Returns the table's manifest entry"""
+        columns = DeltaSnapshot.table_columns(connection, schema, table)
+        files = DeltaSnapshot.file_names(schema, table)
+        start_time = time.time()
+        with connection.cursor() as cursor:
+            row_count = DeltaSnapshot._copy_out(
+                cursor, f'COPY (SELECT {DeltaSnapshot.column_list(columns)} FROM "{schema}"."{table}") TO STDOUT',
+                os.path.join(snapshot_dir, files['rows']), compress_level
+            )
+            DeltaSnapshot._copy_out(
+                cursor, f'COPY (SELECT {DeltaSnapshot.hash_expression(columns, "t")} FROM "{schema}"."{table}" AS t) TO STDOUT',
+                os.path.join(snapshot_dir, files['hashes']), compress_level
+            )
+        connection.commit()
+        return {
+            'columns': columns,
+            'row_count': row_count,
+            'rows_written': row_count,
+            'hashes_deleted': 0,
+            'files': {'rows': files['rows'], 'hashes': files['hashes']},
+            'duration_seconds': round(time.time() - start_time, 3),
+        }
+
+    @staticmethod
+    def export_delta_table(connection, snapshot_dir: str, previous_snapshot_dir: str, schema: str, table: str,
+                           compress_level: int = 6) -> Dict:
+        """
+        Write the rows that changed since the previous snapshot and the hashes it should delete
+        Returns the table's manifest entry
+        """
+        columns = DeltaSnapshot.table_columns(connection, schema, table)
+        files = DeltaSnapshot.file_names(schema, table)
+        hash_expression = DeltaSnapshot.hash_expression(columns, 't')
+        start_time = time.time()
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE base_hash (row_hash TEXT) ON COMMIT DROP")
+            base_count = DeltaSnapshot._copy_in(
+                cursor, "COPY base_hash FROM STDIN", os.path.join(previous_snapshot_dir, files['hashes'])
+            )
+            cursor.execute(f"""
+            CREATE TEMP TABLE current_hash ON COMMIT DROP AS
+            SELECT {hash_expression} AS row_hash FROM "{schema}"."{table}" AS t
+            """)
+            row_count = cursor.rowcount
+            cursor.execute(DeltaSnapshot.changed_hash_sql())
+            hashes_deleted = DeltaSnapshot._copy_out(
+                cursor, "COPY (SELECT row_hash FROM changed_hash WHERE base_count IS NOT NULL) TO STDOUT",
+                os.path.join(snapshot_dir, files['deleted']), compress_level
+            )
+            rows_written = DeltaSnapshot._copy_out(
+                cursor,
+                f'COPY (SELECT {DeltaSnapshot.column_list(columns)} '
+                f'FROM "{schema}"."{table}" AS t '
+                f'WHERE {hash_expression} IN (SELECT row_hash FROM changed_hash WHERE current_count IS NOT NULL)) TO STDOUT',
+                os.path.join(snapshot_dir, files['rows']), compress_level
+            )
+            DeltaSnapshot._copy_out(
+                cursor, "COPY (SELECT row_hash FROM current_hash) TO STDOUT",
+                os.path.join(snapshot_dir, files['hashes']), compress_level
+            )
+        connection.commit()
+        return {
+            'columns': columns,
+            'base_row_count': base_count,
+            'row_count': row_count,
+            'rows_written': rows_written,
+            'hashes_deleted': hashes_deleted,
+            'files': {'rows': files['rows'], 'deleted': files['deleted'], 'hashes': files['hashes']},
+            'duration_seconds': round(time.time() - start_time, 3),
+        }
+
+    @staticmethod
+    def apply_table(connection, snapshot_dir: str, schema: str, table: str, table_manifest: Dict,
+                    is_base: bool) -> int:
+        """
+        Apply one table of a snapshot in a single transaction: a base replaces the table's rows,
+        a delta deletes its changed hashes and loads their current rows.
+        Returns: the table's row count afterwards
+        """
+        columns = table_manifest['columns']
+        with connection.cursor() as cursor:
+            if is_base:
+                cursor.execute(f'TRUNCATE "{schema}"."{table}"')
+            else:
+                cursor.execute("CREATE TEMP TABLE deleted_hash (row_hash TEXT) ON COMMIT DROP")
+                DeltaSnapshot._copy_in(
+                    cursor, "COPY deleted_hash FROM STDIN",
+                    os.path.join(snapshot_dir, table_manifest['files']['deleted'])
+                )
+                cursor.execute(f"""
+                DELETE FROM "{schema}"."{table}" AS t
+                WHERE {DeltaSnapshot.hash_expression(columns, 't')} IN (SELECT row_hash FROM deleted_hash)
+                """)
+            DeltaSnapshot._copy_in(
+                cursor, f'COPY "{schema}"."{table}" ({DeltaSnapshot.column_list(columns)}) FROM STDIN',
+                os.path.join(snapshot_dir, table_manifest['files']['rows'])
+            )
+            cursor.execute(f'SELECT COUNT(*) FROM "{schema}"."{table}"')
+            row_count = cursor.fetchone()[0]
+            if row_count != table_manifest['row_count']:
+                connection.rollback()
+                raise ValueError(f"{schema}.{table} would have {row_count:,} rows after applying "
+                                 f"{os.path.basename(snapshot_dir)}, expected {table_manifest['row_count']:,}. "
+                                 f"Is the table at the snapshot's base state?")
+        connection.commit()
+        return row_count
+
+    @staticmethod
+    def write_manifest(snapshot_dir: str, label: str, parent: Optional[str], tables: Dict[str, Dict]) -> str:
+        manifest = {
+            'label': label,
+            'kind': 'base' if parent is None else 'delta',
+            'parent': parent,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'tables': tables,
+        }
+        manifest_path = os.path.join(snapshot_dir, DeltaSnapshot.MANIFEST_FILE)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest_path
+
+    @staticmethod
+    def read_manifest(snapshot_dir: str) -> Dict:
+        with open(os.path.join(snapshot_dir, DeltaSnapshot.MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    @staticmethod
+    def latest_label(snapshot_root: str) -> Optional[str]:
+        """The most recently created snapshot under snapshot_root"""
+        manifests = [
+            DeltaSnapshot.read_manifest(os.path.join(snapshot_root, label))
+            for label in os.listdir(snapshot_root)
+            if os.path.exists(os.path.join(snapshot_root, label, DeltaSnapshot.MANIFEST_FILE))
+        ] if os.path.isdir(snapshot_root) else []
+        if not manifests:
+            return None
+        return max(manifests, key=lambda manifest: manifest['created_at'])['label']
+
+    @staticmethod
+    def snapshot_chain(snapshot_root: str, label: str) -> List[Dict]:
+        """Manifests from the base snapshot up to label, in the order they must be applied"""
+        chain = []
+        while label is not None:
+            manifest = DeltaSnapshot.read_manifest(os.path.join(snapshot_root, label))
+            chain.append(manifest)
+            label = manifest['parent']
+        return list(reversed(chain))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Index Analysis Utilities
+Finds prefix-redundant, unique-covered and never-scanned indexes and estimates what they cost on writes.
+"""
+
+from typing import Dict, Iterable, List
+
+
+class IndexAnalyzer:
+    """
+    Reads index definitions and usage from pg_index / pg_stat_user_indexes and suggests indexes to drop
+    Indexes that back a primary key, unique constraint or exclusion constraint are never suggested,
+    because dropping them changes behaviour rather than just speed.
+    """
+
+    INDEX_QUERY = """
+    SELECT
+        n.nspname AS schema_name,
+        t.relname AS table_name,
+        i.relname AS index_name,
+        am.amname AS access_method,
+        ix.indisunique AS is_unique,
+        ix.indisprimary OR EXISTS (
+            SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid
+        ) AS is_constraint,
+        ARRAY(
+            SELECT pg_get_indexdef(ix.indexrelid, k, TRUE)
+            FROM generate_series(1, ix.indnkeyatts) AS k
+            ORDER BY k
+        ) AS key_columns,
+        pg_get_expr(ix.indpred, ix.indrelid) AS predicate,
+        pg_relation_size(ix.indexrelid) AS index_bytes,
+        COALESCE(s.idx_scan, 0) AS idx_scan,
+        COALESCE(ts.n_tup_ins, 0) + COALESCE(ts.n_tup_upd, 0) - COALESCE(ts.n_tup_hot_upd, 0) AS index_writes,
+        pg_get_indexdef(ix.indexrelid) AS index_definition
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_am am ON am.oid = i.relam
+    LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = ix.indexrelid
+    LEFT JOIN pg_stat_user_tables ts ON ts.relid = ix.indrelid
+    WHERE n.nspname = ANY(:schema_names)
+    ORDER BY n.nspname, t.relname, i.relname
+    """
+
+    @staticmethod
+    def fetch_indexes(engine, schema_names: Iterable[str]) -> List[Dict]:
+        """One dict per index in the given schemas, with its key columns, size, scans and write count"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            rows = conn.execute(text(IndexAnalyzer.INDEX_QUERY), {'schema_names': list(schema_names)})
+            return [dict(row._mapping) for row in rows]
+
+    @staticmethod
+    def fetch_stats_reset(engine):
+        """When this database's statistics were last reset, i.e. the window idx_scan counts cover"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()"
+            )).scalar()
+
+    @staticmethod
+    def qualified_name(index: Dict) -> str:
+        return f"{index['schema_name']}.{index['index_name']}"
+
+    @staticmethod
+    def _is_droppable(index: Dict) -> bool:
+        return not index['is_constraint'] and not index['is_unique']
+
+    @staticmethod
+    def _same_table_and_kind(index: Dict, other: Dict) -> bool:
+        return (index['schema_name'] == other['schema_name']
+                and index['table_name'] == other['table_name']
+                and index['access_method'] == other['access_method'] == 'btree'
+                and index['predicate'] == other['predicate']
+                and index['index_name'] != other['index_name'])
+
+    @staticmethod
+    def find_prefix_redundant(indexes: List[Dict]) -> List[Dict]:
+        """
+        B-tree indexes whose key columns are a left prefix of (or equal to) another index on the same table
+        with the same predicate; the longer index serves every query the shorter one does. Of two exact
+        duplicates only one is reported, keeping a unique one or else the first by name.
+        Returns: list of {'index', 'covered_by', 'reason'}
+        """
+        findings = []
+        for index in indexes:
+            if not IndexAnalyzer._is_droppable(index):
+                continue
+            for other in indexes:
+                if not IndexAnalyzer._same_table_and_kind(index, other):
+                    continue
+                index_columns = list(index['key_columns'])
+                other_columns = list(other['key_columns'])
+                if other_columns[:len(index_columns)] != index_columns:
+                    continue
+                if len(index_columns) == len(other_columns):
+                    keeps_other = not IndexAnalyzer._is_droppable(other) or other['index_name'] < index['index_name']
+                    if not keeps_other:
+                        continue
+                    reason = f"duplicate of {IndexAnalyzer.qualified_name(other)}"
+                else:
+                    reason = f"left prefix of {IndexAnalyzer.qualified_name(other)} ({', '.join(other_columns)})"
+                findings.append({'index': index, 'covered_by': other, 'reason': reason})
+                break
+        return findings
+
+    @staticmethod
+    def find_unique_covered(indexes: List[Dict]) -> List[Dict]:
+        """
+        Multi-column b-tree indexes that start with every column of a full unique index on the same table
+        The unique index already finds at most one row, so the extra columns only help index-only scans.
+        Returns: list of {'index', 'covered_by', 'reason'}
+        """
+        findings = []
+        for index in indexes:
+            if not IndexAnalyzer._is_droppable(index) or index['access_method'] != 'btree':
+                continue
+            for other in indexes:
+                if (other['is_unique'] and other['predicate'] is None
+                        and other['access_method'] == 'btree'
+                        and other['schema_name'] == index['schema_name']
+                        and other['table_name'] == index['table_name']
+                        and len(index['key_columns']) > len(other['key_columns'])
+                        and list(index['key_columns'])[:len(other['key_columns'])] == list(other['key_columns'])):
+                    findings.append({
+                        'index': index,
+                        'covered_by': other,
+                        'reason': f"leading columns already unique via {IndexAnalyzer.qualified_name(other)}",
+                    })
+                    break
+        return findings
+
+    @staticmethod
+    def find_unused(indexes: List[Dict]) -> List[Dict]:
+        """Indexes never scanned since statistics were last reset, apart from constraint-backing ones"""
+        return [
+            {'index': index, 'covered_by': None, 'reason': 'never scanned'}
+            for index in indexes
+            if IndexAnalyzer._is_droppable(index) and index['idx_scan'] == 0
+        ]
+
+    @staticmethod
+    def suggested_drops(*finding_lists: List[Dict]) -> List[Dict]:
+        """
+        One entry per index across all findings, with every reason it was flagged
+        Returns: list of {'index', 'reasons'} in schema, table, index order
+        """
+        by_name: Dict[str, Dict] = {}
+        for findings in finding_lists:
+            for finding in findings:
+                name = IndexAnalyzer.qualified_name(finding['index'])
+                by_name.setdefault(name, {'index': finding['index'], 'reasons': []})['reasons'].append(finding['reason'])
+        return sorted(by_name.values(), key=lambda drop: (
+            drop['index']['schema_name'], drop['index']['table_name'], drop['index']['index_name']
+        ))
+
+    @staticmethod
+    def write_amplification(indexes: List[Dict], drops: List[Dict]) -> List[Dict]:
+        """
+        Per table: how many index entries each row write produces now and after the suggested drops
+        Every insert and every non-HOT update writes one entry into each index on the table.
+        Returns: list of {'table', 'index_count', 'index_count_after', 'index_writes', 'index_writes_saved'}
+        """
+        drop_names = {IndexAnalyzer.qualified_name(drop['index']) for drop in drops}
+        tables: Dict[str, Dict] = {}
+        for index in indexes:
+            table_name = f"{index['schema_name']}.{index['table_name']}"
+            table = tables.setdefault(table_name, {
+                'table': table_name, 'index_count': 0, 'index_count_after': 0,
+                'index_writes': 0, 'index_writes_saved': 0,
+            })
+            table['index_count'] += 1
+            table['index_writes'] += index['index_writes']
+            if IndexAnalyzer.qualified_name(index) in drop_names:
+                table['index_writes_saved'] += index['index_writes']
+            else:
+                table['index_count_after'] += 1
+        return [table for table in tables.values() if table['index_count_after'] < table['index_count']]
+
+    @staticmethod
+    def drop_statements(drops: List[Dict]) -> List[str]:
+        """DROP INDEX CONCURRENTLY statements for the suggested drops, each commented with its reasons"""
+        return [
+            f"-- {'; '.join(drop['reasons'])}\n"
+            f"DROP INDEX CONCURRENTLY IF EXISTS {IndexAnalyzer.qualified_name(drop['index'])};"
+            for drop in drops
+        ]
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Parallel CSV Loading Utilities
+Splits a large CSV on record boundaries and COPYs the pieces into PostgreSQL over several connections.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from ColumnTypeConverter import ColumnTypeConverter
+
+
+class _ByteRangeReader:
+    """File-like object that only exposes bytes [start, end) of a file, for use with COPY FROM STDIN"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.readline(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _RowHashingReader:
+    """
+    File-like object over bytes [start, end) that appends a row hash column to every CSV record
+    Each record's raw bytes (without the line ending) are hashed with 128-bit XXH3, and the
+    32-character hex digest is written as one more field, so COPY fills row_hash as it loads.
+    """
+
+    READ_BLOCK_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, path: str, start: int, end: int, delimiter: str = ',', quote_char: str = '"'):
+        import xxhash
+        self._hexdigest = xxhash.xxh3_128_hexdigest
+        self._source = _ByteRangeReader(path, start, end)
+        self._delimiter = delimiter.encode('ascii')
+        self._quote_byte = quote_char.encode('ascii')
+        self._pending = b''
+        self._output = b''
+        self._output_at = 0
+        self._exhausted = False
+
+    def _hash_records(self) -> None:
+        """Move every complete record in the pending bytes to the output buffer, with its hash appended"""
+        data = self._pending
+        hashed_records = []
+        record_start = 0
+        search_from = 0
+        while True:
+            newline_at = data.find(b'\n', search_from)
+            if newline_at == -1:
+                break
+            # A newline inside a quoted field leaves an odd number of quotes in the record so far
+            if data.count(self._quote_byte, record_start, newline_at) % 2:
+                search_from = newline_at + 1
+                continue
+            record_end = newline_at - 1 if newline_at > record_start and data[newline_at - 1:newline_at] == b'\r' else newline_at
+            record = data[record_start:record_end]
+            hashed_records.append(record + self._delimiter + self._hexdigest(record).encode('ascii') + b'\n')
+            record_start = newline_at + 1
+            search_from = record_start
+        self._pending = data[record_start:]
+        self._output = self._output[self._output_at:] + b''.join(hashed_records)
+        self._output_at = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._exhausted and (size is None or size < 0 or len(self._output) - self._output_at < size):
+            block = self._source.read(self.READ_BLOCK_SIZE)
+            if not block:
+                self._exhausted = True
+                if self._pending:
+                    # The last record in the file may have no line ending
+                    self._pending += b'\n'
+                    self._hash_records()
+                break
+            self._pending += block
+            self._hash_records()
+        if size is None or size < 0:
+            size = len(self._output) - self._output_at
+        data = self._output[self._output_at:self._output_at + size]
+        self._output_at += len(data)
+        return data
+
+    def close(self) -> None:
+        self._source.close()
+
+
+class ParallelCSVLoader:
+    """Split a CSV into record-aligned byte ranges and load them concurrently"""
+
+    READ_BLOCK_SIZE = 64 * 1024 * 1024
+    COPY_READ_SIZE = 1024 * 1024
+
+    # Python codec names used in the csviper metadata -> PostgreSQL encoding names
+    POSTGRES_ENCODINGS = {
+        'utf-8': 'UTF8',
+        'utf8': 'UTF8',
+        'ascii': 'UTF8',
+        'iso-8859-1': 'LATIN1',
+        'latin-1': 'LATIN1',
+        'latin1': 'LATIN1',
+        'cp1252': 'WIN1252',
+        'windows-1252': 'WIN1252',
+    }
+
+    @staticmethod
+    def find_record_boundaries(csv_file: str, pieces: int, quote_char: str = '"', skip_header: bool = True) -> List[Tuple[int, int]]:
+        """
+        Split a CSV file into roughly equal byte ranges that each start and end on a record boundary
+        A newline only ends a record when an even number of quote characters precede it, so quoted
+        fields that contain newlines are never split. Doubled ("") quotes keep the parity intact.
+        Returns: list of (start, end) byte offsets, header excluded when skip_header is True
+        """
+        file_size = os.path.getsize(csv_file)
+        quote_byte = quote_char.encode('ascii')
+
+        with open(csv_file, 'rb') as f:
+            data_start = 0
+            if skip_header:
+                data_start = ParallelCSVLoader._next_record_start(f, 0, 0, quote_byte)
+            if data_start >= file_size:
+                return []
+
+            data_size = file_size - data_start
+            pieces = max(1, min(pieces, data_size))
+            targets = [data_start + (data_size * i) // pieces for i in range(1, pieces)]
+
+            boundaries = [data_start]
+            block_start = data_start
+            quotes_before_block = 0
+            f.seek(data_start)
+            block = f.read(ParallelCSVLoader.READ_BLOCK_SIZE)
+            for target in targets:
+                if target <= boundaries[-1]:
+                    continue
+                # Walk forward, keeping a running quote count, until the block holding the target
+                while block and block_start + len(block) <= target:
+                    quotes_before_block += block.count(quote_byte)
+                    block_start += len(block)
+                    block = f.read(ParallelCSVLoader.READ_BLOCK_SIZE)
+                boundary = None
+                search_from = max(target - block_start, 0)
+                while block:
+                    newline_at = block.find(b'\n', search_from)
+                    if newline_at == -1:
+                        quotes_before_block += block.count(quote_byte)
+                        block_start += len(block)
+                        block = f.read(ParallelCSVLoader.READ_BLOCK_SIZE)
+                        search_from = 0
+                        continue
+                    if (quotes_before_block + block.count(quote_byte, 0, newline_at)) % 2 == 0:
+                        boundary = block_start + newline_at + 1
+                        break
+                    search_from = newline_at + 1
+                if boundary is None or boundary >= file_size:
+                    break
+                boundaries.append(boundary)
+
+        boundaries.append(file_size)
+        return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+    @staticmethod
+    def _next_record_start(f, offset: int, quotes_before: int, quote_byte: bytes) -> int:
+        """Offset just past the first record-ending newline at or after offset"""
+        f.seek(offset)
+        position = offset
+        while True:
+            block = f.read(ParallelCSVLoader.READ_BLOCK_SIZE)
+            if not block:
+                return position
+            search_from = 0
+            while True:
+                newline_at = block.find(b'\n', search_from)
+                if newline_at == -1:
+                    break
+                if (quotes_before + block.count(quote_byte, 0, newline_at)) % 2 == 0:
+                    return position + newline_at + 1
+                search_from = newline_at + 1
+            quotes_before += block.count(quote_byte)
+            position += len(block)
+
+    @staticmethod
+    def _connect(db_config: dict):
+        """Open a psycopg2 connection from the csviper db_config (the values from the parent .env)"""
+        import psycopg2
+        return psycopg2.connect(
+            host=db_config.get('DB_HOST'),
+            port=db_config.get('DB_PORT'),
+            dbname=db_config.get('DB_NAME'),
+            user=db_config.get('DB_USER'),
+            password=db_config.get('DB_PASSWORD')
+        )
+
+    @staticmethod
+    def _copy_range(db_config: dict, full_table_name: str, csv_file: str, byte_range: Tuple[int, int],
+                    delimiter: str, quote_char: str, postgres_encoding: str, row_hash: bool = False) -> Tuple[int, float]:
+        """
+        COPY one byte range of the CSV on its own connection
+        With row_hash the reader appends each record's hash as the last field, filling the row_hash column.
+        Returns: (rows loaded, seconds taken)
+        """
+        start_time = time.time()
+        connection = ParallelCSVLoader._connect(db_config)
+        if row_hash:
+            reader = _RowHashingReader(csv_file, byte_range[0], byte_range[1], delimiter, quote_char)
+        else:
+            reader = _ByteRangeReader(csv_file, byte_range[0], byte_range[1])
+        try:
+            cursor = connection.cursor()
+            escaped_quote = quote_char.replace("'", "''")
+            cursor.copy_expert(
+                f"COPY {full_table_name} FROM STDIN WITH (FORMAT csv, HEADER false, DELIMITER '{delimiter}', "
+                f"QUOTE '{escaped_quote}', NULL '', ENCODING '{postgres_encoding}')",
+                reader,
+                size=ParallelCSVLoader.COPY_READ_SIZE
+            )
+            rows_loaded = cursor.rowcount
+            connection.commit()
+        finally:
+            reader.close()
+            connection.close()
+        return rows_loaded, time.time() - start_time
+
+    @staticmethod
+    def execute_parallel_import(db_config: dict, db_schema_name: str, table_name: str, csv_file: str,
+                                create_table_sql_file: str, workers: int, encoding: Optional[str] = 'utf-8',
+                                delimiter: str = ',', quote_char: str = '"', set_logged: bool = True,
+                                row_hash: bool = False) -> float:
+        """
+        Recreate the table as UNLOGGED, COPY the CSV into it over `workers` connections, then SET LOGGED
+        create_table_sql_file is the csviper generated create_table_postgres.sql for this CSV.
+        set_logged=False leaves the table UNLOGGED, for staging tables that are dropped right after.
+        row_hash=True adds a row_hash VARCHAR(32) column that is filled while the CSV streams in, so
+        Step07 does not have to rewrite the table to hash it.
+        Returns: wall-clock seconds for the whole load
+        """
+        start_time = time.time()
+        full_table_name = f"{db_schema_name}.{table_name}"
+        postgres_encoding = ParallelCSVLoader.POSTGRES_ENCODINGS.get((encoding or 'utf-8').lower(), 'UTF8')
+
+        with open(create_table_sql_file, 'r') as f:
+            create_table_sql = f.read()
+        create_table_sql = (create_table_sql
+                            .replace('REPLACE_ME_DB_NAME', db_schema_name)
+                            .replace('REPLACE_ME_TABLE_NAME', table_name)
+                            .replace('CREATE TABLE', 'CREATE UNLOGGED TABLE'))
+
+        connection = ParallelCSVLoader._connect(db_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {db_schema_name};")
+            cursor.execute(create_table_sql)
+            if row_hash:
+                cursor.execute(f"ALTER TABLE {full_table_name} ADD COLUMN row_hash VARCHAR(32);")
+            connection.commit()
+        finally:
+            connection.close()
+
+        byte_ranges = ParallelCSVLoader.find_record_boundaries(csv_file, workers, quote_char)
+        print(f"Split {os.path.basename(csv_file)} into {len(byte_ranges)} record-aligned ranges "
+              f"in {time.time() - start_time:.2f} seconds")
+
+        total_rows = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(ParallelCSVLoader._copy_range, db_config, full_table_name, csv_file,
+                            byte_range, delimiter, quote_char, postgres_encoding, row_hash)
+                for byte_range in byte_ranges
+            ]
+            for range_number, (byte_range, future) in enumerate(zip(byte_ranges, futures), start=1):
+                rows_loaded, seconds = future.result()
+                total_rows += rows_loaded
+                print(f"  range {range_number}/{len(byte_ranges)}: {rows_loaded} rows "
+                      f"({(byte_range[1] - byte_range[0]) / 1024 / 1024:.0f} MB) in {seconds:.2f} seconds")
+
+        if set_logged:
+            # Switching to LOGGED writes the table to WAL once so it survives a crash and replicates
+            logged_start = time.time()
+            connection = ParallelCSVLoader._connect(db_config)
+            try:
+                cursor = connection.cursor()
+                cursor.execute(f"ALTER TABLE {full_table_name} SET LOGGED;")
+                connection.commit()
+            finally:
+                connection.close()
+            print(f"Switched {full_table_name} to LOGGED in {time.time() - logged_start:.2f} seconds")
+
+        total_seconds = time.time() - start_time
+        print(f"Loaded {total_rows} rows into {full_table_name} with {workers} workers in {total_seconds:.2f} seconds")
+        return total_seconds
+
+    @staticmethod
+    def typed_select_expression(column_name: str, column_type: Optional[dict]) -> str:
+        """
+        SQL expression that casts one VARCHAR staging column to its target type
+        column_type comes from the metadata "column_types" entry, e.g. {"type": "DATE", "format": "MM/DD/YYYY"}.
+        Empty strings become NULL before the cast, as the Step05 fixers do.
+        """
+        quoted_name = f'"{column_name}"'
+        if not column_type:
+            return quoted_name
+        return f"{ColumnTypeConverter.cast_expression(column_name, column_type)} AS {quoted_name}"
+
+    @staticmethod
+    def execute_typed_import(db_config: dict, db_schema_name: str, table_name: str, csv_file: str,
+                             create_table_sql_file: str, column_names: List[str], column_types: dict,
+                             workers: int = 1, encoding: Optional[str] = 'utf-8',
+                             delimiter: str = ',', quote_char: str = '"', row_hash: bool = False) -> float:
+        """
+        Load the CSV into an UNLOGGED VARCHAR staging table, then write the final table once with typed columns
+        This replaces the ADD / UPDATE / DROP / RENAME passes in the Step05 fixers, which rewrite the
+        table once per converted column. column_types maps normalized column names to
+        {"type": ..., "format": ...} as carried in the metadata JSON.
+        Returns: wall-clock seconds for the whole load
+        """
+        start_time = time.time()
+        staging_table_name = f"{table_name}_untyped_staging"
+        full_table_name = f"{db_schema_name}.{table_name}"
+        full_staging_table_name = f"{db_schema_name}.{staging_table_name}"
+
+        ParallelCSVLoader.execute_parallel_import(
+            db_config=db_config,
+            db_schema_name=db_schema_name,
+            table_name=staging_table_name,
+            csv_file=csv_file,
+            create_table_sql_file=create_table_sql_file,
+            workers=workers,
+            encoding=encoding,
+            delimiter=delimiter,
+            quote_char=quote_char,
+            set_logged=False,
+            row_hash=row_hash
+        )
+
+        select_expressions = [
+            ParallelCSVLoader.typed_select_expression(column_name, column_types.get(column_name))
+            for column_name in column_names
+        ]
+        if row_hash:
+            select_expressions.append('"row_hash"')
+        select_list = ',\n    '.join(select_expressions)
+        typed_start = time.time()
+        connection = ParallelCSVLoader._connect(db_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {full_table_name};")
+            cursor.execute(f"CREATE TABLE {full_table_name} AS\nSELECT\n    {select_list}\nFROM {full_staging_table_name};")
+            cursor.execute(f"DROP TABLE {full_staging_table_name};")
+            connection.commit()
+        finally:
+            connection.close()
+        print(f"Wrote typed {full_table_name} from {full_staging_table_name} in {time.time() - typed_start:.2f} seconds")
+
+        total_seconds = time.time() - start_time
+        print(f"Typed import of {full_table_name} took {total_seconds:.2f} seconds")
+        return total_seconds
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Columnar Export Utilities
+Streams PostgreSQL tables through COPY TO STDOUT into partitioned Parquet or Arrow IPC datasets.
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# information_schema.columns data_type -> Arrow type name; anything else is exported as a string
+ARROW_TYPES = {
+    'smallint': 'int16',
+    'integer': 'int32',
+    'bigint': 'int64',
+    'real': 'float32',
+    'double precision': 'float64',
+    'numeric': 'float64',
+    'boolean': 'bool_',
+    'date': 'date32',
+    'timestamp without time zone': 'timestamp',
+    'timestamp with time zone': 'timestamptz',
+}
+
+
+class ParquetExporter:
+    """
+    Chunked columnar export of large tables for analysis outside the database
+    Rows never pass through Python objects: COPY ... TO STDOUT (FORMAT csv) is piped from a psycopg2
+    connection straight into pyarrow's streaming CSV reader, which yields record batches of block_size
+    bytes that are written out as they arrive. Memory stays at a few blocks however large the table is.
+    Parquet output is zstd-compressed; Arrow IPC output is left uncompressed so pyarrow can memory-map it.
+    """
+
+    FORMATS = ('parquet', 'arrow')
+
+    @staticmethod
+    def table_columns(connection, schema: str, table: str) -> List[Dict]:
+        """[{'name', 'data_type'}] for a table's columns in order"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position",
+                (schema, table)
+            )
+            return [{'name': row[0], 'data_type': row[1]} for row in cursor.fetchall()]
+
+    @staticmethod
+    def arrow_type_name(data_type: str) -> str:
+        return ARROW_TYPES.get(data_type, 'string')
+
+    @staticmethod
+    def arrow_schema(columns: List[Dict]):
+        import pyarrow as pa  # type: ignore
+        arrow_types = {
+            'timestamp': pa.timestamp('us'),
+            'timestamptz': pa.timestamp('us', tz='UTC'),
+        }
+        return pa.schema([
+            (column['name'], arrow_types.get(type_name) or getattr(pa, type_name)())
+            for column in columns
+            for type_name in [ParquetExporter.arrow_type_name(column['data_type'])]
+        ])
+
+    @staticmethod
+    def copy_sql(schema: str, table: str, columns: List[Dict], where: Optional[str] = None) -> str:
+        """COPY of the table as CSV; booleans come out as t/f and NULLs as unquoted empty fields"""
+        column_list = ', '.join(f'"{column["name"]}"' for column in columns)
+        where_sql = f" WHERE {where}" if where else ""
+        return f'COPY (SELECT {column_list} FROM "{schema}"."{table}"{where_sql}) TO STDOUT WITH (FORMAT csv)'
+
+    @staticmethod
+    def output_dir(output_root: str, schema: str, table: str) -> str:
+        return os.path.join(output_root, schema, table)
+
+    @staticmethod
+    def write_empty(destination: str, schema_arrow, output_format: str = 'parquet') -> str:
+        """Replace destination with a single zero-row file carrying the schema, so readers still see the columns"""
+        import pyarrow as pa  # type: ignore
+        import pyarrow.parquet as pq  # type: ignore
+
+        shutil.rmtree(destination, ignore_errors=True)
+        os.makedirs(destination)
+        empty_table = schema_arrow.empty_table()
+        if output_format == 'parquet':
+            path = os.path.join(destination, 'part-0.parquet')
+            pq.write_table(empty_table, path, compression='zstd')
+        else:
+            path = os.path.join(destination, 'part-0.arrow')
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema_arrow) as writer:
+                writer.write_table(empty_table)
+        return path
+
+    @staticmethod
+    def export_table(connection, schema: str, table: str, output_root: str, partition_by: Optional[List[str]] = None,
+                     output_format: str = 'parquet', block_size: int = 64 * 1024 * 1024,
+                     max_rows_per_file: int = 5_000_000, where: Optional[str] = None) -> Dict:
+        """
+        Stream one table into {output_root}/{schema}/{table}/, hive-partitioned by partition_by columns
+        Returns: {'rows', 'seconds', 'bytes', 'files'}
+        """
+        import pyarrow.csv as pa_csv  # type: ignore
+        import pyarrow.dataset as pa_dataset  # type: ignore
+
+        columns = ParquetExporter.table_columns(connection, schema, table)
+        if not columns:
+            raise ValueError(f"{schema}.{table} does not exist or has no columns")
+        column_names = [column['name'] for column in columns]
+        missing_partitions = [name for name in partition_by or [] if name not in column_names]
+        if missing_partitions:
+            raise ValueError(f"{schema}.{table} has no column(s) {', '.join(missing_partitions)} to partition by")
+        schema_arrow = ParquetExporter.arrow_schema(columns)
+
+        read_fd, write_fd = os.pipe()
+        copy_errors = []
+
+        def copy_to_pipe():
+            try:
+                with os.fdopen(write_fd, 'wb') as pipe_writer, connection.cursor() as cursor:
+                    cursor.execute("SET TimeZone = 'UTC'")
+                    cursor.copy_expert(ParquetExporter.copy_sql(schema, table, columns, where), pipe_writer)
+            except Exception as e:  # surfaced to the caller after the reader stops
+                copy_errors.append(e)
+
+        start_time = time.time()
+        copy_thread = threading.Thread(target=copy_to_pipe, daemon=True)
+        copy_thread.start()
+        rows = [0]
+        destination = ParquetExporter.output_dir(output_root, schema, table)
+        with os.fdopen(read_fd, 'rb') as pipe_reader:
+            if not pipe_reader.peek(1):
+                # pyarrow refuses an empty CSV stream, and write_dataset writes no files without batches
+                copy_thread.join()
+                if not copy_errors:
+                    ParquetExporter.write_empty(destination, schema_arrow, output_format)
+            else:
+                reader = pa_csv.open_csv(
+                    pipe_reader,
+                    read_options=pa_csv.ReadOptions(column_names=column_names, block_size=block_size),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=schema_arrow,
+                        true_values=['t'], false_values=['f'],
+                        null_values=[''], strings_can_be_null=True, quoted_strings_can_be_null=False,
+                    ),
+                )
+
+                def counted_batches():
+                    for batch in reader:
+                        rows[0] += batch.num_rows
+                        yield batch
+
+                file_options = None
+                if output_format == 'parquet':
+                    file_options = pa_dataset.ParquetFileFormat().make_write_options(compression='zstd')
+                pa_dataset.write_dataset(
+                    counted_batches(),
+                    destination,
+                    schema=schema_arrow,
+                    format='parquet' if output_format == 'parquet' else 'ipc',
+                    file_options=file_options,
+                    partitioning=partition_by or None,
+                    partitioning_flavor='hive' if partition_by else None,
+                    max_rows_per_file=max_rows_per_file,
+                    max_rows_per_group=min(max_rows_per_file, 1_000_000),
+                    existing_data_behavior='delete_matching',
+                )
+        copy_thread.join()
+        connection.commit()
+        if copy_errors:
+            raise copy_errors[0]
+
+        files = [
+            os.path.join(directory, file_name)
+            for directory, _, file_names in os.walk(destination) for file_name in file_names
+        ]
+        return {
+            'rows': rows[0],
+            'seconds': time.time() - start_time,
+            'bytes': sum(os.path.getsize(path) for path in files),
+            'files': len(files),
+        }
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL Archive Utilities
+pg_dump / pg_restore command building, archive table-of-contents parsing and export manifests.
+"""
+
+import json
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+
+class PgArchiveTools:
+    """Helpers shared by the export and import scripts for pg_dump archives and their manifests"""
+
+    ARCHIVE_FORMATS = ('plain', 'directory', 'custom')
+    COMPRESSION_METHODS = ('zstd', 'gzip', 'none')
+    MANIFEST_FILE = 'manifest.json'
+
+    # "3456; 0 16402 TABLE DATA nppes_raw main_file postgres" in pg_restore --list output
+    TOC_TABLE_DATA_PATTERN = re.compile(r'^(?P<dump_id>\d+);\s+\d+\s+\d+\s+TABLE DATA\s+(?P<schema>\S+)\s+(?P<table>\S+)\s')
+    # pg_dump --verbose progress messages
+    DUMP_START_PATTERN = re.compile(r'dumping contents of table "(?P<table>[^"]+)"')
+    DUMP_FINISHED_PATTERN = re.compile(r'finished item (?P<dump_id>\d+) TABLE DATA (?P<table>\S+)')
+
+    @staticmethod
+    def connection_arguments(db_user: str, db_host: str, db_port: str) -> List[str]:
+        return ['-U', db_user, '-h', db_host, '-p', str(db_port)]
+
+    @staticmethod
+    def pg_tool_major_version(tool: str = 'pg_dump') -> int:
+        """Major version of a PostgreSQL client tool, e.g. 16 for "pg_dump (PostgreSQL) 16.2 (Ubuntu 16.2-1)" """
+        output = subprocess.run([tool, '--version'], capture_output=True, text=True, check=True).stdout
+        match = re.search(r'\)\s+(\d+)', output)
+        if match is None:
+            raise ValueError(f"Could not read the version of {tool} from: {output.strip()}")
+        return int(match.group(1))
+
+    @staticmethod
+    def compress_arguments(method: str, level: Optional[int], major_version: int) -> List[str]:
+        """
+        pg_dump compression arguments for this pg_dump version
+        pg_dump 16 added --compress=method[:level] and zstd; older versions only take a gzip level.
+        """
+        if method not in PgArchiveTools.COMPRESSION_METHODS:
+            raise ValueError(f"Unknown compression method '{method}', expected one of {PgArchiveTools.COMPRESSION_METHODS}")
+        if major_version >= 16:
+            return [f"--compress={method}" + (f":{level}" if level is not None and method != 'none' else '')]
+        if method == 'zstd':
+            raise ValueError(f"zstd compression needs pg_dump 16 or later, this pg_dump is version {major_version}. "
+                             f"Use --compress gzip instead.")
+        if method == 'none':
+            return ['--compress=0']
+        return [f"--compress={level if level is not None else 6}"]
+
+    @staticmethod
+    def archive_path(export_dir: str, schema: str, archive_format: str) -> str:
+        """Where a schema's archive goes: {schema}.pg.sql, {schema}.dump or a {schema}.dir directory"""
+        extension = {'plain': '.pg.sql', 'custom': '.dump', 'directory': '.dir'}[archive_format]
+        return os.path.join(export_dir, f"{schema}{extension}")
+
+    @staticmethod
+    def dump_command(connection_args: List[str], db_name: str, schema: str, archive_format: str, path: str,
+                     jobs: int = 1, compress_args: Optional[List[str]] = None) -> List[str]:
+        """
+        pg_dump command for one schema
+        Plain dumps keep --clean --if-exists; for archive formats those are pg_restore options instead.
+        --jobs is only accepted by the directory format.
+        """
+        command = ['pg_dump', '--no-owner', '--verbose', '--schema', schema, '--format', archive_format, '--file', path]
+        if archive_format == 'plain':
+            command += ['--clean', '--if-exists']
+        else:
+            command += compress_args or []
+        if archive_format == 'directory' and jobs > 1:
+            command += ['--jobs', str(jobs)]
+        return command + connection_args + [db_name]
+
+    @staticmethod
+    def restore_command(connection_args: List[str], db_name: str, path: str, jobs: int = 1,
+                        sections: Optional[List[str]] = None, is_clean: bool = False) -> List[str]:
+        """
+        pg_restore command for a custom or directory archive
+        sections limits the restore to 'pre-data', 'data' and/or 'post-data' (indexes, constraints, triggers),
+        which is how index and constraint creation is deferred until every schema's data is loaded.
+        """
+        command = ['pg_restore', '--no-owner', '--dbname', db_name]
+        if is_clean:
+            command += ['--clean', '--if-exists']
+        for section in sections or []:
+            command += ['--section', section]
+        if jobs > 1:
+            command += ['--jobs', str(jobs)]
+        return command + connection_args + [path]
+
+    @staticmethod
+    def find_archives(import_dir: str) -> List[Dict]:
+        """
+        Every pg_dump output in import_dir: {'name', 'path', 'format'}
+        The name is the file name without its .pg.sql / .dump / .dir extension, i.e. the schema exported.
+        """
+        archives = []
+        for entry_name in sorted(os.listdir(import_dir)):
+            path = os.path.join(import_dir, entry_name)
+            archive_format = PgArchiveTools.detect_format(path)
+            if archive_format is None:
+                continue
+            name = re.sub(r'(\.pg\.sql|\.dump|\.dir)$', '', entry_name)
+            archives.append({'name': name, 'path': path, 'format': archive_format})
+        return archives
+
+    @staticmethod
+    def detect_format(path: str) -> Optional[str]:
+        """
+        'directory', 'custom' or 'plain' for a pg_dump output, None if path is not one
+        Directory archives hold a toc.dat; custom archives start with the PGDMP magic bytes.
+        """
+        if os.path.isdir(path):
+            return 'directory' if os.path.exists(os.path.join(path, 'toc.dat')) else None
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            if f.read(5) == b'PGDMP':
+                return 'custom'
+        # Only export_raw_tables.py's .pg.sql dumps; other .sql files, such as index reports, are not loaded
+        return 'plain' if path.endswith('.pg.sql') else None
+
+    @staticmethod
+    def table_data_entries(toc_text: str) -> List[Dict]:
+        """TABLE DATA entries of a pg_restore --list table of contents: {'dump_id', 'schema', 'table'}"""
+        entries = []
+        for line in toc_text.splitlines():
+            match = PgArchiveTools.TOC_TABLE_DATA_PATTERN.match(line)
+            if match is not None:
+                entries.append({
+                    'dump_id': int(match.group('dump_id')),
+                    'schema': match.group('schema'),
+                    'table': match.group('table'),
+                })
+        return entries
+
+    @staticmethod
+    def table_data_bytes(directory_path: str, toc_text: str) -> Dict[str, int]:
+        """
+        Compressed size of each table's data file in a directory archive, keyed by schema.table
+        Directory archives store each table as {dump_id}.dat, .dat.gz or .dat.zst.
+        """
+        file_bytes = {}
+        for file_name in os.listdir(directory_path):
+            dump_id = file_name.split('.', 1)[0]
+            if dump_id.isdigit() and '.dat' in file_name:
+                file_bytes[int(dump_id)] = os.path.getsize(os.path.join(directory_path, file_name))
+        return {
+            f"{entry['schema']}.{entry['table']}": file_bytes.get(entry['dump_id'], 0)
+            for entry in PgArchiveTools.table_data_entries(toc_text)
+        }
+
+    @staticmethod
+    def table_durations(timed_lines: List[Tuple[float, str]], end_time: float) -> Dict[str, float]:
+        """
+        Seconds spent dumping each table, read from timestamped pg_dump --verbose lines
+        Parallel dumps log when each table finishes; serial dumps only log starts, so a table
+        is taken to end when the next one starts (or at end_time for the last one).
+        Returns: {schema.table: seconds}
+        """
+        starts: List[Tuple[str, float]] = []
+        finishes: Dict[str, float] = {}
+        for line_time, line in timed_lines:
+            start_match = PgArchiveTools.DUMP_START_PATTERN.search(line)
+            if start_match is not None:
+                starts.append((start_match.group('table'), line_time))
+                continue
+            finished_match = PgArchiveTools.DUMP_FINISHED_PATTERN.search(line)
+            if finished_match is not None:
+                finishes[finished_match.group('table')] = line_time
+
+        durations = {}
+        for position, (qualified_table, start_time) in enumerate(starts):
+            table = qualified_table.split('.', 1)[-1]
+            if finishes:
+                finish_time = finishes.get(table, end_time)
+            else:
+                finish_time = starts[position + 1][1] if position + 1 < len(starts) else end_time
+            durations[qualified_table] = round(finish_time - start_time, 3)
+        return durations
+
+    @staticmethod
+    def table_stats_sql(schema: str, is_exact_counts: bool = False) -> str:
+        """
+        psql query listing table|row_count|bytes for every table in a schema
+        Without is_exact_counts the row count is the planner's estimate from the last ANALYZE,
+        which avoids a second full scan of every table; -1 means the table was never analyzed.
+        """
+        row_count_sql = (
+            "(xpath('/row/c/text()', query_to_xml(format('SELECT COUNT(*) AS c FROM %I.%I', n.nspname, c.relname), "
+            "FALSE, TRUE, '')))[1]::TEXT::BIGINT"
+            if is_exact_counts else
+            "c.reltuples::BIGINT"
+        )
+        return (
+            f"SELECT c.relname, {row_count_sql}, pg_total_relation_size(c.oid) "
+            f"FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            f"WHERE n.nspname = '{schema}' AND c.relkind IN ('r', 'p') ORDER BY c.relname"
+        )
+
+    @staticmethod
+    def parse_table_stats(psql_output: str, schema: str) -> Dict[str, Dict]:
+        """Parse psql -At output of table_stats_sql into {schema.table: {'row_count', 'database_bytes'}}"""
+        stats = {}
+        for line in psql_output.splitlines():
+            if not line.strip():
+                continue
+            table, row_count, database_bytes = line.split('|')
+            stats[f"{schema}.{table}"] = {
+                'row_count': int(row_count) if int(row_count) >= 0 else None,
+                'database_bytes': int(database_bytes),
+            }
+        return stats
+
+    @staticmethod
+    def write_manifest(export_dir: str, manifest: Dict) -> str:
+        manifest_path = os.path.join(export_dir, PgArchiveTools.MANIFEST_FILE)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        return manifest_path
+
+    @staticmethod
+    def read_manifest(export_dir: str) -> Optional[Dict]:
+        """The export's manifest.json, or None for exports made before manifests were written"""
+        manifest_path = os.path.join(export_dir, PgArchiveTools.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Phone Normalization Cache
+Remembers raw phone -> E.164 parse results across monthly NPPES runs so that only
+genuinely new phone strings have to go through the phonenumbers library.
+"""
+
+import io
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+import phonenumbers
+
+
+class PhoneNormalizationCache:
+    """
+    Two level cache of PhoneNormalizer._normalize_phone_number results
+    An in-process LRU sits in front of an optional persistent table. Entries are keyed by
+    (raw_phone, default_country, phonenumbers version), so upgrading phonenumbers makes every
+    older entry invisible; the SQL from invalidate_stale_versions_sql() then deletes them.
+    """
+
+    DEFAULT_LRU_SIZE = 500000
+
+    def __init__(self, engine=None, cache_DBTable=None, default_country: str = 'US', lru_size: int = DEFAULT_LRU_SIZE):
+        self.engine = engine
+        self.cache_DBTable = cache_DBTable
+        self.default_country = default_country
+        self.metadata_version = PhoneNormalizationCache.get_metadata_version()
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_metadata_version() -> str:
+        """The phonenumbers release whose metadata produced the cached results"""
+        return phonenumbers.__version__
+
+    @staticmethod
+    def create_table_sql(cache_DBTable) -> str:
+        """SQL that creates the persistent cache table if it is missing"""
+        return f"""
+    CREATE TABLE IF NOT EXISTS {cache_DBTable} (
+        raw_phone TEXT NOT NULL,
+        default_country VARCHAR(2) NOT NULL,
+        metadata_version VARCHAR(20) NOT NULL,
+        phone_e164 VARCHAR(20),
+        country_code VARCHAR(4),
+        is_normalized_success BOOLEAN NOT NULL,
+        error_message TEXT,
+        cached_at TIMESTAMPTZ DEFAULT NOW(),
+        PRIMARY KEY (raw_phone, default_country, metadata_version)
+    );
+    """
+
+    @staticmethod
+    def invalidate_stale_versions_sql(cache_DBTable) -> str:
+        """SQL that drops every cached result produced by a different phonenumbers version"""
+        return f"""
+    DELETE FROM {cache_DBTable}
+    WHERE metadata_version != '{PhoneNormalizationCache.get_metadata_version()}';
+    """
+
+    def _remember(self, raw_phone: str, result: Tuple) -> None:
+        """Put one result in the LRU, evicting the least recently used entry when full"""
+        self._lru[raw_phone] = result
+        self._lru.move_to_end(raw_phone)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, raw_phones: Iterable[str]) -> Dict[str, Tuple]:
+        """
+        Look up many phones at once, LRU first and then one query against the persistent table
+        Returns: dict of raw_phone -> (e164_format, country_code, success, error_message) for the hits
+        """
+        raw_phones = list(raw_phones)
+        found = {}
+        lru_misses = []
+        for raw_phone in raw_phones:
+            if raw_phone in self._lru:
+                self._lru.move_to_end(raw_phone)
+                found[raw_phone] = self._lru[raw_phone]
+            else:
+                lru_misses.append(raw_phone)
+
+        if lru_misses and self.engine is not None:
+            from sqlalchemy import text
+            lookup_sql = text(f"""
+            SELECT raw_phone, phone_e164, country_code, is_normalized_success, error_message
+            FROM {self.cache_DBTable}
+            WHERE default_country = :default_country
+            AND metadata_version = :metadata_version
+            AND raw_phone = ANY(:raw_phones)
+            """)
+            with self.engine.connect() as conn:
+                rows = conn.execute(lookup_sql, {
+                    'default_country': self.default_country,
+                    'metadata_version': self.metadata_version,
+                    'raw_phones': lru_misses
+                }).fetchall()
+            for raw_phone, phone_e164, country_code, success, error_message in rows:
+                result = (phone_e164, country_code, success, error_message)
+                self._remember(raw_phone, result)
+                found[raw_phone] = result
+
+        self.hits += len(found)
+        self.misses += len(raw_phones) - len(found)
+        return found
+
+    @staticmethod
+    def _copy_csv_field(value) -> str:
+        """One COPY CSV field; only None is left unquoted, so it loads as NULL while '' stays an empty string"""
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        return '"' + str(value).replace('"', '""') + '"'
+
+    def put_many(self, results: Dict[str, Tuple]) -> None:
+        """
+        Remember freshly parsed results in the LRU and write them through to the persistent table
+        The rows are streamed with COPY into a temp table and merged with one INSERT ... ON CONFLICT,
+        so the first run's millions of new entries do not each take a round trip.
+        """
+        if not results:
+            return
+        for raw_phone, result in results.items():
+            self._remember(raw_phone, result)
+
+        if self.engine is not None:
+            copy_buffer = io.StringIO()
+            for raw_phone, (phone_e164, country_code, success, error_message) in results.items():
+                fields = (raw_phone, self.default_country, self.metadata_version, phone_e164, country_code, success, error_message)
+                copy_buffer.write(','.join(PhoneNormalizationCache._copy_csv_field(field) for field in fields) + '\n')
+            copy_buffer.seek(0)
+
+            raw_connection = self.engine.raw_connection()
+            try:
+                cursor = raw_connection.cursor()
+                cursor.execute(f"""
+                CREATE TEMP TABLE temp_phone_cache_batch
+                (LIKE {self.cache_DBTable} INCLUDING DEFAULTS) ON COMMIT DROP;
+                """)
+                cursor.copy_expert(f"""
+                COPY temp_phone_cache_batch
+                (raw_phone, default_country, metadata_version, phone_e164, country_code, is_normalized_success, error_message)
+                FROM STDIN WITH (FORMAT csv)
+                """, copy_buffer)
+                cursor.execute(f"""
+                INSERT INTO {self.cache_DBTable}
+                (raw_phone, default_country, metadata_version, phone_e164, country_code, is_normalized_success, error_message)
+                SELECT raw_phone, default_country, metadata_version, phone_e164, country_code, is_normalized_success, error_message
+                FROM temp_phone_cache_batch
+                ON CONFLICT (raw_phone, default_country, metadata_version) DO NOTHING;
+                """)
+                raw_connection.commit()
+            finally:
+                raw_connection.close()
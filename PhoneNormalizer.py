@@ -7,13 +7,53 @@ Provides phone number parsing, validation, and normalization using the phonenumb
 import pandas as pd
 import phonenumbers
 from phonenumbers import NumberParseException
+from phonenumbers import PhoneMetadata
 import re
-from typing import Optional, Tuple
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+
+def _build_us_valid_number_pattern():
+    """
+    Compile every US number-type pattern from the installed phonenumbers metadata into one regex
+    A 10 digit number that matches any of them is one phonenumbers.is_valid_number accepts for US.
+    """
+    us_metadata = PhoneMetadata.metadata_for_region('US')
+    number_descs = [
+        us_metadata.premium_rate, us_metadata.toll_free, us_metadata.shared_cost,
+        us_metadata.voip, us_metadata.personal_number, us_metadata.pager,
+        us_metadata.uan, us_metadata.voicemail, us_metadata.fixed_line, us_metadata.mobile,
+    ]
+    patterns = [
+        f"(?:{desc.national_number_pattern})"
+        for desc in number_descs
+        if desc is not None and desc.national_number_pattern
+    ]
+    return re.compile('|'.join(patterns))
 
 
 class PhoneNormalizer:
     """Phone number normalization and processing utilities"""
     
+    # Common extension patterns, compiled once rather than on every call
+    _EXTENSION_PATTERNS = [
+        re.compile(r'\s+ext\.?\s*(\d+)', re.IGNORECASE),
+        re.compile(r'\s+extension\s+(\d+)', re.IGNORECASE),
+        re.compile(r'\s+x\s*(\d+)', re.IGNORECASE),
+        re.compile(r'\s+#\s*(\d+)', re.IGNORECASE),
+        re.compile(r'\s+ext\s+(\d+)', re.IGNORECASE),
+    ]
+    
+    # Fast path: a bare 10 digit NANP number (NXX-NXX-XXXX, neither part an N11 service code)
+    # that also matches the US patterns in the phonenumbers metadata can be emitted as E.164
+    # directly. Anything else goes through phonenumbers.parse.
+    _NANP_TEN_DIGIT_PATTERN = re.compile(r'[2-9](?!11)[0-9]{2}[2-9](?!11)[0-9]{2}[0-9]{4}')
+    _US_VALID_NUMBER_PATTERN = _build_us_valid_number_pattern()
+    
+    # How many numbers took the fast path vs. the full phonenumbers path in this process
+    path_counts = Counter()
+    
     @staticmethod
     def _extract_extension_from_text(phone_text: str) -> Tuple[str, Optional[str]]:
         """
@@ -26,25 +66,34 @@ class PhoneNormalizer:
         phone_text = str(phone_text).strip()
         if not phone_text:
             return "", None
-            
-        # Common extension patterns
-        extension_patterns = [
-            r'\s+ext\.?\s*(\d+)',
-            r'\s+extension\s+(\d+)',
-            r'\s+x\s*(\d+)',
-            r'\s+#\s*(\d+)',
-            r'\s+ext\s+(\d+)',
-        ]
         
-        for pattern in extension_patterns:
-            match = re.search(pattern, phone_text, re.IGNORECASE)
+        # Bare digit strings cannot carry an extension
+        if phone_text.isdigit():
+            return phone_text, None
+        
+        for pattern in PhoneNormalizer._EXTENSION_PATTERNS:
+            match = pattern.search(phone_text)
             if match:
                 extension = match.group(1)
-                clean_phone = re.sub(pattern, '', phone_text, flags=re.IGNORECASE).strip()
+                clean_phone = pattern.sub('', phone_text).strip()
                 return clean_phone, extension
                 
         return phone_text, None
     
+    @staticmethod
+    def _fast_path_e164(raw_phone: str, default_country: str = 'US') -> Optional[str]:
+        """
+        Return the E.164 form of a well-formed 10 digit US number without calling phonenumbers
+        Returns None when the number is irregular and needs the full parse.
+        """
+        if default_country != 'US' or not isinstance(raw_phone, str) or len(raw_phone) != 10:
+            return None
+        if not PhoneNormalizer._NANP_TEN_DIGIT_PATTERN.fullmatch(raw_phone):
+            return None
+        if not PhoneNormalizer._US_VALID_NUMBER_PATTERN.fullmatch(raw_phone):
+            return None
+        return '+1' + raw_phone
+    
     @staticmethod
     def _normalize_phone_number(raw_phone: str, default_country: str = 'US') -> Tuple[Optional[str], Optional[str], bool, Optional[str]]:
         """
@@ -53,7 +102,13 @@ class PhoneNormalizer:
         """
         if not raw_phone or pd.isna(raw_phone):
             return None, None, False, "Empty phone number"
-            
+        
+        fast_e164 = PhoneNormalizer._fast_path_e164(raw_phone, default_country)
+        if fast_e164 is not None:
+            PhoneNormalizer.path_counts['fast'] += 1
+            return fast_e164, '1', True, None
+        
+        PhoneNormalizer.path_counts['slow'] += 1
         try:
             # Parse the phone number
             parsed_number = phonenumbers.parse(raw_phone, default_country)
@@ -112,3 +167,130 @@ class PhoneNormalizer:
         result['error_message'] = error_msg
         
         return result
+    
+    @staticmethod
+    def _split_staging_phone(raw_phone: str, raw_extension: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        Work out which text to parse and which extension to keep for a staging record
+        The raw phone is only replaced by its cleaned version when an extension was pulled out of it.
+        Returns: (phone_to_normalize, final_extension)
+        """
+        if pd.isna(raw_extension) or not raw_extension:
+            raw_extension = None
+            clean_phone, extracted_extension = PhoneNormalizer._extract_extension_from_text(raw_phone)
+            if extracted_extension:
+                raw_extension = extracted_extension
+                raw_phone = clean_phone
+        return raw_phone, raw_extension
+    
+    @staticmethod
+    def normalize_staging_record(raw_phone: str, raw_extension: Optional[str] = None, default_country: str = 'US') -> Tuple[Optional[str], Optional[str], bool, Optional[str], Optional[str]]:
+        """
+        Normalize a single intake.staging_phone record
+        Returns: (e164_format, country_code, success, final_extension, error_message)
+        """
+        phone_to_normalize, final_extension = PhoneNormalizer._split_staging_phone(raw_phone, raw_extension)
+        e164_format, country_code, success, error_msg = PhoneNormalizer._normalize_phone_number(phone_to_normalize, default_country)
+        return e164_format, country_code, success, final_extension, error_msg
+    
+    @staticmethod
+    def _normalize_chunk(phones_to_normalize: List, default_country: str = 'US') -> Tuple[List[tuple], Counter]:
+        """
+        Parse one chunk of phone strings, used as the unit of work for worker processes
+        Returns: (list of (e164_format, country_code, success, error_message), fast/slow path counts for this chunk)
+        """
+        counts_before = Counter(PhoneNormalizer.path_counts)
+        results = [
+            PhoneNormalizer._normalize_phone_number(phone_to_normalize, default_country)
+            for phone_to_normalize in phones_to_normalize
+        ]
+        return results, PhoneNormalizer.path_counts - counts_before
+    
+    @staticmethod
+    def normalize_many(phones: Iterable, workers: Optional[int] = None, chunksize: int = 1000,
+                       default_country: str = 'US', executor: Optional[Executor] = None,
+                       cache=None) -> List[Tuple[Optional[str], Optional[str], bool, Optional[str], Optional[str]]]:
+        """
+        Normalize many staging phones, optionally across a pool of worker processes
+        Each item is either a raw phone string or a (raw_phone, raw_extension) pair.
+        Results are always returned in input order. With workers of None or 1 (and no executor)
+        everything runs in this process, which gives the same output as the pooled path.
+        Pass an already running executor to reuse one pool across many calls.
+        Each distinct phone text is parsed once. When a PhoneNormalizationCache is given it is
+        consulted first and only the phones it has never seen are parsed.
+        Returns: list of (e164_format, country_code, success, final_extension, error_message)
+        """
+        phones_to_normalize = []
+        final_extensions = []
+        for item in phones:
+            if isinstance(item, tuple):
+                raw_phone, raw_extension = item
+            else:
+                raw_phone, raw_extension = item, None
+            phone_to_normalize, final_extension = PhoneNormalizer._split_staging_phone(raw_phone, raw_extension)
+            phones_to_normalize.append(phone_to_normalize)
+            final_extensions.append(final_extension)
+        
+        if cache is not None and cache.default_country != default_country:
+            raise ValueError(f"Cache holds results for {cache.default_country}, not {default_country}")
+        
+        distinct_phones = list(dict.fromkeys(
+            phone_to_normalize for phone_to_normalize in phones_to_normalize if isinstance(phone_to_normalize, str)
+        ))
+        parsed = cache.get_many(distinct_phones) if cache is not None else {}
+        unparsed_phones = [phone_to_normalize for phone_to_normalize in distinct_phones if phone_to_normalize not in parsed]
+        
+        if executor is None and (not workers or workers <= 1):
+            unparsed_results, _ = PhoneNormalizer._normalize_chunk(unparsed_phones, default_country)
+        else:
+            phone_chunks = [unparsed_phones[start:start + chunksize] for start in range(0, len(unparsed_phones), chunksize)]
+            country_chunks = [default_country] * len(phone_chunks)
+            if executor is not None:
+                chunk_results = list(executor.map(PhoneNormalizer._normalize_chunk, phone_chunks, country_chunks))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    chunk_results = list(pool.map(PhoneNormalizer._normalize_chunk, phone_chunks, country_chunks))
+            
+            # Worker processes keep their own counters, so fold them back into this process
+            unparsed_results = []
+            for chunk_result, chunk_counts in chunk_results:
+                unparsed_results.extend(chunk_result)
+                PhoneNormalizer.path_counts.update(chunk_counts)
+        
+        new_results = dict(zip(unparsed_phones, unparsed_results))
+        if cache is not None:
+            cache.put_many(new_results)
+        parsed.update(new_results)
+        
+        results = []
+        for phone_to_normalize, final_extension in zip(phones_to_normalize, final_extensions):
+            if isinstance(phone_to_normalize, str):
+                e164_format, country_code, success, error_msg = parsed[phone_to_normalize]
+            else:
+                e164_format, country_code, success, error_msg = PhoneNormalizer._normalize_phone_number(phone_to_normalize, default_country)
+            results.append((e164_format, country_code, success, final_extension, error_msg))
+        return results
+    
+    @staticmethod
+    def normalize_staging_frame(staging_df: pd.DataFrame, default_country: str = 'US', executor: Optional[Executor] = None,
+                                cache=None) -> pd.DataFrame:
+        """
+        Normalize a chunk of intake.staging_phone records in one pass
+        Expects the columns id, raw_phone and raw_phone_extension.
+        When an executor is given the phone parsing is spread over its worker processes,
+        and when a PhoneNormalizationCache is given previously parsed phones are reused.
+        Returns: DataFrame with id, phone_e164, country_code, is_normalized_success, raw_phone_extension, error_msg
+        """
+        results = PhoneNormalizer.normalize_many(
+            zip(staging_df['raw_phone'], staging_df['raw_phone_extension']),
+            default_country=default_country,
+            executor=executor,
+            cache=cache
+        )
+        
+        result_df = pd.DataFrame(
+            results,
+            columns=['phone_e164', 'country_code', 'is_normalized_success', 'raw_phone_extension', 'error_msg']
+        )
+        result_df.insert(0, 'id', staging_df['id'].to_numpy())
+        return result_df
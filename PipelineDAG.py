@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Pipeline Dependency Graph Runner
+Runs import and post-import steps from a declarative graph of the tables each step reads and writes.
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+
+class PipelineDAG:
+    """
+    Dependency graph of pipeline steps, derived from what each step reads and writes
+    A step depends on the last earlier step that wrote any table it reads or writes, and a step that writes
+    a table also waits for every earlier step that reads it since that write. Listing order in the graph
+    is therefore always a valid serial order, and steps touching disjoint tables run in parallel.
+    Steps can also name explicit 'after' dependencies for ordering the tables do not capture.
+    """
+
+    VARIABLE_PATTERN = re.compile(r'\$\{(\w+)\}')
+
+    def __init__(self, steps: List[Dict], env: Dict[str, str], base_dir: str = '.'):
+        self.env = env
+        self.base_dir = base_dir
+        self.steps = [self._expand_step(step) for step in steps]
+        self.steps_by_name = {step['name']: step for step in self.steps}
+        if len(self.steps_by_name) != len(self.steps):
+            raise ValueError("Step names in the pipeline graph must be unique")
+        self.dependencies = self._derive_dependencies()
+
+    @staticmethod
+    def load(graph_path: str, env: Dict[str, str]) -> 'PipelineDAG':
+        with open(graph_path) as f:
+            graph = json.load(f)
+        return PipelineDAG(graph['steps'], env, base_dir=os.path.dirname(os.path.abspath(graph_path)))
+
+    def _expand(self, value: str) -> str:
+        return self.VARIABLE_PATTERN.sub(lambda match: self.env.get(match.group(1), match.group(0)), value)
+
+    def _expand_step(self, step: Dict) -> Dict:
+        """The step with ${VAR} references filled in from env; unknown ones are left as they are"""
+        return {
+            'name': step['name'],
+            'command': [self._expand(part) for part in step['command']],
+            'reads': [self._expand(table) for table in step.get('reads', [])],
+            'writes': [self._expand(table) for table in step.get('writes', [])],
+            'inputs': [self._expand(path) for path in step.get('inputs', [])],
+            'after': list(step.get('after', [])),
+        }
+
+    def _derive_dependencies(self) -> Dict[str, Set[str]]:
+        dependencies: Dict[str, Set[str]] = {}
+        last_writer: Dict[str, str] = {}
+        readers_since_write: Dict[str, Set[str]] = {}
+        for step in self.steps:
+            step_dependencies = set(step['after'])
+            unknown = step_dependencies - set(self.steps_by_name)
+            if unknown:
+                raise ValueError(f"{step['name']} runs after unknown step(s): {', '.join(sorted(unknown))}")
+            for table in step['reads'] + step['writes']:
+                if table in last_writer:
+                    step_dependencies.add(last_writer[table])
+            for table in step['writes']:
+                step_dependencies |= readers_since_write.get(table, set())
+            step_dependencies.discard(step['name'])
+            dependencies[step['name']] = step_dependencies
+
+            for table in step['reads']:
+                readers_since_write.setdefault(table, set()).add(step['name'])
+            for table in step['writes']:
+                last_writer[table] = step['name']
+                readers_since_write[table] = set()
+        return dependencies
+
+    def missing_variables(self, step_names: List[str]) -> Dict[str, List[str]]:
+        """Unresolved ${VAR} references of each step, for the steps that have any"""
+        missing = {}
+        for name in step_names:
+            step = self.steps_by_name[name]
+            values = step['command'] + step['reads'] + step['writes'] + step['inputs']
+            variables = sorted({match for value in values for match in self.VARIABLE_PATTERN.findall(value)})
+            if variables:
+                missing[name] = variables
+        return missing
+
+    def with_ancestors(self, targets: List[str]) -> List[str]:
+        """The targets and every step they depend on, in graph order"""
+        unknown = [target for target in targets if target not in self.steps_by_name]
+        if unknown:
+            raise ValueError(f"Unknown step(s): {', '.join(unknown)}")
+        selected: Set[str] = set()
+        to_visit = list(targets)
+        while to_visit:
+            name = to_visit.pop()
+            if name not in selected:
+                selected.add(name)
+                to_visit.extend(self.dependencies[name])
+        return [step['name'] for step in self.steps if step['name'] in selected]
+
+    def _path_fingerprint(self, path: str) -> str:
+        path = os.path.join(self.base_dir, path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            return f"{stat.st_size}:{stat.st_mtime_ns}"
+        if os.path.isdir(path):
+            return hashlib.sha256('|'.join(
+                f"{os.path.relpath(os.path.join(directory, file_name), path)}:{self._path_fingerprint(os.path.join(directory, file_name))}"
+                for directory, _, file_names in sorted(os.walk(path)) for file_name in sorted(file_names)
+            ).encode()).hexdigest()
+        return 'missing'
+
+    def fingerprint(self, name: str, dependency_fingerprints: Dict[str, str]) -> str:
+        """
+        What a step's result depends on: its command, the size and modification time of its input files
+        (including any file its command names, such as the script it runs), and its dependencies' fingerprints
+        """
+        step = self.steps_by_name[name]
+        command_files = [part for part in step['command'] if os.path.isfile(os.path.join(self.base_dir, part))]
+        parts = [json.dumps(step['command'])]
+        parts += [f"{path}={self._path_fingerprint(path)}" for path in step['inputs'] + command_files]
+        parts += [f"{dependency}={dependency_fingerprints.get(dependency, '')}"
+                  for dependency in sorted(self.dependencies[name])]
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def critical_path(self, durations: Dict[str, float], step_names: Optional[List[str]] = None) -> List[str]:
+        """
+        The chain of dependent steps with the largest total duration, i.e. the shortest possible wall time
+        with unlimited workers. Steps missing from durations (skipped or not run) count as zero.
+        """
+        step_names = step_names or [step['name'] for step in self.steps]
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in step_names:
+            ready_dependencies = [dependency for dependency in self.dependencies[name] if dependency in finish]
+            slowest = max(ready_dependencies, key=lambda dependency: finish[dependency], default=None)
+            previous[name] = slowest
+            finish[name] = (finish[slowest] if slowest is not None else 0.0) + durations.get(name, 0.0)
+        if not finish:
+            return []
+        name = max(finish, key=lambda step_name: finish[step_name])
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return list(reversed(path))
+
+    def _run_step(self, name: str, log_dir: str) -> float:
+        step = self.steps_by_name[name]
+        log_path = os.path.join(log_dir, f"{name}.log")
+        start_time = time.time()
+        with open(log_path, 'w') as log_file:
+            log_file.write(f"$ {' '.join(step['command'])}\n")
+            log_file.flush()
+            # Steps run side by side, so none of them can prompt; their output goes to the step's log
+            subprocess.run(step['command'], cwd=self.base_dir, stdin=subprocess.DEVNULL,
+                           stdout=log_file, stderr=subprocess.STDOUT, check=True)
+        return time.time() - start_time
+
+    def run(self, step_names: List[str], workers: int = 4, state_path: str = 'pipeline_state.json',
+            log_dir: str = 'pipeline_logs', is_force: bool = False) -> Dict[str, Dict]:
+        """
+        Run the given steps, up to workers at a time, each as soon as everything it depends on has finished
+        A step is skipped when its fingerprint matches its last successful run and none of its dependencies
+        ran this time. Steps after a failure are not started; independent branches carry on.
+        Returns: {step: {'status': ran|skipped|failed|blocked, 'seconds', 'started_at', 'log'}}
+        """
+        state = {}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        os.makedirs(log_dir, exist_ok=True)
+
+        selected = set(step_names)
+        results: Dict[str, Dict] = {}
+        fingerprints: Dict[str, str] = {}
+        pending = list(step_names)
+        running = {}
+        run_start = time.time()
+
+        def save_state():
+            with open(state_path, 'w') as f:
+                json.dump(state, f, indent=2)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while pending or running:
+                for name in list(pending):
+                    dependencies = self.dependencies[name] & selected
+                    if any(results.get(dependency, {}).get('status') in ('failed', 'blocked') for dependency in dependencies):
+                        results[name] = {'status': 'blocked', 'seconds': 0.0}
+                        pending.remove(name)
+                        print(f"⏸  {name} not started, an upstream step failed")
+                        continue
+                    if not all(dependency in results for dependency in dependencies):
+                        continue
+                    if len(running) >= max(1, workers):
+                        break
+                    pending.remove(name)
+                    for dependency in self.dependencies[name] - selected:
+                        fingerprints.setdefault(dependency, state.get(dependency, {}).get('fingerprint', ''))
+                    fingerprints[name] = self.fingerprint(name, fingerprints)
+                    is_upstream_rerun = any(results[dependency]['status'] == 'ran' for dependency in dependencies)
+                    if not is_force and not is_upstream_rerun and state.get(name, {}).get('fingerprint') == fingerprints[name]:
+                        results[name] = {'status': 'skipped', 'seconds': 0.0}
+                        print(f"⏭  {name} skipped, inputs unchanged since {state[name]['finished_at']}")
+                        continue
+                    print(f"▶  {name}")
+                    running[pool.submit(self._run_step, name, log_dir)] = (name, time.time() - run_start)
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, started_at = running.pop(future)
+                    log_path = os.path.join(log_dir, f"{name}.log")
+                    try:
+                        seconds = future.result()
+                        results[name] = {'status': 'ran', 'seconds': seconds, 'started_at': started_at, 'log': log_path}
+                        state[name] = {
+                            'fingerprint': fingerprints[name],
+                            'finished_at': datetime.now().isoformat(timespec='seconds'),
+                            'seconds': round(seconds, 3),
+                        }
+                        print(f"✓  {name} ({seconds:.1f} seconds)")
+                    except (subprocess.CalledProcessError, OSError) as e:
+                        results[name] = {'status': 'failed', 'seconds': time.time() - run_start - started_at,
+                                         'started_at': started_at, 'log': log_path}
+                        state.pop(name, None)
+                        print(f"❌ {name} failed ({e}), see {log_path}")
+                    save_state()
+        return results
+
+    def timing_report(self, results: Dict[str, Dict], wall_seconds: float) -> str:
+        """Per-step timings, the critical path and how much the parallel run saved over a serial one"""
+        durations = {name: result['seconds'] for name, result in results.items() if result['status'] == 'ran'}
+        path = self.critical_path(durations, [name for name in self.steps_by_name if name in results])
+        lines = ["=" * 70, f"{'Step':<45} {'Status':<8} {'Start':>7} {'Seconds':>8}", "=" * 70]
+        for name, result in sorted(results.items(), key=lambda item: item[1].get('started_at', float('inf'))):
+            started_at = f"{result['started_at']:.0f}" if 'started_at' in result else ''
+            marker = ' *' if name in path and name in durations else ''
+            lines.append(f"{name + marker:<45} {result['status']:<8} {started_at:>7} {result['seconds']:>8.1f}")
+        lines += [
+            "=" * 70,
+            "Critical path (*): " + ' -> '.join(name for name in path if name in durations),
+            f"Critical path time: {sum(durations.get(name, 0.0) for name in path):.1f} seconds",
+            f"Wall time: {wall_seconds:.1f} seconds, serial time would have been {sum(durations.values()):.1f} seconds",
+        ]
+        return '\n'.join(lines)
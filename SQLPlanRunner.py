@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+SQL Plan Runner
+Runs a FrostDict plan one statement at a time through SQLoopcicle, so that callers can
+checkpoint, skip already completed steps, resume from a named step, or record how long each step took.
+"""
+
+import json
+import re
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+
+class SQLPlanRunner:
+    """Step-by-step execution of an ordered FrostDict of SQL statements"""
+
+    TIMING_TABLE = 'intake.sql_step_timing'
+
+    # Statements that EXPLAIN (ANALYZE) can run in place of the statement itself
+    EXPLAINABLE_STATEMENT = re.compile(
+        r'^(SELECT|INSERT|UPDATE|DELETE|WITH|MERGE|CREATE\s+(UNLOGGED\s+|TEMP\s+|TEMPORARY\s+)?TABLE\s+\S+\s+AS)\b',
+        re.IGNORECASE
+    )
+
+    # Opening tag of a dollar-quoted body such as $$ or $body$
+    DOLLAR_QUOTE = re.compile(r'\$(?:[A-Za-z_]\w*)?\$')
+
+    @staticmethod
+    def steps_before(sql_dict, from_step: str) -> List[str]:
+        """
+        Keys that come before the first key starting with from_step
+        from_step can be a full key or a prefix such as '13' or '13b'.
+        """
+        keys = list(sql_dict.keys())
+        for position, key in enumerate(keys):
+            if key.startswith(from_step):
+                return keys[:position]
+        raise ValueError(f"No step in the plan starts with '{from_step}'. Steps are: {', '.join(keys)}")
+
+    @staticmethod
+    def run_steps(sql_dict, engine, is_just_print: bool = False, skip_steps: Iterable[str] = (),
+                  only_steps: Optional[Iterable[str]] = None,
+                  on_step_complete: Optional[Callable[[str], None]] = None,
+                  timing_script: Optional[str] = None, is_explain_analyze: bool = False) -> List[str]:
+        """
+        Run every statement in plan order, each as its own single-step SQLoopcicle loop
+        Steps in skip_steps are not run; when only_steps is given, steps outside it are quietly left out.
+        on_step_complete(key) is called after each step succeeds, which is where callers record checkpoints.
+        When timing_script is given, each step's wall time and rowcount (and, with is_explain_analyze,
+        its EXPLAIN (ANALYZE, BUFFERS) plan) are recorded in intake.sql_step_timing under that script name.
+        Returns: the keys that were run
+        """
+        from plainerflow import FrostDict, SQLoopcicle  # type: ignore
+
+        is_timed = timing_script is not None and not is_just_print
+        if is_timed:
+            SQLPlanRunner.create_timing_table(engine)
+            run_started_at = datetime.now()
+
+        skip_steps = set(skip_steps)
+        only_steps = set(only_steps) if only_steps is not None else None
+        ran_steps = []
+        for key, statement in sql_dict.items():
+            if only_steps is not None and key not in only_steps:
+                continue
+            if key in skip_steps:
+                print(f"Skipping {key} (already completed)")
+                continue
+            if is_timed:
+                SQLPlanRunner.run_timed_step(engine, timing_script, run_started_at, key, statement,
+                                             is_explain_analyze)
+            else:
+                step_sql = FrostDict()
+                step_sql[key] = statement
+                SQLoopcicle.run_sql_loop(
+                    sql_dict=step_sql,
+                    is_just_print=is_just_print,
+                    engine=engine
+                )
+            ran_steps.append(key)
+            if on_step_complete is not None:
+                on_step_complete(key)
+        return ran_steps
+
+    @staticmethod
+    def run_timed(sql_dict, engine, script_name: str, is_just_print: bool = False,
+                  is_explain_analyze: bool = False) -> List[str]:
+        """Drop-in replacement for SQLoopcicle.run_sql_loop that records every step in intake.sql_step_timing"""
+        return SQLPlanRunner.run_steps(sql_dict, engine, is_just_print,
+                                       timing_script=script_name, is_explain_analyze=is_explain_analyze)
+
+    @staticmethod
+    def create_timing_table(engine) -> None:
+        """Create intake.sql_step_timing if it does not exist yet"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {SQLPlanRunner.TIMING_TABLE} (
+                id SERIAL PRIMARY KEY,
+                script_name VARCHAR(100) NOT NULL,
+                run_started_at TIMESTAMP NOT NULL,
+                step_key VARCHAR(200) NOT NULL,
+                step_started_at TIMESTAMP NOT NULL,
+                duration_seconds NUMERIC(12, 3) NOT NULL,
+                row_count BIGINT,
+                explain_plan JSONB
+            );
+            CREATE INDEX IF NOT EXISTS idx_sql_step_timing_script_step
+            ON {SQLPlanRunner.TIMING_TABLE}(script_name, step_key, run_started_at);
+            """))
+            conn.commit()
+
+    @staticmethod
+    def split_statements(step_sql: str) -> List[str]:
+        """The statements of a step, split on semicolons outside quotes and $$ bodies, without -- comments"""
+        statements = []
+        current = []
+        quote = None
+        position = 0
+        while position < len(step_sql):
+            char = step_sql[position]
+            if quote is not None:
+                current.append(char)
+                if char == quote:
+                    quote = None
+            elif char in ("'", '"'):
+                quote = char
+                current.append(char)
+            elif SQLPlanRunner.DOLLAR_QUOTE.match(step_sql, position):
+                # A DO $$ ... $$ body is copied through to its closing tag, semicolons and all
+                tag = SQLPlanRunner.DOLLAR_QUOTE.match(step_sql, position).group(0)
+                body_end = step_sql.find(tag, position + len(tag))
+                body_end = len(step_sql) if body_end == -1 else body_end + len(tag)
+                current.append(step_sql[position:body_end])
+                position = body_end
+                continue
+            elif step_sql.startswith('--', position):
+                line_end = step_sql.find('\n', position)
+                position = len(step_sql) if line_end == -1 else line_end
+                continue
+            elif char == ';':
+                statements.append(''.join(current).strip())
+                current = []
+            else:
+                current.append(char)
+            position += 1
+        statements.append(''.join(current).strip())
+        return [statement for statement in statements if statement]
+
+    @staticmethod
+    def explainable_statement(statement: str) -> Optional[str]:
+        """
+        The statement without comments and its trailing semicolon, if EXPLAIN (ANALYZE) can run it
+        Steps holding several statements, or DDL such as CREATE INDEX, return None; run_timed_step
+        splits multi-statement steps with split_statements first.
+        """
+        statements = SQLPlanRunner.split_statements(statement)
+        if len(statements) != 1 or not SQLPlanRunner.EXPLAINABLE_STATEMENT.match(statements[0]):
+            return None
+        return statements[0]
+
+    @staticmethod
+    def plan_row_count(explain_plan) -> Optional[int]:
+        """
+        Rows produced by the statement, read from its EXPLAIN (ANALYZE, FORMAT JSON) output
+        For INSERT/UPDATE/DELETE the top ModifyTable node reports 0 rows, so its input is counted instead.
+        """
+        plan_node = explain_plan[0]['Plan']
+        if plan_node.get('Node Type') == 'ModifyTable' and plan_node.get('Plans'):
+            plan_node = plan_node['Plans'][0]
+        if 'Actual Rows' not in plan_node:
+            return None
+        return int(plan_node['Actual Rows'] * plan_node.get('Actual Loops', 1))
+
+    @staticmethod
+    def run_timed_step(engine, script_name: str, run_started_at: datetime, key: str, statement: str,
+                       is_explain_analyze: bool = False) -> None:
+        """
+        Run one step on its own connection and record its wall time and rowcount
+        With is_explain_analyze, the step is split into its statements and each explainable one
+        (e.g. the CREATE TABLE ... AS of a scratch table step) runs as EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON),
+        which executes it exactly once and keeps the plan; the others run as they are, in order.
+        Statements are sent without parameters, so a literal % (such as the pg_trgm operator) is left alone.
+        """
+        from sqlalchemy import text
+
+        explain_plan = None
+        row_count = None
+        print(f"Running {key}")
+        step_started_at = datetime.now()
+        start_time = time.time()
+        with engine.connect() as conn:
+            conn = conn.execution_options(no_parameters=True)
+            if is_explain_analyze:
+                explain_plan = []
+                for single_statement in SQLPlanRunner.split_statements(statement):
+                    explain_statement = SQLPlanRunner.explainable_statement(single_statement)
+                    if explain_statement is None:
+                        conn.exec_driver_sql(single_statement)
+                        continue
+                    statement_plan = conn.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {explain_statement}"
+                    ).scalar()
+                    if isinstance(statement_plan, str):
+                        statement_plan = json.loads(statement_plan)
+                    explain_plan += statement_plan
+                row_counts = [SQLPlanRunner.plan_row_count([plan]) for plan in explain_plan]
+                if any(count is not None for count in row_counts):
+                    row_count = sum(count for count in row_counts if count is not None)
+                explain_plan = explain_plan or None
+            else:
+                result = conn.exec_driver_sql(statement)
+                row_count = result.rowcount if result.rowcount >= 0 else None
+            conn.commit()
+        duration_seconds = time.time() - start_time
+        print(f"{key}: {duration_seconds:.1f} seconds"
+              + (f", {row_count:,} rows" if row_count is not None else ""))
+
+        with engine.connect() as conn:
+            conn.execute(text(f"""
+            INSERT INTO {SQLPlanRunner.TIMING_TABLE}
+                (script_name, run_started_at, step_key, step_started_at, duration_seconds, row_count, explain_plan)
+            VALUES (:script_name, :run_started_at, :step_key, :step_started_at, :duration_seconds, :row_count,
+                    CAST(:explain_plan AS JSONB))
+            """), {
+                'script_name': script_name,
+                'run_started_at': run_started_at,
+                'step_key': key,
+                'step_started_at': step_started_at,
+                'duration_seconds': round(duration_seconds, 3),
+                'row_count': row_count,
+                'explain_plan': json.dumps(explain_plan) if explain_plan is not None else None,
+            })
+            conn.commit()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Scratch Table Utilities
+Throwaway intermediate tables for the post-import scripts: UNLOGGED (or session TEMP),
+ANALYZEd as soon as they are populated, and dropped when the script is done with them.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+
+class ScratchTables:
+    """
+    Registry of the intermediate tables a post-import script creates
+    Scratch tables hold millions of rows that are thrown away after the run, so writing them to WAL
+    only costs time and disk. UNLOGGED tables skip WAL and are visible to every connection.
+    use_temp=True creates session TEMP tables in pg_temp instead, which is only safe when every
+    statement of the script runs on one connection.
+    """
+
+    def __init__(self, schema: str = 'intake', unlogged: bool = True, use_temp: bool = False):
+        self.schema = schema
+        self.unlogged = unlogged
+        self.use_temp = use_temp
+        self.tables: List = []
+
+    def table(self, table_name: str):
+        """Register a scratch table and return the DBTable the script should use to refer to it"""
+        from plainerflow import DBTable  # type: ignore
+        scratch_DBTable = DBTable(schema='pg_temp' if self.use_temp else self.schema, table=table_name)
+        self.tables.append(scratch_DBTable)
+        return scratch_DBTable
+
+    def _create_clause(self) -> str:
+        if self.use_temp:
+            return 'CREATE TEMP TABLE'
+        if self.unlogged:
+            return 'CREATE UNLOGGED TABLE'
+        return 'CREATE TABLE'
+
+    def create_table_as_sql(self, scratch_DBTable, select_sql: str) -> str:
+        """
+        SQL that (re)creates a scratch table from a query and ANALYZEs it
+        select_sql may be followed by more statements that shape the table (keys, indexes);
+        the ANALYZE runs after all of them.
+        """
+        return f"""
+    DROP TABLE IF EXISTS {scratch_DBTable};
+    {self._create_clause()} {scratch_DBTable} AS
+    {select_sql.strip().rstrip(';')};
+    ANALYZE {scratch_DBTable};
+    """
+
+    def creating_steps(self, sql_dict) -> Dict[str, object]:
+        """The plan step that creates each registered scratch table, as {step_key: scratch_DBTable}"""
+        steps = {}
+        for scratch_DBTable in self.tables:
+            create_statement = f"{self._create_clause()} {scratch_DBTable} AS"
+            for key, statement in sql_dict.items():
+                if create_statement in statement:
+                    steps[key] = scratch_DBTable
+                    break
+        return steps
+
+    def steps_to_rebuild(self, engine, sql_dict, skipped_steps: Iterable[str],
+                         step_checkpoints: Optional[Dict[str, str]]) -> List[str]:
+        """
+        Skipped steps whose scratch table a resumed run cannot rely on, in plan order
+        A table is lost when it no longer exists, when its step has no checkpoint, or when the server
+        has started since that checkpoint: crash recovery empties UNLOGGED tables and a restart ends
+        every TEMP table's session.
+        """
+        from sqlalchemy import text
+        skipped_steps = set(skipped_steps)
+        step_checkpoints = step_checkpoints or {}
+        lost_steps = []
+        with engine.connect() as conn:
+            for key, scratch_DBTable in self.creating_steps(sql_dict).items():
+                if key not in skipped_steps:
+                    continue
+                is_intact = conn.execute(text("""
+                SELECT to_regclass(:table_name) IS NOT NULL
+                AND CAST(:checkpoint AS TIMESTAMPTZ) > pg_postmaster_start_time()
+                """), {'table_name': str(scratch_DBTable), 'checkpoint': step_checkpoints.get(key)}).scalar()
+                if not is_intact:
+                    lost_steps.append(key)
+        return lost_steps
+
+    def drop_all_sql(self) -> str:
+        """SQL that drops every registered scratch table"""
+        return '\n'.join(f"DROP TABLE IF EXISTS {scratch_DBTable};" for scratch_DBTable in self.tables)
+
+    def drop_all(self, engine) -> None:
+        """Drop every registered scratch table, meant for a finally block"""
+        if not self.tables:
+            return
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            conn.execute(text(self.drop_all_sql()))
+            conn.commit()
+        print(f"Dropped {len(self.tables)} scratch tables")
+
+    @staticmethod
+    def current_wal_lsn(engine) -> str:
+        """The server's current WAL insert position, to measure how much WAL a run writes"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT pg_current_wal_lsn()::TEXT")).scalar()
+
+    @staticmethod
+    def wal_bytes_since(engine, start_lsn: str) -> int:
+        """Bytes of WAL written since start_lsn, by every session on the server"""
+        from sqlalchemy import text
+        with engine.connect() as conn:
+            return int(conn.execute(
+                text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), CAST(:start_lsn AS pg_lsn))"),
+                {'start_lsn': start_lsn}
+            ).scalar())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Delta snapshots of the raw data import schemas between monthly releases.
+
+base   writes every row of every raw table (the schemas export_raw_tables.py exports) as
+       gzip-compressed COPY files into ./local_data/export/snapshots/{label}/
+delta  writes only the rows inserted, updated or deleted since the previous snapshot (--parent,
+       default the latest one), keyed on row_hash (Step07) or the MD5 of the whole row
+apply  brings the raw tables of this database to a snapshot: the base (with --load_base) and then
+       every delta up to --label, each table in its own transaction and checked against the
+       row count recorded in the manifest
+
+The tables must already exist when applying, e.g. from the import scripts or import_from_previous_export.py.
+To share a month's change, only the delta's .rows.gz and .deleted.gz files and manifest.json are needed;
+the .hashes.gz files are what the next delta is diffed against.
+
+Usage:
+    python delta_snapshot.py base --label 2025_06
+    python delta_snapshot.py delta --label 2025_07
+    python delta_snapshot.py apply --label 2025_07 --load_base
+"""
+
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv  # type: ignore
+
+from export_raw_tables import get_raw_schemas
+
+# DeltaSnapshot lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from DeltaSnapshot import DeltaSnapshot
+
+def connect():
+    """
+    Opens a psycopg2 connection from the parent .env, or returns None if it is incomplete.
+    """
+    import psycopg2  # type: ignore
+    parent_env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+    load_dotenv(dotenv_path=parent_env_path)
+    db_config = {key: os.getenv(key) for key in ['DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_NAME']}
+    if not all(db_config.values()):
+        print("Error: Database connection details not found in .env file.")
+        print("Please ensure DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, and DB_NAME are set.")
+        return None
+    return psycopg2.connect(
+        host=db_config['DB_HOST'],
+        port=db_config['DB_PORT'],
+        dbname=db_config['DB_NAME'],
+        user=db_config['DB_USER'],
+        password=db_config['DB_PASSWORD']
+    )
+
+def export_snapshot(connection, snapshot_root, label, parent, compress_level):
+    """
+    Writes a base snapshot (parent None) or a delta against parent.
+    """
+    snapshot_dir = os.path.join(snapshot_root, label)
+    if os.path.exists(os.path.join(snapshot_dir, DeltaSnapshot.MANIFEST_FILE)):
+        print(f"Error: snapshot '{label}' already exists in {snapshot_root}")
+        return
+    os.makedirs(snapshot_dir, exist_ok=True)
+    parent_dir = os.path.join(snapshot_root, parent) if parent is not None else None
+    parent_tables = DeltaSnapshot.read_manifest(parent_dir)['tables'] if parent_dir is not None else {}
+
+    data_locations_env = os.path.join(os.path.dirname(__file__), '..', 'data_file_locations.env')
+    schemas = sorted(get_raw_schemas(data_locations_env))
+    print(f"Writing {'delta against ' + parent if parent else 'base'} snapshot '{label}' of: {', '.join(schemas)}")
+
+    tables = {}
+    start_time = time.time()
+    for schema in schemas:
+        for table in DeltaSnapshot.schema_tables(connection, schema):
+            table_name = f"{schema}.{table}"
+            if parent is not None and table_name in parent_tables:
+                tables[table_name] = DeltaSnapshot.export_delta_table(
+                    connection, snapshot_dir, parent_dir, schema, table, compress_level
+                )
+            else:
+                # Tables new since the parent snapshot go in whole, and are applied as a base
+                tables[table_name] = DeltaSnapshot.export_base_table(
+                    connection, snapshot_dir, schema, table, compress_level
+                )
+                tables[table_name]['is_base'] = True
+            entry = tables[table_name]
+            print(f"{table_name}: {entry['rows_written']:,} rows written, {entry['hashes_deleted']:,} hashes deleted "
+                  f"of {entry['row_count']:,} rows in {entry['duration_seconds']:.1f} seconds")
+
+    manifest_path = DeltaSnapshot.write_manifest(snapshot_dir, label, parent, tables)
+    shared_bytes = sum(
+        os.path.getsize(os.path.join(snapshot_dir, file_name))
+        for entry in tables.values() for kind, file_name in entry['files'].items() if kind != 'hashes'
+    )
+    print(f"\nWrote '{manifest_path}': {shared_bytes / 1024 / 1024:,.1f} MB to share "
+          f"in {time.time() - start_time:.2f} seconds.")
+
+def apply_snapshots(connection, snapshot_root, label, is_load_base):
+    """
+    Applies the chain of snapshots ending at label.
+    """
+    chain = DeltaSnapshot.snapshot_chain(snapshot_root, label)
+    if not is_load_base:
+        # The database is expected to be at the base already, e.g. restored from the base month's export
+        chain = chain[1:]
+    print(f"Applying snapshots: {', '.join(manifest['label'] for manifest in chain) or 'none'}")
+
+    for manifest in chain:
+        snapshot_dir = os.path.join(snapshot_root, manifest['label'])
+        for table_name, table_manifest in manifest['tables'].items():
+            schema, table = table_name.split('.', 1)
+            start_time = time.time()
+            row_count = DeltaSnapshot.apply_table(
+                connection, snapshot_dir, schema, table, table_manifest,
+                is_base=manifest['kind'] == 'base' or table_manifest.get('is_base', False)
+            )
+            print(f"{manifest['label']} {table_name}: {row_count:,} rows in {time.time() - start_time:.1f} seconds")
+    print("\nApply complete.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Base and delta snapshots of the raw data import schemas.")
+    parser.add_argument('mode', choices=['base', 'delta', 'apply'])
+    parser.add_argument('--label', required=True, help="Snapshot to write, or to apply up to, e.g. 2025_07")
+    parser.add_argument('--parent', default=None, help="Snapshot a delta is taken against, defaults to the latest")
+    parser.add_argument('--load_base', action='store_true', help="apply: also replace the tables with the base snapshot")
+    parser.add_argument('--snapshot_root', default='./local_data/export/snapshots/')
+    parser.add_argument('--compress_level', type=int, default=6, help="gzip level for the COPY files")
+    args = parser.parse_args()
+
+    connection = connect()
+    if connection is None:
+        return
+    try:
+        if args.mode == 'apply':
+            apply_snapshots(connection, args.snapshot_root, args.label, args.load_base)
+            return
+        parent = None
+        if args.mode == 'delta':
+            parent = args.parent or DeltaSnapshot.latest_label(args.snapshot_root)
+            if parent is None:
+                print(f"Error: no snapshot in {args.snapshot_root} to take a delta against, write a base first.")
+                return
+        # Each table is exported in one transaction; REPEATABLE READ gives its row and hash COPYs one snapshot,
+        # so a load running at the same time cannot make them disagree. Deltas diff in temp tables, which a
+        # read-only transaction cannot create.
+        connection.set_session(isolation_level='REPEATABLE READ', readonly=args.mode == 'base')
+        export_snapshot(connection, args.snapshot_root, args.label, parent, args.compress_level)
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Exports raw and NDH tables to partitioned Parquet (or memory-mappable Arrow IPC) datasets for analysis
+outside the database, in ./local_data/columnar/{schema}/{table}/
+
+Each table is streamed with COPY TO STDOUT in blocks, so exporting nppes_raw.main_file never holds the
+table in memory. Read the results with pyarrow.dataset or pandas.read_parquet, filtering on the partition
+columns to touch only the files needed, e.g.
+
+    import pyarrow.dataset as ds
+    main_file = ds.dataset('local_data/columnar/nppes_raw/main_file', format='parquet', partitioning='hive')
+    texas_orgs = main_file.to_table(filter=(ds.field('entity_type_code') == 2) &
+                                           (ds.field('provider_business_practice_location_address_state_name') == 'TX'))
+
+Arrow IPC output (--format arrow) is uncompressed and can be opened with pyarrow.memory_map without reading it.
+
+Usage:
+    python export_parquet.py nppes_raw.main_file --partition_by entity_type_code provider_business_practice_location_address_state_name
+    python export_parquet.py ndh.npi ndh.individual --format arrow
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+from delta_snapshot import connect
+
+# ParquetExporter lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from ParquetExporter import ParquetExporter
+
+def main():
+    parser = argparse.ArgumentParser(description="Export tables to partitioned Parquet or Arrow IPC datasets.")
+    parser.add_argument('tables', nargs='+', help="Tables to export as schema.table")
+    parser.add_argument('--partition_by', nargs='*', default=[], help="Columns to hive-partition every table by")
+    parser.add_argument('--format', choices=ParquetExporter.FORMATS, default='parquet',
+                        help="parquet is zstd-compressed; arrow is uncompressed and memory-mappable")
+    parser.add_argument('--output_dir', default='./local_data/columnar/')
+    parser.add_argument('--block_size_mb', type=int, default=64, help="CSV bytes read per record batch")
+    parser.add_argument('--max_rows_per_file', type=int, default=5_000_000)
+    parser.add_argument('--where', default=None, help="Optional SQL filter applied to every table")
+    parser.add_argument('--overwrite', action='store_true', help="Remove an earlier export of a table first")
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # type: ignore  # noqa: F401
+    except ImportError:
+        print("Error: pyarrow is required for columnar exports: pip install pyarrow psycopg2-binary")
+        return
+
+    connection = connect()
+    if connection is None:
+        return
+    try:
+        for table_name in args.tables:
+            schema, table = table_name.split('.', 1)
+            destination = ParquetExporter.output_dir(args.output_dir, schema, table)
+            if os.path.exists(destination):
+                if not args.overwrite:
+                    print(f"Skipping {table_name}: {destination} already exists (use --overwrite to replace it)")
+                    continue
+                shutil.rmtree(destination)
+
+            print(f"Exporting {table_name} to {destination}...")
+            result = ParquetExporter.export_table(
+                connection, schema, table, args.output_dir,
+                partition_by=args.partition_by, output_format=args.format,
+                block_size=args.block_size_mb * 1024 * 1024, max_rows_per_file=args.max_rows_per_file,
+                where=args.where,
+            )
+            rows_per_second = result['rows'] / result['seconds'] if result['seconds'] > 0 else 0
+            print(f"Exported {result['rows']:,} rows of {table_name} into {result['files']} files "
+                  f"({result['bytes'] / 1024 / 1024:,.1f} MB) in {result['seconds']:.2f} seconds "
+                  f"({rows_per_second:,.0f} rows/sec).")
+    finally:
+        connection.close()
+    print("\nColumnar export complete.")
+
+if __name__ == "__main__":
+    main()
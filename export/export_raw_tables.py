@@ -1,21 +1,38 @@
 #!/usr/bin/env python3
 """
-This is a CLI python script that reads in the contents of the parent .env 
+This is a CLI python script that reads in the contents of the parent .env
 And then exports all of the raw data import schemas into ./local_data/export/
 
-Each schema should have its own pgdump command. 
+Each schema should have its own pgdump command.
 
 read data_file_locations.env for a list of the schemas to be exported. Anything with "raw" in the name should be exported
 Make a list of the things that are exported this way at the beginning of the program and then export each one seperately into {this_schema}.pg.sql
 
 Export both the table structure and data
+
+With --format directory (or custom) each schema is written as a compressed pg_dump archive instead,
+{this_schema}.dir (or {this_schema}.dump), which pg_restore --jobs can restore in parallel.
+Directory archives are also dumped with --jobs parallel workers, and --parallel_schemas schemas are
+exported at the same time. A manifest.json next to the exports lists every table's row count,
+database size, archive size and dump duration.
+
+Usage: python export_raw_tables.py --format directory --jobs 4 --compress zstd --parallel_schemas 2
 """
 
+import argparse
 import os
+import shutil
 import subprocess
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
 
+# PgArchiveTools lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from PgArchiveTools import PgArchiveTools
+
 def get_raw_schemas(env_file):
     """
     Parses the given .env file and returns a list of schema names containing 'raw'.
@@ -29,16 +46,98 @@ def get_raw_schemas(env_file):
                     schemas.append(value)
     return list(set(schemas)) # Return unique schemas
 
+def run_pg_dump(command):
+    """
+    Runs pg_dump, timestamping each --verbose progress line as it arrives.
+    Returns the list of (seconds, line) pairs; raises CalledProcessError if pg_dump fails.
+    """
+    timed_lines = []
+    process = subprocess.Popen(command, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    for line in process.stderr:
+        timed_lines.append((time.time(), line.rstrip()))
+    return_code = process.wait()
+    if return_code != 0:
+        errors = '\n'.join(line for _, line in timed_lines if 'error' in line.lower())
+        raise subprocess.CalledProcessError(return_code, command, stderr=errors)
+    return timed_lines
+
+def export_schema(schema, export_dir, archive_format, jobs, compress_args, connection_args, db_name, is_exact_counts):
+    """
+    Exports one schema and returns its manifest entry.
+    """
+    export_path = PgArchiveTools.archive_path(export_dir, schema, archive_format)
+    print(f"Exporting schema '{schema}' to '{export_path}'...")
+
+    if archive_format == 'directory' and os.path.exists(export_path):
+        # pg_dump will not write into an existing directory, so replace an earlier export of this schema
+        if not os.path.exists(os.path.join(export_path, 'toc.dat')):
+            raise RuntimeError(f"{export_path} exists and is not a pg_dump directory archive, not replacing it")
+        shutil.rmtree(export_path)
+
+    command = PgArchiveTools.dump_command(connection_args, db_name, schema, archive_format, export_path,
+                                          jobs=jobs, compress_args=compress_args)
+    start_time = time.time()
+    timed_lines = run_pg_dump(command)
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Successfully exported schema '{schema}' in {duration:.2f} seconds.")
+
+    stats_output = subprocess.run(
+        ['psql', '-At', '-c', PgArchiveTools.table_stats_sql(schema, is_exact_counts)] + connection_args + ['-d', db_name],
+        capture_output=True, text=True, check=True
+    ).stdout
+    tables = PgArchiveTools.parse_table_stats(stats_output, schema)
+
+    table_durations = PgArchiveTools.table_durations(timed_lines, end_time)
+    if archive_format == 'directory':
+        toc_text = subprocess.run(['pg_restore', '--list', export_path], capture_output=True, text=True, check=True).stdout
+        table_bytes = PgArchiveTools.table_data_bytes(export_path, toc_text)
+        archive_bytes = sum(
+            os.path.getsize(os.path.join(export_path, file_name)) for file_name in os.listdir(export_path)
+        )
+    else:
+        table_bytes = {}
+        archive_bytes = os.path.getsize(export_path)
+
+    for table_name, table in tables.items():
+        table['archive_bytes'] = table_bytes.get(table_name)
+        table['duration_seconds'] = table_durations.get(table_name)
+
+    return {
+        'path': os.path.basename(export_path),
+        'format': archive_format,
+        'status': 'exported',
+        'duration_seconds': round(duration, 3),
+        'archive_bytes': archive_bytes,
+        'tables': tables,
+    }
+
 def main():
     """
     Main function to export raw schemas.
     """
+    parser = argparse.ArgumentParser(description="Export the raw data import schemas with pg_dump.")
+    parser.add_argument('--format', choices=PgArchiveTools.ARCHIVE_FORMATS, default='plain',
+                        help="plain writes {schema}.pg.sql for psql; directory and custom write compressed archives for pg_restore")
+    parser.add_argument('--jobs', type=int, default=4,
+                        help="pg_dump workers per schema (directory format only)")
+    parser.add_argument('--compress', choices=PgArchiveTools.COMPRESSION_METHODS, default='zstd',
+                        help="Archive compression (zstd needs pg_dump 16+); plain exports are never compressed")
+    parser.add_argument('--compress_level', type=int, default=None,
+                        help="Compression level, defaults to the method's own default")
+    parser.add_argument('--parallel_schemas', type=int, default=1,
+                        help="Schemas exported at the same time; each uses up to --jobs + 1 connections")
+    parser.add_argument('--exact_counts', action='store_true',
+                        help="Count every table's rows for the manifest instead of using planner estimates")
+    parser.add_argument('--export_dir', default='./local_data/export/', help="Where to write the exports")
+    args = parser.parse_args()
+
     # Load database configuration from parent .env file
     parent_env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
     if not os.path.exists(parent_env_path):
         print(f"Error: Parent .env file not found at {parent_env_path}")
         return
-        
+
     load_dotenv(dotenv_path=parent_env_path)
 
     db_user = os.getenv('DB_USER')
@@ -57,9 +156,9 @@ def main():
     if not os.path.exists(data_locations_env):
         print(f"Error: data_file_locations.env not found at {data_locations_env}")
         return
-        
+
     schemas_to_export = get_raw_schemas(data_locations_env)
-    
+
     if not schemas_to_export:
         print("No raw schemas found to export.")
         return
@@ -68,8 +167,20 @@ def main():
     for schema in schemas_to_export:
         print(f"- {schema}")
 
+    try:
+        pg_dump_version = PgArchiveTools.pg_tool_major_version('pg_dump')
+        compress_args = [] if args.format == 'plain' else PgArchiveTools.compress_arguments(
+            args.compress, args.compress_level, pg_dump_version
+        )
+    except FileNotFoundError:
+        print("Error: 'pg_dump' command not found. Make sure PostgreSQL client tools are installed and in your PATH.")
+        return
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
     # Create export directory
-    export_dir = './local_data/export/'
+    export_dir = args.export_dir
     os.makedirs(export_dir, exist_ok=True)
     print(f"\nExporting to directory: {export_dir}")
 
@@ -80,35 +191,44 @@ def main():
         print("Error: DB_PASSWORD is not set.")
         return
 
-    # Export each schema
-    for schema in schemas_to_export:
-        export_path = os.path.join(export_dir, f"{schema}.pg.sql")
-        print(f"Exporting schema '{schema}' to '{export_path}'...")
-        
-        command = [
-            'pg_dump',
-            '--no-owner',
-            '--clean',
-            '--if-exists',
-            '--schema', schema,
-            '-U', db_user,
-            '-h', db_host,
-            '-p', db_port,
-            db_name
-        ]
-        
-        try:
-            start_time = time.time()
-            with open(export_path, 'w') as f:
-                subprocess.run(command, stdout=f, check=True, text=True)
-            end_time = time.time()
-            duration = end_time - start_time
-            print(f"Successfully exported schema '{schema}' in {duration:.2f} seconds.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error exporting schema '{schema}': {e}")
-        except FileNotFoundError:
-            print("Error: 'pg_dump' command not found. Make sure PostgreSQL client tools are installed and in your PATH.")
-            break
+    connection_args = PgArchiveTools.connection_arguments(db_user, db_host, db_port)
+    manifest = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'database': db_name,
+        'format': args.format,
+        'compression': ' '.join(compress_args) or 'none',
+        'jobs': args.jobs if args.format == 'directory' else 1,
+        'pg_dump_version': pg_dump_version,
+        'row_counts': 'exact' if args.exact_counts else 'estimated',
+        'schemas': {},
+    }
+
+    # Export the schemas, --parallel_schemas at a time
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel_schemas)) as pool:
+        futures = {
+            schema: pool.submit(export_schema, schema, export_dir, args.format, args.jobs, compress_args,
+                                connection_args, db_name, args.exact_counts)
+            for schema in schemas_to_export
+        }
+        for schema, future in futures.items():
+            try:
+                manifest['schemas'][schema] = future.result()
+            except subprocess.CalledProcessError as e:
+                print(f"Error exporting schema '{schema}': {e}")
+                if e.stderr:
+                    print(e.stderr)
+                manifest['schemas'][schema] = {'status': 'failed', 'error': str(e)}
+            except RuntimeError as e:
+                print(f"Error exporting schema '{schema}': {e}")
+                manifest['schemas'][schema] = {'status': 'failed', 'error': str(e)}
+    manifest['duration_seconds'] = round(time.time() - start_time, 3)
+
+    manifest_path = PgArchiveTools.write_manifest(export_dir, manifest)
+    print(f"\nWrote manifest to '{manifest_path}'")
+    total_bytes = sum(entry.get('archive_bytes', 0) for entry in manifest['schemas'].values())
+    print(f"Exported {len(schemas_to_export)} schemas ({total_bytes / 1024 / 1024:,.1f} MB) "
+          f"in {manifest['duration_seconds']:.2f} seconds.")
 
     # Unset PGPASSWORD
     if 'PGPASSWORD' in os.environ:
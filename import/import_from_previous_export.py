@@ -1,30 +1,99 @@
 #!/usr/bin/env python3
 """
 This is a python program that accepts a CLI argument for the import sql dumps: (and defaults to ../local_data/export/)
-This will loop over each of the .sql files found in that directory and use psql command.. powered by the .env contents to get passwords etc. 
+This will loop over each of the .sql files found in that directory and use psql command.. powered by the .env contents to get passwords etc.
 
-To import the data into the exact same database.schema as the original dump file. 
+To import the data into the exact same database.schema as the original dump file.
 
 Please read the ../.env file to use the right variables.
+
+Custom (.dump) and directory (.dir) archives written by export_raw_tables.py --format are restored
+with pg_restore --jobs instead, and up to --parallel_schemas schemas are restored at the same time,
+largest first. With --defer_post_data every schema's tables and data are restored first, and indexes,
+constraints and triggers are built afterwards in a second parallel phase, once all data is in place.
+Plain .pg.sql dumps cannot be split that way and are always restored whole in the first phase.
+
+Usage: python import_from_previous_export.py ../local_data/export/ --jobs 4 --parallel_schemas 2 --defer_post_data
 """
 
 import os
 import subprocess
+import sys
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv  # type: ignore
 
+# PgArchiveTools lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from PgArchiveTools import PgArchiveTools
+
+def archive_bytes(path):
+    """
+    Size of a dump file, or of every file in a directory archive.
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, file_name)) for file_name in os.listdir(path))
+    return os.path.getsize(path)
+
+def restore_archive(archive, phase, jobs, connection_args, db_name):
+    """
+    Restores one dump for a phase: 'all', 'data' (tables and their data) or 'post-data' (indexes and constraints).
+    Returns the seconds taken, or None when the dump has nothing to do in this phase.
+    """
+    if archive['format'] == 'plain':
+        if phase == 'post-data':
+            return None
+        # ON_ERROR_STOP makes a failed statement exit non-zero, as pg_restore does, instead of carrying on
+        command = ['psql', '-q', '-X', '-v', 'ON_ERROR_STOP=1', '-f', archive['path']] + connection_args + ['-d', db_name]
+    else:
+        sections = {'all': None, 'data': ['pre-data', 'data'], 'post-data': ['post-data']}[phase]
+        command = PgArchiveTools.restore_command(connection_args, db_name, archive['path'], jobs=jobs,
+                                                 sections=sections, is_clean=phase != 'post-data')
+
+    print(f"Importing {phase} of '{archive['path']}' into database '{db_name}'...")
+    start_time = time.time()
+    # psql echoes a line per statement; errors still go to stderr as they happen
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    duration = time.time() - start_time
+    print(f"Successfully imported {phase} of '{archive['name']}' in {duration:.2f} seconds.")
+    return duration
+
+def run_phase(archives, phase, jobs, parallel_schemas, connection_args, db_name):
+    """
+    Restores a phase of every dump, parallel_schemas at a time. Returns the names of the dumps that failed.
+    """
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, parallel_schemas)) as pool:
+        futures = {
+            archive['name']: pool.submit(restore_archive, archive, phase, jobs, connection_args, db_name)
+            for archive in archives
+        }
+        for name, future in futures.items():
+            try:
+                future.result()
+            except subprocess.CalledProcessError as e:
+                print(f"Error importing {phase} of '{name}': {e}")
+                failed.append(name)
+    return failed
+
 def main():
     """
     Main function to import SQL dumps.
     """
     parser = argparse.ArgumentParser(description="Import SQL dumps from a specified directory.")
     parser.add_argument(
-        'import_dir', 
-        nargs='?', 
-        default='../local_data/export/', 
-        help='Directory containing .pg.sql dump files. Defaults to ../local_data/export/'
+        'import_dir',
+        nargs='?',
+        default='../local_data/export/',
+        help='Directory containing .pg.sql dump files or .dump/.dir archives. Defaults to ../local_data/export/'
     )
+    parser.add_argument('--jobs', type=int, default=4,
+                        help="pg_restore workers per archive (custom and directory archives only)")
+    parser.add_argument('--parallel_schemas', type=int, default=1,
+                        help="Dumps restored at the same time; each uses up to --jobs connections")
+    parser.add_argument('--defer_post_data', action='store_true',
+                        help="Build indexes and constraints only after every schema's data is loaded")
     args = parser.parse_args()
 
     import_dir = args.import_dir
@@ -38,7 +107,7 @@ def main():
     if not os.path.exists(parent_env_path):
         print(f"Error: Parent .env file not found at {parent_env_path}")
         return
-        
+
     load_dotenv(dotenv_path=parent_env_path)
 
     db_user = os.getenv('DB_USER')
@@ -52,57 +121,43 @@ def main():
         print("Please ensure DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, and DB_NAME are set.")
         return
 
-    # Find SQL files to import
-    sql_files = [f for f in os.listdir(import_dir) if f.endswith('.pg.sql')]
-    
-    if not sql_files:
-        print(f"No .pg.sql files found in {import_dir} to import.")
+    # Find dumps to import, largest first so the longest restores are not left for the end
+    archives = PgArchiveTools.find_archives(import_dir)
+    archives.sort(key=lambda archive: archive_bytes(archive['path']), reverse=True)
+
+    if not archives:
+        print(f"No .pg.sql, .dump or .dir dumps found in {import_dir} to import.")
         return
 
-    print("The following SQL dump files will be imported:")
-    for sql_file in sql_files:
-        print(f"- {sql_file}")
+    print("The following dumps will be imported:")
+    for archive in archives:
+        print(f"- {os.path.basename(archive['path'])} ({archive['format']}, {archive_bytes(archive['path']) / 1024 / 1024:,.1f} MB)")
 
-    # Set PGPASSWORD environment variable for psql
+    # Set PGPASSWORD environment variable for psql and pg_restore
     if db_password:
         os.environ['PGPASSWORD'] = db_password
     else:
         print("Error: DB_PASSWORD is not set.")
         return
 
-    # Import each SQL file
-    for sql_file in sql_files:
-        import_path = os.path.join(import_dir, sql_file)
-        print(f"Importing file '{import_path}' into database '{db_name}'...")
-        
-        command = [
-            'psql',
-            '-U', db_user,
-            '-h', db_host,
-            '-p', db_port,
-            '-d', db_name,
-            '-f', import_path
-        ]
-        
-        try:
-            start_time = time.time()
-            # Using subprocess.run to execute the command
-            result = subprocess.run(command, check=True, text=True, capture_output=True)
-            end_time = time.time()
-            duration = end_time - start_time
-            print(f"Successfully imported '{sql_file}' in {duration:.2f} seconds.")
-            if result.stdout:
-                print("Output:\n", result.stdout)
-            if result.stderr:
-                print("Errors:\n", result.stderr)
-
-        except subprocess.CalledProcessError as e:
-            print(f"Error importing file '{sql_file}': {e}")
-            print(f"Stderr: {e.stderr}")
-            print(f"Stdout: {e.stdout}")
-        except FileNotFoundError:
-            print("Error: 'psql' command not found. Make sure PostgreSQL client tools are installed and in your PATH.")
-            break
+    connection_args = PgArchiveTools.connection_arguments(db_user, db_host, db_port)
+    start_time = time.time()
+    try:
+        if args.defer_post_data:
+            failed = run_phase(archives, 'data', args.jobs, args.parallel_schemas, connection_args, db_name)
+            print(f"\nAll data imported in {time.time() - start_time:.2f} seconds, building indexes and constraints...")
+            # A schema whose data failed is left without indexes rather than built on a partial load
+            post_data_archives = [archive for archive in archives if archive['name'] not in failed]
+            failed += run_phase(post_data_archives, 'post-data', args.jobs, args.parallel_schemas, connection_args, db_name)
+        else:
+            failed = run_phase(archives, 'all', args.jobs, args.parallel_schemas, connection_args, db_name)
+    except FileNotFoundError as e:
+        print(f"Error: '{e.filename}' command not found. Make sure PostgreSQL client tools are installed and in your PATH.")
+        failed = [archive['name'] for archive in archives]
+
+    print(f"\nImported {len(archives) - len(set(failed))} of {len(archives)} dumps in {time.time() - start_time:.2f} seconds.")
+    if failed:
+        print(f"Dumps with errors: {', '.join(sorted(set(failed)))}")
 
     # Unset PGPASSWORD
     if 'PGPASSWORD' in os.environ:
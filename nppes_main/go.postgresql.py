@@ -10,6 +10,7 @@ Generated on: 2025-07-19 18:28:08
 
 import os
 import sys
+import time
 import click
 
 # Import the shared functionality from csviper package
@@ -21,6 +22,12 @@ except ImportError:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
     from csviper.import_executor import ImportExecutor
 
+# ParallelCSVLoader lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from ParallelCSVLoader import ParallelCSVLoader
+
+CREATE_TABLE_SQL_FILE = 'npidata_pfile_20050523-20250608.create_table_postgres.sql'
+
 
 @click.command()
 @click.option('--env_file_location', type=click.Path(),
@@ -35,7 +42,15 @@ except ImportError:
               help='Overwrite existing table data')
 @click.option('--import_only_lines', type=int, default=None,
               help='Limit import to a specific number of lines for testing (positive integer).')
-def main(env_file_location, csv_file, db_schema_name, table_name, trample, import_only_lines):
+@click.option('--workers', type=int, default=1,
+              help='Number of concurrent COPY connections. Above 1 the CSV is split on record boundaries and loaded into an UNLOGGED table in parallel.')
+@click.option('--compare_single_stream', is_flag=True, default=False,
+              help='Also time a single-stream import into <table_name>_single_stream and report both wall-clock times.')
+@click.option('--typed_load', is_flag=True, default=False,
+              help='Create the table with the column_types from the metadata JSON (BIGINT npi, real dates) via a typed staging path, so Step05 has nothing to rewrite.')
+@click.option('--row_hash', is_flag=True, default=False,
+              help='Fill a row_hash column (128-bit XXH3 of each raw CSV record) while the CSV streams in, so Step07 can skip its MD5 rewrite.')
+def main(env_file_location, csv_file, db_schema_name, table_name, trample, import_only_lines, workers, compare_single_stream, typed_load, row_hash):
     """
     Import CSV data into PostgreSQL database using pre-generated SQL scripts.
     Import CSV data into PostgreSQL database using pre-generated SQL scripts.
@@ -47,6 +62,16 @@ def main(env_file_location, csv_file, db_schema_name, table_name, trample, impor
         if import_only_lines is not None:
             if not isinstance(import_only_lines, int) or import_only_lines <= 0:
                 raise click.BadParameter('Value must be a whole positive number.', param_hint='--import_only_lines')
+        if workers < 1:
+            raise click.BadParameter('Value must be a whole positive number.', param_hint='--workers')
+        if workers > 1 and not trample:
+            raise click.BadParameter('The parallel loader always recreates the table, so it needs --trample.', param_hint='--workers')
+        if typed_load and not trample:
+            raise click.BadParameter('The typed load always recreates the table, so it needs --trample.', param_hint='--typed_load')
+        if row_hash and not trample:
+            raise click.BadParameter('Hashing on load always recreates the table, so it needs --trample.', param_hint='--row_hash')
+        if (workers > 1 or typed_load or row_hash) and import_only_lines is not None:
+            raise click.BadParameter('Only supported by the single-stream import, drop --workers, --typed_load and --row_hash.', param_hint='--import_only_lines')
 
         # Load and validate configuration
         try:
@@ -96,17 +121,76 @@ def main(env_file_location, csv_file, db_schema_name, table_name, trample, impor
         if trample:
             click.echo("Warning: --trample flag is set. Existing table data will be overwritten.")
         
-        # Execute PostgreSQL import using the shared executor
-        ImportExecutor.execute_postgresql_import(
-            db_config=db_config,
-            db_schema_name=db_schema_name,
-            table_name=table_name,
-            csv_file=csv_file,
-            trample=trample,
-            create_table_sql_file='npidata_pfile_20050523-20250608.create_table_postgres.sql',
-            encoding=encoding,
-            import_only_lines=import_only_lines
-        )
+        if compare_single_stream:
+            comparison_table_name = f"{table_name}_single_stream"
+            click.echo(f"Timing single-stream import into {db_schema_name}.{comparison_table_name} for comparison...")
+            single_stream_start = time.time()
+            ImportExecutor.execute_postgresql_import(
+                db_config=db_config,
+                db_schema_name=db_schema_name,
+                table_name=comparison_table_name,
+                csv_file=csv_file,
+                trample=True,
+                create_table_sql_file=CREATE_TABLE_SQL_FILE,
+                encoding=encoding,
+                import_only_lines=import_only_lines
+            )
+            single_stream_seconds = time.time() - single_stream_start
+
+        import_start = time.time()
+        if typed_load:
+            # Load into a VARCHAR staging table, then write the final table once with the metadata column_types
+            column_types = metadata.get('column_types')
+            if not column_types:
+                raise click.BadParameter('The metadata JSON has no column_types entry.', param_hint='--typed_load')
+            ParallelCSVLoader.execute_typed_import(
+                db_config=db_config,
+                db_schema_name=db_schema_name,
+                table_name=table_name,
+                csv_file=csv_file,
+                create_table_sql_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), CREATE_TABLE_SQL_FILE),
+                column_names=metadata['normalized_column_names'],
+                column_types=column_types,
+                workers=workers,
+                encoding=encoding,
+                delimiter=metadata.get('delimiter', ','),
+                quote_char=metadata.get('quote_character', '"'),
+                row_hash=row_hash
+            )
+        elif workers > 1 or row_hash:
+            # Split the CSV on record boundaries and COPY the pieces concurrently
+            ParallelCSVLoader.execute_parallel_import(
+                db_config=db_config,
+                db_schema_name=db_schema_name,
+                table_name=table_name,
+                csv_file=csv_file,
+                create_table_sql_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), CREATE_TABLE_SQL_FILE),
+                workers=workers,
+                encoding=encoding,
+                delimiter=metadata.get('delimiter', ','),
+                quote_char=metadata.get('quote_character', '"'),
+                row_hash=row_hash
+            )
+        else:
+            # Execute PostgreSQL import using the shared executor
+            ImportExecutor.execute_postgresql_import(
+                db_config=db_config,
+                db_schema_name=db_schema_name,
+                table_name=table_name,
+                csv_file=csv_file,
+                trample=trample,
+                create_table_sql_file=CREATE_TABLE_SQL_FILE,
+                encoding=encoding,
+                import_only_lines=import_only_lines
+            )
+        import_seconds = time.time() - import_start
+        click.echo(f"Import took {import_seconds:.2f} seconds with {workers} worker(s)")
+
+        if compare_single_stream:
+            click.echo(f"Single-stream: {single_stream_seconds:.2f} seconds, "
+                       f"{workers} worker(s): {import_seconds:.2f} seconds "
+                       f"({single_stream_seconds / max(import_seconds, 0.001):.2f}x)")
+            click.echo(f"Leaving {db_schema_name}.{comparison_table_name} in place; drop it when done comparing.")
         
         click.echo("✓ PostgreSQL import completed successfully!")
         
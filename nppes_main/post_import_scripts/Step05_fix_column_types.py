@@ -9,6 +9,11 @@ import pandas as pd
 import sqlalchemy
 from pathlib import Path
 import os
+import sys
+
+# ColumnTypeConverter lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from ColumnTypeConverter import ColumnTypeConverter
 
 def main():
 
@@ -28,94 +33,22 @@ def main():
 
     sql = FrostDict()
 
-# Convert all of the NPI fields from VARCHAR to BIGINT. 
-    inspector = sqlalchemy.inspect(alchemy_engine)
-    columns = inspector.get_columns(npi_DBTable.table, schema=npi_DBTable.schema)
-    column_types = {c['name']: str(c['type']) for c in columns}
-
-    if 'BIGINT' not in column_types.get('npi', '').upper():
-        sql['drop the new_npi column if exists from previous run'] = f"""
-ALTER TABLE {npi_DBTable}
-DROP COLUMN IF EXISTS new_npi;
-"""
-
-        sql['create new_npi column'] = f"""
-ALTER TABLE {npi_DBTable}
-ADD COLUMN new_npi BIGINT;        
-    """
-
-        sql['populate the bigint version from the varchar version'] = f"""
-UPDATE {npi_DBTable}
-SET new_npi = "npi"::BIGINT;
-""" 
- 
-        sql['drop the varchar column'] = f"""
-ALTER TABLE {npi_DBTable}
-DROP COLUMN "npi";
-"""
-
-        sql['rename new column'] = f"""
-ALTER TABLE {npi_DBTable}
-RENAME COLUMN new_npi TO "npi";
-"""
-    
-
-# Convert the Replacement NPI columns in a similar fashion
-    if 'BIGINT' not in column_types.get('replacement_npi', '').upper():
-        sql['drop the new_npi replacement column if exists from previous run'] = f"""
-ALTER TABLE {npi_DBTable}
-DROP COLUMN IF EXISTS "new_replacement_npi";
-"""
-
-
-        sql['create new_npi replacement column'] = f"""
-ALTER TABLE {npi_DBTable}
-ADD COLUMN "new_replacement_npi" BIGINT DEFAULT NULL;        
-    """
-
-        sql['populate the bigint version from the varchar version  replacement '] = f"""
-UPDATE {npi_DBTable}
-SET "new_replacement_npi" = NULLIF("replacement_npi", '')::BIGINT
-""" 
- 
-        sql['drop the varchar  replacement column'] = f"""
-ALTER TABLE {npi_DBTable}
-DROP COLUMN "replacement_npi";
-"""
-
-        sql['rename new  replacement  column'] = f"""
-ALTER TABLE {npi_DBTable}
-RENAME COLUMN "new_replacement_npi" TO "replacement_npi";
-"""
-
-
-    date_convertion_list = [
-            'provider_enumeration_date'
-            ,'last_update_date'
-            ,'npi_deactivation_date'
-            ,'npi_reactivation_date'
-            ,'certification_date'
-            ]
-
-    # That will ensure that this script is idempotent
-    
-    for this_date_col in date_convertion_list:
-        column_type = column_types.get(this_date_col)
-        # We need to check if the column type is not a date.
-        if column_type is not None and 'DATE' not in column_type.upper():
-            sql[f"Adding new col for {this_date_col}"] = f"""
-ALTER TABLE {npi_DBTable}
-ADD COLUMN "{this_date_col}_real_date" DATE DEFAULT NULL;
-"""
-
-            sql[f"convert string to date for {this_date_col}"] =f"""
-UPDATE {npi_DBTable}
-SET "{this_date_col}_real_date" = to_date(NULLIF("{this_date_col}", ''), 'MM/DD/YYYY');
-"""
-            
-            sql[f"drop varchar for {this_date_col}"] = f"""ALTER TABLE {npi_DBTable} DROP COLUMN "{this_date_col}"; """
-
-            sql[f"rename new col back to {this_date_col}"] = f"""ALTER TABLE {npi_DBTable} RENAME COLUMN "{this_date_col}_real_date" TO "{this_date_col}";"""
+# Convert the NPI fields to BIGINT and the date fields to DATE.
+# All of them go into one ALTER TABLE so the table is rewritten once instead of once per column.
+# ColumnTypeConverter skips columns that already have their target type, which keeps this script idempotent.
+    date_type = {'type': 'DATE', 'format': 'MM/DD/YYYY'}
+    column_conversions = {
+        'npi': {'type': 'BIGINT'},
+        'replacement_npi': {'type': 'BIGINT'},
+        'provider_enumeration_date': date_type,
+        'last_update_date': date_type,
+        'npi_deactivation_date': date_type,
+        'npi_reactivation_date': date_type,
+        'certification_date': date_type,
+    }
+
+    size_before_bytes = ColumnTypeConverter.get_table_size_bytes(alchemy_engine, npi_DBTable)
+    ColumnTypeConverter.add_conversion_sql(sql, alchemy_engine, npi_DBTable, column_conversions)
 
     # Add unique key on NPI column to improve performance
     sql['add unique key on NPI column'] = f"""
@@ -133,6 +66,8 @@ ON {npi_DBTable}("npi", "entity_type_code");
                                 engine=alchemy_engine
     )
 
+    ColumnTypeConverter.report_table_size(alchemy_engine, npi_DBTable, size_before_bytes)
+
 
 if __name__ == "__main__":
     try:
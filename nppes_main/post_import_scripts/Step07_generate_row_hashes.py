@@ -5,6 +5,7 @@ Step07: Generate Row Hashes for Change Detection
 This script creates MD5 hashes of all column values for each row in the NPPES data.
 The hashes are used to detect changes in any field, even when Last_Update_Date hasn't changed.
 This provides more comprehensive change detection for incremental processing.
+When the import already filled row_hash (go.postgresql.py --row_hash) the full-table rewrite is skipped.
 """
 
 import plainerflow  # type: ignore
@@ -43,32 +44,47 @@ def main():
 
     sql = FrostDict()
 
-    # Step 1: Drop existing row_hash column if it exists
-    sql['01_drop_existing_row_hash_column'] = f"""
+    # go.postgresql.py --row_hash fills row_hash while the CSV streams in (XXH3 of the raw record).
+    # When every row already has one there is nothing to compute, so skip the full-table MD5 rewrite.
+    # Note that switching between the two hash methods makes every NPI look changed once.
+    inspector = sqlalchemy.inspect(alchemy_engine)
+    column_names = [c['name'] for c in inspector.get_columns(npi_DBTable.table, schema=npi_DBTable.schema)]
+    is_row_hash_from_import = False
+    if 'row_hash' in column_names:
+        with alchemy_engine.connect() as conn:
+            is_row_hash_from_import = not conn.execute(sqlalchemy.text(
+                f"SELECT EXISTS (SELECT 1 FROM {npi_DBTable} WHERE row_hash IS NULL)"
+            )).scalar()
+
+    if is_row_hash_from_import:
+        print("✅ Every row already has a row_hash (e.g. go.postgresql.py --row_hash), skipping the MD5 rewrite")
+    else:
+        # Step 1: Drop existing row_hash column if it exists
+        sql['01_drop_existing_row_hash_column'] = f"""
 ALTER TABLE {npi_DBTable}
 DROP COLUMN IF EXISTS row_hash;
 """
 
-    # Step 2: Add new row_hash column
-    sql['02_add_row_hash_column'] = f"""
+        # Step 2: Add new row_hash column
+        sql['02_add_row_hash_column'] = f"""
 ALTER TABLE {npi_DBTable}
 ADD COLUMN row_hash VARCHAR(32);
 """
 
-    # Step 3: Create the concatenation string dynamically
-    # Build the concatenation expression by joining all columns with '|' separator
-    concat_parts = []
-    for column in normalized_columns:
-        # Use COALESCE to handle NULL values and convert everything to TEXT
-        concat_parts.append(f'COALESCE("{column}"::TEXT, \'\')')
+        # Step 3: Create the concatenation string dynamically
+        # Build the concatenation expression by joining all columns with '|' separator
+        concat_parts = []
+        for column in normalized_columns:
+            # Use COALESCE to handle NULL values and convert everything to TEXT
+            concat_parts.append(f'COALESCE("{column}"::TEXT, \'\')')
     
-    # Join all parts with ' || \'|\' || ' to create the full concatenation
-    concat_expression = ' || \'|\' || '.join(concat_parts)
+        # Join all parts with ' || \'|\' || ' to create the full concatenation
+        concat_expression = ' || \'|\' || '.join(concat_parts)
     
-    print(f"📝 Generated concatenation expression for {len(concat_parts)} columns")
+        print(f"📝 Generated concatenation expression for {len(concat_parts)} columns")
     
-    # Step 4: Update the row_hash column with MD5 of concatenated values
-    sql['03_populate_row_hash_with_md5'] = f"""
+        # Step 4: Update the row_hash column with MD5 of concatenated values
+        sql['03_populate_row_hash_with_md5'] = f"""
 UPDATE {npi_DBTable}
 SET row_hash = MD5({concat_expression});
 """
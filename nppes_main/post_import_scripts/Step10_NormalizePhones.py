@@ -6,14 +6,20 @@ and populates staging and NDH tables for clean phone data management.
 """
 
 import plainerflow # type: ignore
-from plainerflow import CredentialFinder, DBTable, FrostDict, SQLoopcicle  # type: ignore
+from plainerflow import CredentialFinder, DBTable, FrostDict  # type: ignore
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import io
 import os
 import sys
+import time
 
 # Add the parent directory to the path to import PhoneNormalizer
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from PhoneNormalizer import PhoneNormalizer
+from PhoneNormalizationCache import PhoneNormalizationCache
+from SQLPlanRunner import SQLPlanRunner
+from ScratchTables import ScratchTables
 
 
 def main():
@@ -21,6 +27,14 @@ def main():
     
     # Control dry-run mode - start with True for testing
     is_just_print = False
+    # Record each statement's EXPLAIN (ANALYZE, BUFFERS) plan in intake.sql_step_timing along with its timing
+    is_explain_analyze = False
+    
+    # Number of staging phones normalized and written back per COPY/UPDATE round trip
+    batch_size = 50000
+    
+    # Worker processes used for phonenumbers parsing; 1 keeps everything in this process
+    phone_parse_workers = os.cpu_count() or 1
     
     print("Connecting to DB")
     base_path = os.path.dirname(os.path.abspath(__file__))
@@ -38,6 +52,14 @@ def main():
     phone_type_DBTable = DBTable(schema='ndh', table='phone_type')
     phone_number_DBTable = DBTable(schema='ndh', table='phone_number')
     npi_phone_DBTable = DBTable(schema='ndh', table='npi_phone')
+    phone_cache_DBTable = DBTable(schema='intake', table='phone_normalization_cache')
+
+    # The unpivoted phones are thrown away at the end of the run, so they go in an UNLOGGED scratch table
+    scratch_tables = ScratchTables(schema='intake')
+    phone_source_DBTable = scratch_tables.table('npi_phone_source')
+    
+    # Session temp table that receives each normalized chunk via COPY
+    normalized_batch_table = 'temp_normalized_phone_batch'
     
     # Create SQL execution plan
     sql = FrostDict()
@@ -54,130 +76,80 @@ def main():
     ON CONFLICT (id) DO NOTHING;
     """
     
-    # Phase 2: Extract phone data from NPPES main file - separate INSERT for each field
-    
-    # 2a: Business Mailing Address Telephone Numbers
-    sql['extract_main_business_mailing_phone'] = f"""
-    INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, source_file, is_fax_in_source, source_row, error_notes)
-    SELECT 
-        "provider_business_mailing_address_telephone_number" AS raw_phone,
-        'nppes_main' AS source_file,
-        FALSE AS is_fax,
-        ROW_NUMBER() OVER() AS source_row,
-        'Business Mailing Phone from main file' AS error_notes
-    FROM {npi_main_DBTable}
-    WHERE "provider_business_mailing_address_telephone_number" IS NOT NULL 
-    AND TRIM("provider_business_mailing_address_telephone_number") != ''
-    ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
-    """
-    
-    # 2b: Business Mailing Address Fax Numbers
-    sql['extract_main_business_mailing_fax'] = f"""
-    INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, source_file, is_fax_in_source, source_row, error_notes)
-    SELECT 
-        "provider_business_mailing_address_fax_number" AS raw_phone,
-        'nppes_main' AS source_file,
-        TRUE AS is_fax,
-        ROW_NUMBER() OVER() AS source_row,
-        'Business Mailing Fax from main file' AS error_notes
-    FROM {npi_main_DBTable}
-    WHERE "provider_business_mailing_address_fax_number" IS NOT NULL 
-    AND TRIM("provider_business_mailing_address_fax_number") != ''
-    ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
-    """
-    
-    # 2c: Business Practice Location Telephone Numbers
-    sql['extract_main_practice_location_phone'] = f"""
-    INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, source_file, is_fax_in_source, source_row, error_notes)
-    SELECT 
-        "provider_business_practice_location_address_telephone_number" AS raw_phone,
-        'nppes_main' AS source_file,
-        FALSE AS is_fax,
-        ROW_NUMBER() OVER() AS source_row,
-        'Practice Location Phone from main file' AS error_notes
-    FROM {npi_main_DBTable}
-    WHERE "provider_business_practice_location_address_telephone_number" IS NOT NULL 
-    AND TRIM("provider_business_practice_location_address_telephone_number") != ''
-    ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
-    """
+    # Phase 1b: Persistent parse cache, so a monthly refresh only parses phones it has never seen.
+    # Results from an older phonenumbers release are thrown away.
+    sql['create_phone_normalization_cache'] = PhoneNormalizationCache.create_table_sql(phone_cache_DBTable)
     
-    # 2d: Business Practice Location Fax Numbers
-    sql['extract_main_practice_location_fax'] = f"""
-    INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, source_file, is_fax_in_source, source_row, error_notes)
-    SELECT 
-        "provider_business_practice_location_address_fax_number" AS raw_phone,
-        'nppes_main' AS source_file,
-        TRUE AS is_fax,
-        ROW_NUMBER() OVER() AS source_row,
-        'Practice Location Fax from main file' AS error_notes
-    FROM {npi_main_DBTable}
-    WHERE "provider_business_practice_location_address_fax_number" IS NOT NULL 
-    AND TRIM("provider_business_practice_location_address_fax_number") != ''
-    ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
-    """
+    sql['invalidate_stale_phone_normalization_cache'] = PhoneNormalizationCache.invalidate_stale_versions_sql(phone_cache_DBTable)
     
-    # 2e: Authorized Official Telephone Numbers
-    sql['extract_main_authorized_official_phone'] = f"""
-    INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, source_file, is_fax_in_source, source_row, error_notes)
+    # Phase 2: Unpivot every phone/fax column into one narrow relation.
+    # main_file and pl_file are each scanned exactly once; the result feeds both the staging
+    # insert below and the npi_phone population after normalization.
+    sql['unpivot_phone_sources'] = scratch_tables.create_table_as_sql(phone_source_DBTable, f"""
     SELECT 
-        "authorized_official_telephone_number" AS raw_phone,
+        main."npi"::BIGINT AS npi,
+        unpivoted.phonetype_id,
+        unpivoted.extract_order,
+        unpivoted.raw_phone,
+        unpivoted.raw_phone_extension,
         'nppes_main' AS source_file,
-        FALSE AS is_fax,
-        ROW_NUMBER() OVER() AS source_row,
-        'Authorized Official Phone from main file' AS error_notes
-    FROM {npi_main_DBTable}
-    WHERE "authorized_official_telephone_number" IS NOT NULL 
-    AND TRIM("authorized_official_telephone_number") != ''
-    ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
-    """
+        unpivoted.is_fax,
+        unpivoted.source_note
+    FROM {npi_main_DBTable} AS main
+    CROSS JOIN LATERAL (
+        VALUES
+            (1, 1, main."provider_business_mailing_address_telephone_number", NULL::VARCHAR, FALSE, 'Business Mailing Phone from main file'),
+            (2, 2, main."provider_business_mailing_address_fax_number", NULL::VARCHAR, TRUE, 'Business Mailing Fax from main file'),
+            (3, 3, main."provider_business_practice_location_address_telephone_number", NULL::VARCHAR, FALSE, 'Practice Location Phone from main file'),
+            (4, 4, main."provider_business_practice_location_address_fax_number", NULL::VARCHAR, TRUE, 'Practice Location Fax from main file'),
+            (5, 5, main."authorized_official_telephone_number", NULL::VARCHAR, FALSE, 'Authorized Official Phone from main file')
+    ) AS unpivoted(phonetype_id, extract_order, raw_phone, raw_phone_extension, is_fax, source_note)
+    WHERE unpivoted.raw_phone IS NOT NULL 
+    AND TRIM(unpivoted.raw_phone) != ''
     
-    # Phase 3: Extract phone data from NPPES practice location file - separate INSERT for each field
+    UNION ALL
     
-    # 3a: Secondary Practice Address Telephone Numbers (with extensions)
-    sql['extract_pl_secondary_practice_phone'] = f"""
-    INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, raw_phone_extension, source_file, is_fax_in_source, source_row, error_notes)
     SELECT 
-        "provider_secondary_practice_address_telephone_number" AS raw_phone,
-        "provider_secondary_practice_address_telephone_extension" AS raw_phone_extension,
+        pl."npi"::BIGINT AS npi,
+        unpivoted.phonetype_id,
+        unpivoted.extract_order,
+        unpivoted.raw_phone,
+        unpivoted.raw_phone_extension,
         'nppes_pl_file' AS source_file,
-        FALSE AS is_fax,
-        ROW_NUMBER() OVER() AS source_row,
-        'Secondary Practice Phone from PL file' AS error_notes
-    FROM {npi_pl_DBTable}
-    WHERE "provider_secondary_practice_address_telephone_number" IS NOT NULL 
-    AND TRIM("provider_secondary_practice_address_telephone_number") != ''
-    ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
-    """
+        unpivoted.is_fax,
+        unpivoted.source_note
+    FROM {npi_pl_DBTable} AS pl
+    CROSS JOIN LATERAL (
+        VALUES
+            -- Secondary practice phones are treated as practice location phones/faxes (types 3 and 4)
+            (3, 6, pl."provider_secondary_practice_address_telephone_number", pl."provider_secondary_practice_address_telephone_extension"::VARCHAR, FALSE, 'Secondary Practice Phone from PL file'),
+            (4, 7, pl."provider_practice_location_address_fax_number", NULL::VARCHAR, TRUE, 'Practice Fax from PL file')
+    ) AS unpivoted(phonetype_id, extract_order, raw_phone, raw_phone_extension, is_fax, source_note)
+    WHERE unpivoted.raw_phone IS NOT NULL 
+    AND TRIM(unpivoted.raw_phone) != '';
+    """)
     
-    # 3b: Practice Address Fax Numbers
-    sql['extract_pl_practice_fax'] = f"""
+    # Phase 3: One staging row per distinct (raw_phone, source_file, is_fax).
+    # extract_order keeps the old precedence: the first column a phone appeared in supplies its notes.
+    sql['extract_staging_phones_from_unpivot'] = f"""
     INSERT INTO {staging_phone_DBTable} 
-    (raw_phone, source_file, is_fax_in_source, source_row, error_notes)
-    SELECT 
-        "provider_practice_location_address_fax_number" AS raw_phone,
-        'nppes_pl_file' AS source_file,
-        TRUE AS is_fax,
+    (raw_phone, raw_phone_extension, source_file, is_fax_in_source, source_row, error_notes)
+    SELECT DISTINCT ON (phone_source.raw_phone, phone_source.source_file, phone_source.is_fax)
+        phone_source.raw_phone,
+        phone_source.raw_phone_extension,
+        phone_source.source_file,
+        phone_source.is_fax,
         ROW_NUMBER() OVER() AS source_row,
-        'Practice Fax from PL file' AS error_notes
-    FROM {npi_pl_DBTable}
-    WHERE "provider_practice_location_address_fax_number" IS NOT NULL 
-    AND TRIM("provider_practice_location_address_fax_number") != ''
+        phone_source.source_note AS error_notes
+    FROM {phone_source_DBTable} AS phone_source
+    ORDER BY phone_source.raw_phone, phone_source.source_file, phone_source.is_fax, phone_source.extract_order
     ON CONFLICT (raw_phone, source_file, is_fax_in_source) DO NOTHING;
     """
     
     # Execute initial SQL setup and extraction
     print("About to run initial SQL setup and phone extraction")
-    SQLoopcicle.run_sql_loop(
-        sql_dict=sql,
-        is_just_print=is_just_print,
-        engine=alchemy_engine
-    )
+    SQLPlanRunner.run_timed(sql, alchemy_engine, 'Step10', is_just_print=is_just_print,
+                            is_explain_analyze=is_explain_analyze)
     
     if not is_just_print:
         # Phase 4: Process staging records with Python phonenumbers library
@@ -201,59 +173,69 @@ def main():
         
         print(f"Total records in staging: {total_count}")
         print(f"Previously processed: {processed_count}")
-        print(f"Processing {len(staging_df)} new/unprocessed phone records...")
+        print(f"Processing {len(staging_df)} new/unprocessed phone records using {phone_parse_workers} parse worker(s)...")
         
-        # Process each record with progress indicator
+        # Normalize in chunks: each chunk is parsed in Python, streamed into a temp table with COPY
+        # and applied to the staging table with a single set-based UPDATE
+        start_time = time.time()
         processed_count = 0
-        for index, row in staging_df.iterrows():
-            record_id = row['id']
-            raw_phone = row['raw_phone']
-            raw_extension = row['raw_phone_extension']
-            
-            # Extract extension from main phone text if not already provided
-            if pd.isna(raw_extension) or not raw_extension:
-                clean_phone, extracted_extension = PhoneNormalizer._extract_extension_from_text(raw_phone)
-                if extracted_extension:
-                    raw_extension = extracted_extension
-                    raw_phone = clean_phone
-            
-            # Normalize the phone number
-            e164_format, country_code, success, error_msg = PhoneNormalizer._normalize_phone_number(raw_phone)
-            
-            # Update staging record using SQLAlchemy text() for proper parameter binding
-            from sqlalchemy import text
-            update_sql = text(f"""
-            UPDATE {staging_phone_DBTable} 
-            SET 
-                phone_e164 = :e164_format,
-                country_code = :country_code,
-                is_normalized_success = :success,
-                raw_phone_extension = :raw_extension,
-                error_notes = COALESCE(error_notes, '') || CASE WHEN :error_msg IS NOT NULL THEN '; ' || :error_msg ELSE '' END
-            WHERE id = :record_id
+        raw_connection = alchemy_engine.raw_connection()
+        phone_pool = ProcessPoolExecutor(max_workers=phone_parse_workers) if phone_parse_workers > 1 else None
+        phone_cache = PhoneNormalizationCache(engine=alchemy_engine, cache_DBTable=phone_cache_DBTable)
+        try:
+            cursor = raw_connection.cursor()
+            cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {normalized_batch_table} (
+                id INTEGER PRIMARY KEY,
+                phone_e164 VARCHAR(20),
+                country_code VARCHAR(4),
+                is_normalized_success BOOLEAN,
+                raw_phone_extension VARCHAR(10),
+                error_msg TEXT
+            ) ON COMMIT DELETE ROWS;
             """)
+            raw_connection.commit()
             
-            with alchemy_engine.connect() as conn:
-                conn.execute(update_sql, {
-                    'e164_format': e164_format,
-                    'country_code': country_code,
-                    'success': success,
-                    'raw_extension': raw_extension,
-                    'error_msg': error_msg,
-                    'record_id': record_id
-                })
-                conn.commit()
-            
-            # Progress indicator: print '.' every 100 records, newline every 3000
-            processed_count += 1
-            if processed_count % 100 == 0:
-                print('.', end='', flush=True)
-            if processed_count % 3000 == 0:
-                print(f' [{processed_count}/{len(staging_df)}]')
+            for chunk_start in range(0, len(staging_df), batch_size):
+                chunk_started_at = time.time()
+                chunk_df = staging_df.iloc[chunk_start:chunk_start + batch_size]
+                normalized_df = PhoneNormalizer.normalize_staging_frame(chunk_df, executor=phone_pool, cache=phone_cache)
+                
+                copy_buffer = io.StringIO()
+                normalized_df.to_csv(copy_buffer, index=False, header=False)
+                copy_buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {normalized_batch_table} FROM STDIN WITH (FORMAT csv)",
+                    copy_buffer
+                )
+                
+                cursor.execute(f"""
+                UPDATE {staging_phone_DBTable} AS staging
+                SET 
+                    phone_e164 = batch.phone_e164,
+                    country_code = batch.country_code,
+                    is_normalized_success = batch.is_normalized_success,
+                    raw_phone_extension = batch.raw_phone_extension,
+                    error_notes = COALESCE(staging.error_notes, '') || CASE WHEN batch.error_msg IS NOT NULL THEN '; ' || batch.error_msg ELSE '' END
+                FROM {normalized_batch_table} AS batch
+                WHERE staging.id = batch.id;
+                """)
+                raw_connection.commit()
+                
+                processed_count += len(chunk_df)
+                chunk_seconds = time.time() - chunk_started_at
+                chunk_rate = len(chunk_df) / chunk_seconds if chunk_seconds > 0 else 0
+                print(f"[{processed_count}/{len(staging_df)}] chunk of {len(chunk_df)} rows at {chunk_rate:,.0f} rows/sec")
+        finally:
+            if phone_pool is not None:
+                phone_pool.shutdown()
+            raw_connection.close()
         
-        # Print final newline if we didn't just print one
-        if processed_count % 3000 != 0:
-            print(f' [{processed_count}/{len(staging_df)}]')
+        total_seconds = time.time() - start_time
+        overall_rate = processed_count / total_seconds if total_seconds > 0 else 0
+        print(f"Normalized {processed_count} phone records in {total_seconds:.2f} seconds ({overall_rate:,.0f} rows/sec)")
+        print(f"Parse cache hits: {phone_cache.hits}, misses: {phone_cache.misses} (phonenumbers {phone_cache.metadata_version})")
+        print(f"Fast path hits: {PhoneNormalizer.path_counts['fast']}, phonenumbers parse hits: {PhoneNormalizer.path_counts['slow']}")
         
         # Phase 6: Populate NDH tables with successfully normalized phones
         ndh_sql = FrostDict()
@@ -280,110 +262,28 @@ def main():
         # Phase 7: Populate npi_phone table
         ndh_sql['truncate_npi_phone'] = f"TRUNCATE TABLE {npi_phone_DBTable};"
 
-        ndh_sql['populate_npi_phone_mailing_tele'] = f"""
-        INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
-        SELECT DISTINCT
-            main.npi,
-            1,
-            staging.ndh_PhoneNumber_id,
-            COALESCE(staging.raw_phone_extension, ''),
-            staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_main_DBTable} AS main
-            ON staging.raw_phone = main."provider_business_mailing_address_telephone_number"
-        WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
-        """
-
-        ndh_sql['populate_npi_phone_mailing_fax'] = f"""
-        INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
-        SELECT DISTINCT
-            main.npi,
-            2,
-            staging.ndh_PhoneNumber_id,
-            COALESCE(staging.raw_phone_extension, ''),
-            staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_main_DBTable} AS main
-            ON staging.raw_phone = main."provider_business_mailing_address_fax_number"
-        WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
-        """
-
-        ndh_sql['populate_npi_phone_practice_tele'] = f"""
-        INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
-        SELECT DISTINCT
-            main.npi,
-            3,
-            staging.ndh_PhoneNumber_id,
-            COALESCE(staging.raw_phone_extension, ''),
-            staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_main_DBTable} AS main
-            ON staging.raw_phone = main."provider_business_practice_location_address_telephone_number"
-        WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
-        """
-
-        ndh_sql['populate_npi_phone_practice_fax'] = f"""
-        INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
-        SELECT DISTINCT
-            main.npi,
-            4,
-            staging.ndh_PhoneNumber_id,
-            COALESCE(staging.raw_phone_extension, ''),
-            staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_main_DBTable} AS main
-            ON staging.raw_phone = main."provider_business_practice_location_address_fax_number"
-        WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
-        """
-
-        ndh_sql['populate_npi_phone_official_tele'] = f"""
-        INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
-        SELECT DISTINCT
-            main.npi,
-            5,
-            staging.ndh_PhoneNumber_id,
-            COALESCE(staging.raw_phone_extension, ''),
-            staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_main_DBTable} AS main
-            ON staging.raw_phone = main."authorized_official_telephone_number"
-        WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
-        """
-
-        ndh_sql['populate_npi_phone_pl_tele'] = f"""
-        INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
-        SELECT DISTINCT
-            pl.npi::BIGINT,
-            3, -- Assuming secondary practice is also type 3
-            staging.ndh_PhoneNumber_id,
-            COALESCE(staging.raw_phone_extension, ''),
-            staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_pl_DBTable} AS pl
-            ON staging.raw_phone = pl."provider_secondary_practice_address_telephone_number"
-        WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
-        """
-
-        ndh_sql['populate_npi_phone_pl_fax'] = f"""
+        # Every NPI/phone pair comes from the unpivoted relation, joined to staging on its unique key
+        ndh_sql['populate_npi_phone_from_unpivot'] = f"""
         INSERT INTO {npi_phone_DBTable} (npi_id, phonetype_id, phone_number_id, phone_extension, is_fax)
         SELECT DISTINCT
-            pl.npi::BIGINT,
-            4, -- Assuming secondary practice is also type 4
+            phone_source.npi,
+            phone_source.phonetype_id,
             staging.ndh_PhoneNumber_id,
             COALESCE(staging.raw_phone_extension, ''),
             staging.is_fax_in_source
-        FROM {staging_phone_DBTable} AS staging
-        JOIN {npi_pl_DBTable} AS pl
-            ON staging.raw_phone = pl."provider_practice_location_address_fax_number"
+        FROM {phone_source_DBTable} AS phone_source
+        JOIN {staging_phone_DBTable} AS staging
+            ON staging.raw_phone = phone_source.raw_phone
+            AND staging.source_file = phone_source.source_file
+            AND staging.is_fax_in_source = phone_source.is_fax
         WHERE staging.ndh_PhoneNumber_id IS NOT NULL;
         """
         
+        ndh_sql['cleanup_unpivoted_phone_sources'] = scratch_tables.drop_all_sql()
+        
         print("Populating NDH tables with normalized phone data...")
-        SQLoopcicle.run_sql_loop(
-            sql_dict=ndh_sql,
-            is_just_print=False,  # Execute NDH population
-            engine=alchemy_engine
-        )
+        SQLPlanRunner.run_timed(ndh_sql, alchemy_engine, 'Step10', is_just_print=False,  # Execute NDH population
+                                is_explain_analyze=is_explain_analyze)
         
         print("Phone normalization pipeline completed successfully!")
         
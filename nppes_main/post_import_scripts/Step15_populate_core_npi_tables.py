@@ -19,12 +19,37 @@ Processing phases broken into small, clear steps following DRY principles.
 """
 
 import plainerflow  # type: ignore
-from plainerflow import CredentialFinder, DBTable, FrostDict, SQLoopcicle  # type: ignore
+from plainerflow import CredentialFinder, DBTable, FrostDict  # type: ignore
+import sqlalchemy
+import argparse
 import os
+import sys
+import time
+
+# ScratchTables and SQLPlanRunner live at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from ScratchTables import ScratchTables
+from SQLPlanRunner import SQLPlanRunner
 
 def main():
+    parser = argparse.ArgumentParser(description='Incrementally populate the core NDH NPI tables from NPPES')
+    parser.add_argument('--from-phase', dest='from_phase', default=None,
+                        help="Resume the IN_PROGRESS run from this step key or prefix (e.g. '13' or '13b'), re-running everything after it")
+    parser.add_argument('--fresh', action='store_true',
+                        help='Mark any IN_PROGRESS run FAILED and start a new run instead of resuming it')
+    args = parser.parse_args()
+    if args.fresh and args.from_phase:
+        parser.error('--fresh starts a new run, so it cannot be combined with --from-phase')
+
     # Control dry-run mode - start with True to preview SQL
     is_just_print = False
+    # UNLOGGED scratch tables skip WAL; set to False to measure the cost of logged intermediate tables
+    is_scratch_unlogged = True
+    # None matches parents on the exact normalized name only. A value such as 0.8 also accepts
+    # pg_trgm near matches at or above that similarity when no exact match exists.
+    parent_name_similarity_threshold = None
+    # Record each statement's EXPLAIN (ANALYZE, BUFFERS) plan in intake.sql_step_timing along with its timing
+    is_explain_analyze = False
     
     print("Connecting to DB")
     base_path = os.path.dirname(os.path.abspath(__file__))
@@ -48,19 +73,42 @@ def main():
     npi_change_log_DBTable = DBTable(schema='intake', table='npi_change_log')
     individual_change_log_DBTable = DBTable(schema='intake', table='individual_change_log')
     parent_change_log_DBTable = DBTable(schema='intake', table='parent_relationship_change_log')
+    row_hash_snapshot_DBTable = DBTable(schema='intake', table='npi_row_hash_snapshot')
+    normalized_org_name_DBTable = DBTable(schema='intake', table='normalized_org_name')
     
-    # Intermediate working tables (regular tables in intake schema, cleaned up each run)
-    current_run_DBTable = DBTable(schema='intake', table='temp_current_run')
-    npi_changes_DBTable = DBTable(schema='intake', table='temp_npi_changes')
-    individual_provider_changes_DBTable = DBTable(schema='intake', table='temp_individual_provider_changes')
-    authorized_official_changes_DBTable = DBTable(schema='intake', table='temp_authorized_official_changes')
-    normalized_org_names_DBTable = DBTable(schema='intake', table='temp_normalized_org_names')
-    parent_matches_DBTable = DBTable(schema='intake', table='temp_parent_matches')
-    resolved_parents_DBTable = DBTable(schema='intake', table='temp_resolved_parents')
-    parent_changes_DBTable = DBTable(schema='intake', table='temp_parent_changes')
-    multi_parent_npis_DBTable = DBTable(schema='intake', table='temp_multi_parent_npis')
-    run_stats_DBTable = DBTable(schema='intake', table='temp_run_stats')
+    # Intermediate working tables: UNLOGGED scratch tables in the intake schema, ANALYZEd once
+    # populated and dropped when the run ends. Set is_scratch_unlogged = False to compare WAL volume
+    # and run time against regular logged tables.
+    scratch_tables = ScratchTables(schema='intake', unlogged=is_scratch_unlogged)
+    current_run_DBTable = scratch_tables.table('temp_current_run')
+    current_row_hashes_DBTable = scratch_tables.table('temp_current_row_hashes')
+    npi_hash_diff_DBTable = scratch_tables.table('temp_npi_hash_diff')
+    npi_changes_DBTable = scratch_tables.table('temp_npi_changes')
+    individual_provider_changes_DBTable = scratch_tables.table('temp_individual_provider_changes')
+    authorized_official_changes_DBTable = scratch_tables.table('temp_authorized_official_changes')
+    changed_subparts_DBTable = scratch_tables.table('temp_changed_subparts')
+    parent_matches_DBTable = scratch_tables.table('temp_parent_matches')
+    resolved_parents_DBTable = scratch_tables.table('temp_resolved_parents')
+    parent_changes_DBTable = scratch_tables.table('temp_parent_changes')
+    multi_parent_npis_DBTable = scratch_tables.table('temp_multi_parent_npis')
+    run_stats_DBTable = scratch_tables.table('temp_run_stats')
     
+    # Identifies the loaded main_file: a reload gets a new filenode, and the row count and latest
+    # last_update_date catch changes made in place. A run only resumes over the file it started on.
+    source_fingerprint_sql = f"""
+    SELECT pg_relation_filenode('{source_DBTable}')::TEXT || ':' || COUNT(*)::TEXT || ':' || COALESCE(MAX("last_update_date")::TEXT, '')
+    FROM {source_DBTable}
+    """
+
+    def record_phase_counts_sql(counts_expression):
+        # Merge named row counts into the current run's phase_row_counts
+        return f"""
+    UPDATE {processing_run_DBTable} AS processing_run
+    SET phase_row_counts = COALESCE(processing_run.phase_row_counts, '{{}}'::JSONB) || jsonb_build_object({counts_expression})
+    FROM {current_run_DBTable} AS current_run
+    WHERE processing_run.id = current_run.run_id;
+    """
+
     # Create SQL execution plan
     sql = FrostDict()
     
@@ -79,7 +127,11 @@ def main():
         updated_npis INTEGER,
         deactivated_npis INTEGER,
         processing_status VARCHAR(50) DEFAULT 'IN_PROGRESS',
-        notes TEXT
+        notes TEXT,
+        phase_row_counts JSONB DEFAULT '{{}}'::JSONB,
+        step_checkpoints JSONB DEFAULT '{{}}'::JSONB,
+        last_completed_step VARCHAR(100),
+        source_fingerprint TEXT
     );
     """
     
@@ -89,7 +141,7 @@ def main():
         id SERIAL PRIMARY KEY,
         processing_run_id INTEGER REFERENCES {processing_run_DBTable}(id),
         npi BIGINT NOT NULL,
-        change_type VARCHAR(50) NOT NULL, -- 'NEW', 'UPDATED', 'DEACTIVATED', 'REACTIVATED'
+        change_type VARCHAR(50) NOT NULL, -- 'NEW', 'UPDATED', 'DEACTIVATED', 'REACTIVATED', 'REMOVED'
         change_detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         old_last_update_date DATE,
         new_last_update_date DATE,
@@ -136,6 +188,53 @@ def main():
     CREATE INDEX IF NOT EXISTS idx_individual_change_log_npi ON {individual_change_log_DBTable}(npi);
     CREATE INDEX IF NOT EXISTS idx_parent_relationship_change_log_child ON {parent_change_log_DBTable}(child_npi);
     """
+
+    sql['00f_add_phase_row_counts_to_npi_processing_run'] = f"""
+    -- Runs created before hash-driven change detection do not have this column yet
+    ALTER TABLE {processing_run_DBTable}
+    ADD COLUMN IF NOT EXISTS phase_row_counts JSONB DEFAULT '{{}}'::JSONB;
+    """
+
+    sql['00j_add_step_checkpoints_to_npi_processing_run'] = f"""
+    -- Each completed step is recorded here so a failed run can resume where it stopped
+    ALTER TABLE {processing_run_DBTable}
+    ADD COLUMN IF NOT EXISTS step_checkpoints JSONB DEFAULT '{{}}'::JSONB,
+    ADD COLUMN IF NOT EXISTS last_completed_step VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS source_fingerprint TEXT;
+    """
+
+    sql['00g_create_npi_row_hash_snapshot_table'] = f"""
+    -- The (npi, row_hash) pairs from the last completed run, diffed against the new file
+    CREATE TABLE IF NOT EXISTS {row_hash_snapshot_DBTable} (
+        npi BIGINT PRIMARY KEY,
+        row_hash VARCHAR(32) NOT NULL,
+        processing_run_id INTEGER REFERENCES {processing_run_DBTable}(id)
+    );
+    """
+
+    sql['00h_create_normalized_org_name_table'] = f"""
+    -- Normalized organization names keyed by NPI, kept across runs and refreshed for changed NPIs only
+    CREATE TABLE IF NOT EXISTS {normalized_org_name_DBTable} (
+        npi BIGINT PRIMARY KEY,
+        legal_business_name TEXT,
+        parent_organization_lbn TEXT,
+        is_organization_subpart VARCHAR(1),
+        normalized_legal_name TEXT NOT NULL,
+        normalized_parent_name TEXT NOT NULL,
+        processing_run_id INTEGER REFERENCES {processing_run_DBTable}(id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_normalized_org_name_parent_candidates
+    ON {normalized_org_name_DBTable} (normalized_legal_name)
+    WHERE is_organization_subpart = 'N';
+    """
+
+    if parent_name_similarity_threshold is not None:
+        sql['00i_create_normalized_org_name_trigram_index'] = f"""
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_normalized_org_name_parent_candidates_trgm
+    ON {normalized_org_name_DBTable} USING GIN (normalized_legal_name gin_trgm_ops)
+    WHERE is_organization_subpart = 'N';
+    """
     
     # ========================================
     # PHASE 1: Initialize processing run
@@ -145,32 +244,72 @@ def main():
     INSERT INTO {processing_run_DBTable} (
         source_table,
         processing_status,
-        notes
+        notes,
+        source_fingerprint
     )
     VALUES (
         '{npi_table}',
         'IN_PROGRESS',
-        'Starting incremental NPI processing run'
+        'Starting incremental NPI processing run',
+        ({source_fingerprint_sql})
     );
     """
     
-    sql['02_create_current_run_temp_table'] = f"""
-    DROP TABLE IF EXISTS {current_run_DBTable};
-    CREATE TABLE {current_run_DBTable} AS
+    sql['02_create_current_run_temp_table'] = scratch_tables.create_table_as_sql(current_run_DBTable, f"""
     SELECT id AS run_id 
     FROM {processing_run_DBTable} 
     WHERE processing_status = 'IN_PROGRESS' 
     ORDER BY run_date DESC 
     LIMIT 1;
-    """
+    """)
     
     # ========================================
     # PHASE 2: Detect NPI changes
     # ========================================
-    
-    sql['03_create_npi_changes_temp_table'] = f"""
-    DROP TABLE IF EXISTS {npi_changes_DBTable};
-    CREATE TABLE {npi_changes_DBTable} AS
+
+    # Diff this file's row hashes (Step07) against the snapshot from the last completed run.
+    # Both sides are keyed and sorted by npi, so the FULL OUTER JOIN runs as a merge join
+    # instead of hashing 7 million rows. Only NEW and CHANGED NPIs flow into the later phases.
+
+    sql['02a_create_current_row_hashes_temp_table'] = scratch_tables.create_table_as_sql(current_row_hashes_DBTable, f"""
+    SELECT
+        nppes_main."npi" AS npi,
+        nppes_main.row_hash
+    FROM {source_DBTable} AS nppes_main
+    WHERE nppes_main."npi" IS NOT NULL
+    ORDER BY nppes_main."npi";
+    ALTER TABLE {current_row_hashes_DBTable} ADD PRIMARY KEY (npi);
+    """)
+
+    sql['02b_create_npi_hash_diff_temp_table'] = f"""
+    -- A missing row_hash always counts as CHANGED, so those NPIs are never skipped
+    SET enable_hashjoin = off;""" + scratch_tables.create_table_as_sql(npi_hash_diff_DBTable, f"""
+    SELECT
+        COALESCE(current_hashes.npi, snapshot.npi) AS npi,
+        CASE
+            WHEN snapshot.npi IS NULL THEN 'NEW'
+            WHEN current_hashes.npi IS NULL THEN 'REMOVED'
+            ELSE 'CHANGED'
+        END AS change_type
+    FROM {current_row_hashes_DBTable} AS current_hashes
+    FULL OUTER JOIN {row_hash_snapshot_DBTable} AS snapshot ON current_hashes.npi = snapshot.npi
+    WHERE snapshot.npi IS NULL
+    OR current_hashes.npi IS NULL
+    OR current_hashes.row_hash IS NULL
+    OR current_hashes.row_hash != snapshot.row_hash;
+    RESET enable_hashjoin;
+    CREATE INDEX ON {npi_hash_diff_DBTable} (npi, change_type);
+    """)
+
+    sql['02c_record_hash_diff_counts'] = record_phase_counts_sql(f"""
+        'hash_new_npis', (SELECT COUNT(*) FROM {npi_hash_diff_DBTable} WHERE change_type = 'NEW'),
+        'hash_changed_npis', (SELECT COUNT(*) FROM {npi_hash_diff_DBTable} WHERE change_type = 'CHANGED'),
+        'hash_removed_npis', (SELECT COUNT(*) FROM {npi_hash_diff_DBTable} WHERE change_type = 'REMOVED'),
+        'hash_unchanged_npis', (SELECT COUNT(*) FROM {current_row_hashes_DBTable})
+            - (SELECT COUNT(*) FROM {npi_hash_diff_DBTable} WHERE change_type IN ('NEW', 'CHANGED'))
+    """)
+
+    sql['03_create_npi_changes_temp_table'] = scratch_tables.create_table_as_sql(npi_changes_DBTable, f"""
     SELECT 
         nppes_main."npi" AS npi,
         nppes_main."last_update_date" AS new_last_update_date,
@@ -180,6 +319,8 @@ def main():
             WHEN nppes_main."last_update_date" > npi_table.last_update_date THEN 'UPDATED'
             WHEN nppes_main."npi_deactivation_date" IS NOT NULL AND npi_table.deactivation_date IS NULL THEN 'DEACTIVATED'
             WHEN nppes_main."npi_reactivation_date" IS NOT NULL AND npi_table.reactivation_date IS NULL THEN 'REACTIVATED'
+            -- Some field changed without last_update_date moving forward
+            WHEN hash_diff.change_type = 'CHANGED' THEN 'UPDATED'
             ELSE NULL
         END AS change_type,
         jsonb_build_object(
@@ -189,10 +330,15 @@ def main():
             'replacement_npi', nppes_main."replacement_npi"
         ) AS change_details
     FROM {source_DBTable} AS nppes_main
+    JOIN {npi_hash_diff_DBTable} AS hash_diff ON nppes_main."npi" = hash_diff.npi
     LEFT JOIN {npi_DBTable} AS npi_table ON nppes_main."npi" = npi_table.npi
-    WHERE nppes_main."npi" IS NOT NULL;
-    """
+    WHERE nppes_main."npi" IS NOT NULL
+    AND hash_diff.change_type IN ('NEW', 'CHANGED');
+    """)
     
+    # The change log inserts skip NPIs already logged for this run, so a resumed or --from-phase
+    # rerun never logs the same change twice (and the run statistics never count it twice).
+
     sql['04_log_npi_changes'] = f"""
     INSERT INTO {npi_change_log_DBTable} (
         processing_run_id,
@@ -211,8 +357,48 @@ def main():
         npi_changes.change_details
     FROM {npi_changes_DBTable} AS npi_changes
     CROSS JOIN {current_run_DBTable} AS current_run
-    WHERE npi_changes.change_type IS NOT NULL;
+    WHERE npi_changes.change_type IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM {npi_change_log_DBTable} AS logged
+        WHERE logged.processing_run_id = current_run.run_id
+        AND logged.npi = npi_changes.npi
+    );
+    """
+
+    sql['04a_log_removed_npis'] = f"""
+    -- NPIs that were in the last run's snapshot but are missing from this file
+    INSERT INTO {npi_change_log_DBTable} (
+        processing_run_id,
+        npi,
+        change_type,
+        old_last_update_date,
+        new_last_update_date,
+        change_details
+    )
+    SELECT
+        current_run.run_id,
+        hash_diff.npi,
+        'REMOVED',
+        npi_table.last_update_date,
+        NULL,
+        NULL
+    FROM {npi_hash_diff_DBTable} AS hash_diff
+    CROSS JOIN {current_run_DBTable} AS current_run
+    LEFT JOIN {npi_DBTable} AS npi_table ON hash_diff.npi = npi_table.npi
+    WHERE hash_diff.change_type = 'REMOVED'
+    AND NOT EXISTS (
+        SELECT 1 FROM {npi_change_log_DBTable} AS logged
+        WHERE logged.processing_run_id = current_run.run_id
+        AND logged.npi = hash_diff.npi
+    );
     """
+
+    sql['04b_record_npi_change_counts'] = record_phase_counts_sql(f"""
+        'phase2_npi_changes_logged', (
+            SELECT COUNT(*) FROM {npi_change_log_DBTable} AS change_log
+            JOIN {current_run_DBTable} AS current_run ON change_log.processing_run_id = current_run.run_id
+        )
+    """)
     
     # ========================================
     # PHASE 3: Process NPI record changes (UPSERT)
@@ -266,14 +452,21 @@ def main():
         reactivation_date = EXCLUDED.reactivation_date,
         certification_date = EXCLUDED.certification_date;
     """
+
+    sql['05a_record_npi_upsert_counts'] = record_phase_counts_sql(f"""
+        'phase3_npi_records_upserted', (
+            SELECT COUNT(*) FROM {npi_changes_DBTable} AS npi_changes
+            JOIN {source_DBTable} AS nppes_main ON npi_changes.npi = nppes_main."npi"
+            WHERE npi_changes.change_type IS NOT NULL
+            AND nppes_main."entity_type_code" != ''
+        )
+    """)
     
     # ========================================
     # PHASE 4: Detect Individual record changes
     # ========================================
     
-    sql['06_create_individual_provider_changes_temp_table'] = f"""
-    DROP TABLE IF EXISTS {individual_provider_changes_DBTable};
-    CREATE TABLE {individual_provider_changes_DBTable} AS
+    sql['06_create_individual_provider_changes_temp_table'] = scratch_tables.create_table_as_sql(individual_provider_changes_DBTable, f"""
     SELECT 
         nppes_main."npi" AS npi,
         COALESCE(nppes_main."provider_last_name_legal_name", '') AS last_name,
@@ -318,11 +511,9 @@ def main():
     AND change_log.processed = FALSE
     AND nppes_main."provider_last_name_legal_name" IS NOT NULL
     AND nppes_main."provider_first_name" IS NOT NULL;
-    """
+    """)
     
-    sql['07_create_authorized_official_changes_temp_table'] = f"""
-    DROP TABLE IF EXISTS {authorized_official_changes_DBTable};
-    CREATE TABLE {authorized_official_changes_DBTable} AS
+    sql['07_create_authorized_official_changes_temp_table'] = scratch_tables.create_table_as_sql(authorized_official_changes_DBTable, f"""
     SELECT 
         nppes_main."npi" AS npi,
         COALESCE(nppes_main."authorized_official_last_name", '') AS last_name,
@@ -367,7 +558,7 @@ def main():
     AND change_log.processed = FALSE
     AND nppes_main."authorized_official_last_name" IS NOT NULL
     AND nppes_main."authorized_official_first_name" IS NOT NULL;
-    """
+    """)
     
     sql['08_log_individual_provider_changes'] = f"""
     INSERT INTO {individual_change_log_DBTable} (
@@ -387,7 +578,12 @@ def main():
         individual_provider_changes.new_values
     FROM {individual_provider_changes_DBTable} AS individual_provider_changes
     CROSS JOIN {current_run_DBTable} AS current_run
-    WHERE individual_provider_changes.change_type IS NOT NULL;
+    WHERE individual_provider_changes.change_type IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM {individual_change_log_DBTable} AS logged
+        WHERE logged.processing_run_id = current_run.run_id
+        AND logged.npi = individual_provider_changes.npi
+    );
     """
     
     sql['09_log_authorized_official_changes'] = f"""
@@ -408,8 +604,18 @@ def main():
         authorized_official_changes.new_values
     FROM {authorized_official_changes_DBTable} AS authorized_official_changes
     CROSS JOIN {current_run_DBTable} AS current_run
-    WHERE authorized_official_changes.change_type IS NOT NULL;
+    WHERE authorized_official_changes.change_type IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM {individual_change_log_DBTable} AS logged
+        WHERE logged.processing_run_id = current_run.run_id
+        AND logged.npi = authorized_official_changes.npi
+    );
     """
+
+    sql['09a_record_individual_change_counts'] = record_phase_counts_sql(f"""
+        'phase4_individual_provider_changes', (SELECT COUNT(*) FROM {individual_provider_changes_DBTable} WHERE change_type IS NOT NULL),
+        'phase4_authorized_official_changes', (SELECT COUNT(*) FROM {authorized_official_changes_DBTable} WHERE change_type IS NOT NULL)
+    """)
     
     # ========================================
     # PHASE 5: Create new Individual records
@@ -516,50 +722,139 @@ def main():
     # PHASE 7: Detect parent relationship changes
     # ========================================
     
-    #TODO better document the purpose of these REGEXP. What is the goal? Why are we doing this? 
+    # Subparts name their parent by Legal Business Name, which NPPES does not standardize. Dropping
+    # everything but letters and digits and lowercasing makes "Acme Health, Inc." and "ACME HEALTH INC"
+    # the same key. The normalized names live in a persistent table keyed by NPI, so only changed
+    # NPIs are renormalized, and each changed subpart finds its parent with an index lookup.
+
+    normalized_legal_name_sql = """LOWER(REGEXP_REPLACE(
+            COALESCE(source_table."provider_organization_name_legal_business_name", ''), 
+            '[^a-zA-Z0-9]', '', 'g'
+        ))"""
+    normalized_parent_name_sql = """LOWER(REGEXP_REPLACE(
+            COALESCE(source_table."parent_organization_lbn", ''), 
+            '[^a-zA-Z0-9]', '', 'g'
+        ))"""
 
-    sql['13_create_normalized_org_names_temp_table'] = f"""
-    DROP TABLE IF EXISTS {normalized_org_names_DBTable};
-    CREATE TABLE {normalized_org_names_DBTable} AS
+    sql['13_bootstrap_normalized_org_names'] = f"""
+    -- Only runs the first time: fill the index from every organization in the file
+    INSERT INTO {normalized_org_name_DBTable} (
+        npi,
+        legal_business_name,
+        parent_organization_lbn,
+        is_organization_subpart,
+        normalized_legal_name,
+        normalized_parent_name,
+        processing_run_id
+    )
     SELECT 
         source_table."npi",
         source_table."provider_organization_name_legal_business_name",
         source_table."parent_organization_lbn",
         source_table."is_organization_subpart",
-        LOWER(REGEXP_REPLACE(
-            COALESCE(source_table."provider_organization_name_legal_business_name", ''), 
-            '[^a-zA-Z0-9]', '', 'g'
-        )) AS normalized_legal_name,
-        LOWER(REGEXP_REPLACE(
-            COALESCE(source_table."parent_organization_lbn", ''), 
-            '[^a-zA-Z0-9]', '', 'g'
-        )) AS normalized_parent_name
+        {normalized_legal_name_sql},
+        {normalized_parent_name_sql},
+        current_run.run_id
+    FROM {source_DBTable} AS source_table
+    CROSS JOIN {current_run_DBTable} AS current_run
+    WHERE source_table."entity_type_code" = '2'
+    AND NOT EXISTS (SELECT 1 FROM {normalized_org_name_DBTable})
+    ON CONFLICT (npi) DO NOTHING;
+    """
+
+    sql['13a_remove_changed_npis_from_normalized_org_names'] = f"""
+    -- Covers REMOVED NPIs and organizations whose entity type changed, as well as renamed ones
+    DELETE FROM {normalized_org_name_DBTable}
+    WHERE npi IN (
+        SELECT change_log.npi
+        FROM {npi_change_log_DBTable} AS change_log
+        WHERE change_log.processed = FALSE
+    );
+    """
+
+    sql['13b_insert_changed_npis_into_normalized_org_names'] = f"""
+    INSERT INTO {normalized_org_name_DBTable} (
+        npi,
+        legal_business_name,
+        parent_organization_lbn,
+        is_organization_subpart,
+        normalized_legal_name,
+        normalized_parent_name,
+        processing_run_id
+    )
+    SELECT DISTINCT ON (source_table."npi")
+        source_table."npi",
+        source_table."provider_organization_name_legal_business_name",
+        source_table."parent_organization_lbn",
+        source_table."is_organization_subpart",
+        {normalized_legal_name_sql},
+        {normalized_parent_name_sql},
+        current_run.run_id
     FROM {source_DBTable} AS source_table
     JOIN {npi_change_log_DBTable} AS change_log ON source_table."npi" = change_log.npi
+    CROSS JOIN {current_run_DBTable} AS current_run
     WHERE source_table."entity_type_code" = '2'
-    AND change_log.processed = FALSE;
+    AND change_log.processed = FALSE
+    ON CONFLICT (npi) DO NOTHING;
     """
-    
-    sql['14_create_parent_matches_temp_table'] = f"""
-    DROP TABLE IF EXISTS {parent_matches_DBTable};
-    CREATE TABLE {parent_matches_DBTable} AS
+
+    sql['13c_create_changed_subparts_temp_table'] = scratch_tables.create_table_as_sql(changed_subparts_DBTable, f"""
+    SELECT DISTINCT
+        org_name.npi,
+        org_name.parent_organization_lbn AS "parent_organization_lbn",
+        org_name.normalized_parent_name
+    FROM {normalized_org_name_DBTable} AS org_name
+    JOIN {npi_change_log_DBTable} AS change_log ON org_name.npi = change_log.npi
+    WHERE change_log.processed = FALSE
+    AND org_name.is_organization_subpart = 'Y'
+    AND org_name.normalized_parent_name != '';
+    """)
+
+    if parent_name_similarity_threshold is None:
+        sql['14_create_parent_matches_temp_table'] = scratch_tables.create_table_as_sql(parent_matches_DBTable, f"""
     SELECT 
-        subpart."npi" as subpart_npi,
+        subpart.npi AS subpart_npi,
         subpart."parent_organization_lbn",
-        parent."npi" as parent_npi
-    FROM {normalized_org_names_DBTable} subpart
-    LEFT JOIN {normalized_org_names_DBTable} parent ON (
-        subpart.normalized_parent_name = parent.normalized_legal_name
-        AND parent."is_organization_subpart" = 'N'
-        AND subpart."npi" != parent."npi"
-    )
-    WHERE subpart."is_organization_subpart" = 'Y'
-    AND subpart.normalized_parent_name != '';
-    """
+        parent.npi AS parent_npi
+    FROM {changed_subparts_DBTable} subpart
+    LEFT JOIN {normalized_org_name_DBTable} parent ON (
+        parent.normalized_legal_name = subpart.normalized_parent_name
+        AND parent.is_organization_subpart = 'N'
+        AND parent.npi != subpart.npi
+    );
+    """)
+    else:
+        # Near-miss names ("Acme Helth") only count when no parent matches the normalized name exactly
+        sql['14_create_parent_matches_temp_table'] = f"""
+    SET pg_trgm.similarity_threshold = {parent_name_similarity_threshold};""" + scratch_tables.create_table_as_sql(parent_matches_DBTable, f"""
+    SELECT 
+        subpart.npi AS subpart_npi,
+        subpart."parent_organization_lbn",
+        parent.npi AS parent_npi
+    FROM {changed_subparts_DBTable} subpart
+    LEFT JOIN LATERAL (
+        SELECT exact_parent.npi
+        FROM {normalized_org_name_DBTable} AS exact_parent
+        WHERE exact_parent.normalized_legal_name = subpart.normalized_parent_name
+        AND exact_parent.is_organization_subpart = 'N'
+        AND exact_parent.npi != subpart.npi
+        UNION ALL
+        SELECT similar_parent.npi
+        FROM {normalized_org_name_DBTable} AS similar_parent
+        WHERE similar_parent.normalized_legal_name % subpart.normalized_parent_name
+        AND similar_parent.is_organization_subpart = 'N'
+        AND similar_parent.npi != subpart.npi
+        AND NOT EXISTS (
+            SELECT 1 FROM {normalized_org_name_DBTable} AS exact_parent
+            WHERE exact_parent.normalized_legal_name = subpart.normalized_parent_name
+            AND exact_parent.is_organization_subpart = 'N'
+            AND exact_parent.npi != subpart.npi
+        )
+    ) AS parent ON TRUE;
+    RESET pg_trgm.similarity_threshold;
+    """)
     
-    sql['15_create_resolved_parents_temp_table'] = f"""
-    DROP TABLE IF EXISTS {resolved_parents_DBTable};
-    CREATE TABLE {resolved_parents_DBTable} AS
+    sql['15_create_resolved_parents_temp_table'] = scratch_tables.create_table_as_sql(resolved_parents_DBTable, f"""
     SELECT 
         parent_matches.subpart_npi,
         parent_matches."parent_organization_lbn",
@@ -570,11 +865,9 @@ def main():
         COUNT(parent_matches.parent_npi) AS match_count
     FROM {parent_matches_DBTable} AS parent_matches
     GROUP BY parent_matches.subpart_npi, parent_matches."parent_organization_lbn";
-    """
+    """)
     
-    sql['16_create_parent_changes_temp_table'] = f"""
-    DROP TABLE IF EXISTS {parent_changes_DBTable};
-    CREATE TABLE {parent_changes_DBTable} AS
+    sql['16_create_parent_changes_temp_table'] = scratch_tables.create_table_as_sql(parent_changes_DBTable, f"""
     SELECT 
         resolved_parents.subpart_npi AS child_npi,
         npi_to_clinical_org.parent_npi_id AS old_parent_npi,
@@ -587,7 +880,7 @@ def main():
         END AS change_type
     FROM {resolved_parents_DBTable} AS resolved_parents
     LEFT JOIN {npi_to_clinical_org_DBTable} AS npi_to_clinical_org ON resolved_parents.subpart_npi = npi_to_clinical_org.npi_id;
-    """
+    """)
     
     sql['17_log_parent_relationship_changes'] = f"""
     INSERT INTO {parent_change_log_DBTable} (
@@ -605,8 +898,18 @@ def main():
         pc.change_type
     FROM {parent_changes_DBTable} pc
     CROSS JOIN {current_run_DBTable} cr
-    WHERE pc.change_type IS NOT NULL;
+    WHERE pc.change_type IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM {parent_change_log_DBTable} AS logged
+        WHERE logged.processing_run_id = cr.run_id
+        AND logged.child_npi = pc.child_npi
+    );
     """
+
+    sql['17a_record_parent_change_counts'] = record_phase_counts_sql(f"""
+        'phase7_subparts_checked', (SELECT COUNT(*) FROM {changed_subparts_DBTable}),
+        'phase7_parent_changes', (SELECT COUNT(*) FROM {parent_changes_DBTable} WHERE change_type IS NOT NULL)
+    """)
     
     # ========================================
     # PHASE 8: Update NPI-to-ClinicalOrganization relationships
@@ -670,18 +973,21 @@ def main():
     FROM {resolved_parents_DBTable} rp
     WHERE rp.resolved_parent_npi IS NULL
     AND rp."parent_organization_lbn" IS NOT NULL
-    AND rp."parent_organization_lbn" != '';
+    AND rp."parent_organization_lbn" != ''
+    AND NOT EXISTS (
+        SELECT 1 FROM {wrongnpi_DBTable} AS logged
+        WHERE logged.npi = rp.subpart_npi
+        AND logged.error_type_string = 'NO_PARENT'
+    );
     """
     
-    sql['21_create_multi_parent_npis_temp_table'] = f"""
-    DROP TABLE IF EXISTS {multi_parent_npis_DBTable};
-    CREATE TABLE {multi_parent_npis_DBTable} AS
+    sql['21_create_multi_parent_npis_temp_table'] = scratch_tables.create_table_as_sql(multi_parent_npis_DBTable, f"""
     SELECT DISTINCT
         rp.subpart_npi as npi,
         rp."parent_organization_lbn"
     FROM {resolved_parents_DBTable} rp
     WHERE rp.match_count > 1;
-    """
+    """)
     
     sql['22_log_multi_parent_errors'] = f"""
     INSERT INTO {wrongnpi_DBTable} (npi, error_type_string, reason_npi_is_wrong)
@@ -693,8 +999,21 @@ def main():
             'Parent_Organization_LBN: "', mp."parent_organization_lbn", '", ',
             'found multiple matching non-subpart organizations with same Legal Business Name.'
         ) as reason_npi_is_wrong
-    FROM {multi_parent_npis_DBTable} mp;
+    FROM {multi_parent_npis_DBTable} mp
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {wrongnpi_DBTable} AS logged
+        WHERE logged.npi = mp.npi
+        AND logged.error_type_string = 'MULTI_PARENT'
+    );
     """
+
+    sql['22a_record_wrongnpi_counts'] = record_phase_counts_sql(f"""
+        'phase9_no_parent_errors', (
+            SELECT COUNT(*) FROM {resolved_parents_DBTable}
+            WHERE resolved_parent_npi IS NULL AND "parent_organization_lbn" IS NOT NULL AND "parent_organization_lbn" != ''
+        ),
+        'phase9_multi_parent_errors', (SELECT COUNT(*) FROM {multi_parent_npis_DBTable})
+    """)
     
     # ========================================
     # PHASE 10: Mark changes as processed
@@ -717,14 +1036,28 @@ def main():
     SET processed = TRUE 
     WHERE processed = FALSE;
     """
+
+    sql['25a_refresh_npi_row_hash_snapshot'] = f"""
+    -- This file's hashes become the baseline for the next run. Rows without a hash are left
+    -- out, so they come back as NEW next time rather than being silently treated as unchanged.
+    TRUNCATE {row_hash_snapshot_DBTable};
+    INSERT INTO {row_hash_snapshot_DBTable} (npi, row_hash, processing_run_id)
+    SELECT
+        current_hashes.npi,
+        current_hashes.row_hash,
+        current_run.run_id
+    FROM {current_row_hashes_DBTable} AS current_hashes
+    CROSS JOIN {current_run_DBTable} AS current_run
+    WHERE current_hashes.row_hash IS NOT NULL
+    ORDER BY current_hashes.npi;
+    ANALYZE {row_hash_snapshot_DBTable};
+    """
     
     # ========================================
     # PHASE 11: Calculate run statistics and finalize
     # ========================================
     
-    sql['26_create_run_stats_temp_table'] = f"""
-    DROP TABLE IF EXISTS {run_stats_DBTable};
-    CREATE TABLE {run_stats_DBTable} AS
+    sql['26_create_run_stats_temp_table'] = scratch_tables.create_table_as_sql(run_stats_DBTable, f"""
     SELECT 
         COUNT(*) as total_npis_processed,
         COUNT(*) FILTER (WHERE change_type = 'NEW') as new_npis,
@@ -732,7 +1065,7 @@ def main():
         COUNT(*) FILTER (WHERE change_type = 'DEACTIVATED') as deactivated_npis
     FROM {npi_change_log_DBTable} AS npi_change_log
     JOIN {current_run_DBTable} cr ON npi_change_log.processing_run_id = cr.run_id;
-    """
+    """)
     
     sql['27_finalize_processing_run'] = f"""
     UPDATE {processing_run_DBTable} 
@@ -751,8 +1084,8 @@ def main():
     print("About to run Incremental Core NPI Pipeline SQL")
     print("=" * 60)
     print("This incremental pipeline will:")
-    print("1. Initialize processing run and detect changes")
-    print("2. Process only NEW, UPDATED, DEACTIVATED, or REACTIVATED NPIs")
+    print("1. Initialize processing run and diff row hashes against the last run's snapshot")
+    print("2. Process only NEW, UPDATED, DEACTIVATED, or REACTIVATED NPIs; log REMOVED NPIs")
     print("3. Update ndh.NPI table with changed records only")
     print("4. Detect and process Individual record changes")
     print("5. Create new Individual records only when needed")
@@ -770,15 +1103,108 @@ def main():
     print("Key Features:")
     print("- No CTEs: Uses intermediate temp tables for clarity")
     print("- Small SQL steps: Each step handles one specific task")
-    print("- Incremental updates: Only processes changed records")
+    print("- Incremental updates: Only NPIs whose row_hash changed are processed")
+    print("- Per-phase row counts: Stored in intake.npi_processing_run.phase_row_counts")
     print("- Complete audit trail: All changes logged")
     print("=" * 60)
     
-    SQLoopcicle.run_sql_loop(
-        sql_dict=sql,
-        is_just_print=is_just_print,
-        engine=alchemy_engine
-    )
+    # Phase 0 is idempotent DDL and always runs. Every later step is checkpointed against the
+    # IN_PROGRESS npi_processing_run row, so rerunning after a failure resumes after the last
+    # completed step instead of rescanning main_file from the start. Scratch tables are kept
+    # when a run fails, because the remaining steps read them; a skipped step whose scratch table
+    # did not survive (dropped, or emptied by a server restart) is run again to rebuild it. A run
+    # only resumes when main_file's fingerprint still matches the one recorded at step 01; otherwise,
+    # or with --fresh, the old run is marked FAILED and a new one starts.
+    setup_steps = [key for key in sql if key.startswith('00')]
+    always_run_steps = setup_steps + ['02_create_current_run_temp_table']
+    in_progress_run_sql = f"""
+    SELECT id FROM {processing_run_DBTable}
+    WHERE processing_status = 'IN_PROGRESS'
+    ORDER BY run_date DESC, id DESC
+    LIMIT 1
+    """
+
+    def record_checkpoint(step_key):
+        if is_just_print or step_key in setup_steps:
+            return
+        with alchemy_engine.connect() as conn:
+            conn.execute(sqlalchemy.text(f"""
+            UPDATE {processing_run_DBTable}
+            SET step_checkpoints = COALESCE(step_checkpoints, '{{}}'::JSONB) || jsonb_build_object(:step_key, NOW()::TEXT),
+                last_completed_step = :step_key
+            WHERE id = ({in_progress_run_sql})
+            """), {'step_key': step_key})
+            conn.commit()
+
+    if not is_just_print:
+        wal_start_lsn = ScratchTables.current_wal_lsn(alchemy_engine)
+    start_time = time.time()
+    run_succeeded = False
+    try:
+        SQLPlanRunner.run_steps(sql, alchemy_engine, is_just_print, only_steps=setup_steps)
+
+        resumed_run_id = None
+        completed_steps = []
+        step_checkpoints = {}
+        if not is_just_print:
+            with alchemy_engine.connect() as conn:
+                in_progress_run = conn.execute(sqlalchemy.text(f"""
+                SELECT id, step_checkpoints, source_fingerprint FROM {processing_run_DBTable}
+                WHERE id = ({in_progress_run_sql})
+                """)).fetchone()
+                is_same_source = False
+                if in_progress_run is not None and in_progress_run[1] and not args.fresh:
+                    current_fingerprint = conn.execute(sqlalchemy.text(source_fingerprint_sql)).scalar()
+                    is_same_source = in_progress_run[2] == current_fingerprint
+                    if not is_same_source and not args.from_phase:
+                        print(f"{npi_table} has been reloaded since processing run {in_progress_run[0]} started; starting a new run")
+            if in_progress_run is not None and in_progress_run[1] and (is_same_source or args.from_phase):
+                if not is_same_source:
+                    print(f"⚠️  {npi_table} has changed since processing run {in_progress_run[0]} started, resuming it anyway")
+                resumed_run_id = in_progress_run[0]
+                step_checkpoints = in_progress_run[1]
+                completed_steps = list(step_checkpoints.keys())
+            elif in_progress_run is not None and not args.from_phase:
+                # An abandoned run would otherwise be picked up by step 02 and finalized by step 27
+                with alchemy_engine.connect() as conn:
+                    conn.execute(sqlalchemy.text(f"""
+                    UPDATE {processing_run_DBTable}
+                    SET processing_status = 'FAILED',
+                        notes = 'Abandoned: a later run started fresh instead of resuming it'
+                    WHERE processing_status = 'IN_PROGRESS'
+                    """))
+                    conn.commit()
+                print(f"Marked processing run {in_progress_run[0]} FAILED")
+
+        skip_steps = list(setup_steps)
+        if args.from_phase:
+            if resumed_run_id is None and not is_just_print:
+                raise ValueError("--from-phase needs an IN_PROGRESS processing run with checkpoints to resume")
+            print(f"Resuming processing run {resumed_run_id} from step {args.from_phase}")
+            skip_steps += [key for key in SQLPlanRunner.steps_before(sql, args.from_phase) if key not in always_run_steps]
+        elif resumed_run_id is not None:
+            print(f"Resuming processing run {resumed_run_id} after {len(completed_steps)} completed steps")
+            skip_steps += [key for key in completed_steps if key not in always_run_steps]
+
+        if resumed_run_id is not None and not is_just_print:
+            rebuild_steps = scratch_tables.steps_to_rebuild(alchemy_engine, sql, skip_steps, step_checkpoints)
+            if rebuild_steps:
+                print(f"Rebuilding scratch tables lost since they were created: {', '.join(rebuild_steps)}")
+                skip_steps = [key for key in skip_steps if key not in rebuild_steps]
+
+        SQLPlanRunner.run_steps(sql, alchemy_engine, is_just_print,
+                                skip_steps=skip_steps, on_step_complete=record_checkpoint,
+                                timing_script='Step15', is_explain_analyze=is_explain_analyze)
+        run_succeeded = True
+    finally:
+        if not is_just_print:
+            if run_succeeded:
+                scratch_tables.drop_all(alchemy_engine)
+            else:
+                print("Keeping scratch tables so the run can resume; rerun this script or pass --from-phase")
+            wal_bytes = ScratchTables.wal_bytes_since(alchemy_engine, wal_start_lsn)
+            print(f"Step15 took {time.time() - start_time:.1f} seconds and wrote {wal_bytes / 1024 / 1024:.1f} MB of WAL "
+                  f"({'UNLOGGED' if is_scratch_unlogged else 'logged'} scratch tables)")
 
 if __name__ == "__main__":
     try:
@@ -17,16 +17,34 @@ Indexes Created:
 - ndh.individual_npi: foreign key relationships
 - ndh.organizational_npi: foreign key relationships and parent hierarchy
 - intake.wrongnpi: error analysis indexes
+
+Indexes are built by ConcurrentIndexBuilder: indexes on the same table are built in order on one
+connection, while different tables are built at the same time over a pool of connections.
 """
 
 import plainerflow  # type: ignore
-from plainerflow import CredentialFinder, DBTable, FrostDict, SQLoopcicle  # type: ignore
+from plainerflow import CredentialFinder, DBTable, FrostDict  # type: ignore
 import os
+import sys
+
+# ConcurrentIndexBuilder lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from ConcurrentIndexBuilder import ConcurrentIndexBuilder
 
 def main():
     # Control dry-run mode - start with True to preview SQL
     is_just_print = False
     
+    # Tables whose indexes are built at the same time, each on its own connection
+    index_build_workers = 4
+    # Per-session memory for each build; peak use is about index_build_workers times this
+    maintenance_work_mem = '1GB'
+    # Parallel workers each CREATE INDEX may use on top of its own session
+    max_parallel_maintenance_workers = 2
+    # CREATE INDEX CONCURRENTLY does not block writers to the table, at the cost of two table scans.
+    # Turn on when the monthly refresh runs while the tables are in use.
+    is_concurrently = False
+    
     print("Connecting to DB")
     base_path = os.path.dirname(os.path.abspath(__file__))
     env_location = os.path.abspath(os.path.join(base_path, "..", "..", ".env"))
@@ -220,13 +238,18 @@ def main():
     print("- Partial indexes for sparse data (WHERE clauses)")
     print("- Composite indexes for common query patterns")
     print("- Optimized for both OLTP and analytical queries")
+    print(f"- Different tables built concurrently by {index_build_workers} workers "
+          f"(maintenance_work_mem {maintenance_work_mem}, {max_parallel_maintenance_workers} parallel workers each)")
     print("=" * 60)
     
-    SQLoopcicle.run_sql_loop(
-        sql_dict=sql,
-        is_just_print=is_just_print,
-        engine=alchemy_engine
+    index_builder = ConcurrentIndexBuilder(
+        engine=alchemy_engine,
+        workers=index_build_workers,
+        maintenance_work_mem=maintenance_work_mem,
+        max_parallel_maintenance_workers=max_parallel_maintenance_workers,
+        is_concurrently=is_concurrently
     )
+    index_builder.build(sql, is_just_print=is_just_print)
     
     print("\n" + "=" * 60)
     print("✅ Index creation completed!")
@@ -20,9 +20,16 @@ import pandas as pd
 import sqlalchemy
 from pathlib import Path
 import os
+import sys
+
+# SQLPlanRunner lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from SQLPlanRunner import SQLPlanRunner
 
 def main():
     is_just_print = False  # Start with dry-run mode
+    # Record each statement's EXPLAIN (ANALYZE, BUFFERS) plan in intake.sql_step_timing along with its timing
+    is_explain_analyze = False
     
 
     pecos_vtin_prefix = 'PECOS_'
@@ -315,11 +322,8 @@ def main():
     """
     
     print("About to run SQL")
-    SQLoopcicle.run_sql_loop(
-        sql_dict=sql,
-        is_just_print=is_just_print,
-        engine=alchemy_engine
-    )
+    SQLPlanRunner.run_timed(sql, alchemy_engine, 'Step30', is_just_print=is_just_print,
+                            is_explain_analyze=is_explain_analyze)
 
 if __name__ == "__main__":
     try:
@@ -21,12 +21,19 @@ import pandas as pd
 import sqlalchemy
 from pathlib import Path
 import os
+import sys
+
+# SQLPlanRunner lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from SQLPlanRunner import SQLPlanRunner
 
 class Step35PecosKnowsReassignment:
     
     @staticmethod
     def main():
         is_just_print = False  # Start with dry-run mode
+        # Record each statement's EXPLAIN (ANALYZE, BUFFERS) plan in intake.sql_step_timing along with its timing
+        is_explain_analyze = False
         
         print("Connecting to DB")
         base_path = os.path.dirname(os.path.abspath(__file__))
@@ -185,11 +192,8 @@ class Step35PecosKnowsReassignment:
         """
         
         print("About to run SQL")
-        SQLoopcicle.run_sql_loop(
-            sql_dict=sql,
-            is_just_print=is_just_print,
-            engine=alchemy_engine
-        )
+        SQLPlanRunner.run_timed(sql, alchemy_engine, 'Step35', is_just_print=is_just_print,
+                                is_explain_analyze=is_explain_analyze)
         
         # Run InLaw validation tests
         print("🔍 Running InLaw validation tests...")
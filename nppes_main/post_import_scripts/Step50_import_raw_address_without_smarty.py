@@ -8,10 +8,273 @@ and populates the normalized address tables in the 'ndh' schema.
 
 It uses a persistent mapping table (`intake.raw_address_import_map`) to
 avoid re-processing addresses that have already been imported in previous runs.
+
+In incremental mode only NPIs whose main_file row_hash, or whose digest of endpoint
+and pl file addresses, changed since the last Step50 run
+(`intake.address_npi_row_hash_snapshot`) are extracted, and only their
+`ndh.npi_address` links are deleted or inserted. The first run, or any run with
+is_incremental = False, rebuilds every link.
+
+Before hashing is used for dedup, each distinct raw address is canonicalized in
+Python by AddressNormalizer (USPS suffixes, directionals, unit designators, ZIP+4
+truncation, whitespace), so "123 Main St." and "123 MAIN STREET" hash alike.
+Canonical forms are kept in `intake.raw_address_canonical`, keyed by the raw hash
+and AddressNormalizer.NORMALIZER_VERSION, so each raw spelling is only canonicalized
+once per version. `intake.raw_address_import_map_version` records which version the
+map hashes were made with; when it differs (or the map predates canonicalization),
+the existing addresses are re-keyed to the current canonical hashes and the run
+rebuilds every link, so changed rules merge addresses instead of duplicating them.
 """
 
+import io
 import os
-from plainerflow import CredentialFinder, DBTable, FrostDict, SQLoopcicle
+import sys
+import time
+import pandas as pd
+import sqlalchemy
+from plainerflow import CredentialFinder, DBTable, FrostDict
+
+# SQLPlanRunner and AddressNormalizer live at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from SQLPlanRunner import SQLPlanRunner
+from AddressNormalizer import AddressNormalizer, ADDRESS_COLUMNS
+
+
+def canonicalize_raw_addresses(alchemy_engine, raw_import_DBTable, canonical_DBTable, batch_size):
+    """
+    Canonicalize the raw addresses that have no canonical form yet, then rewrite raw_address_import
+    with the canonical columns and a hash of them
+    Prints the canonicalization rate and how far the distinct-address count dropped.
+    """
+    address_columns = ', '.join(ADDRESS_COLUMNS)
+    new_addresses_df = pd.read_sql(f"""
+    SELECT DISTINCT ON (raw.address_hash)
+        {', '.join(f'raw.{column}' for column in ADDRESS_COLUMNS)},
+        raw.address_hash
+    FROM {raw_import_DBTable} AS raw
+    LEFT JOIN {canonical_DBTable} AS canonical
+        ON canonical.raw_address_hash = raw.address_hash
+        AND canonical.normalizer_version = '{AddressNormalizer.NORMALIZER_VERSION}'
+    WHERE canonical.raw_address_hash IS NULL
+    ORDER BY raw.address_hash
+    """, alchemy_engine)
+    print(f"Canonicalizing {len(new_addresses_df):,} raw addresses not seen in earlier runs...")
+
+    start_time = time.time()
+    raw_connection = alchemy_engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        for chunk_start in range(0, len(new_addresses_df), batch_size):
+            chunk_df = new_addresses_df.iloc[chunk_start:chunk_start + batch_size]
+            canonical_df = AddressNormalizer.canonicalize_frame(chunk_df)
+            canonical_df['normalizer_version'] = AddressNormalizer.NORMALIZER_VERSION
+            copy_buffer = io.StringIO()
+            canonical_df[['address_hash', 'normalizer_version'] + ADDRESS_COLUMNS].to_csv(copy_buffer, index=False, header=False)
+            copy_buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {canonical_DBTable} (raw_address_hash, normalizer_version, {address_columns}) FROM STDIN WITH (FORMAT csv)",
+                copy_buffer
+            )
+            raw_connection.commit()
+
+        total_seconds = time.time() - start_time
+        overall_rate = len(new_addresses_df) / total_seconds if total_seconds > 0 else 0
+        print(f"Canonicalized {len(new_addresses_df):,} addresses in {total_seconds:.2f} seconds ({overall_rate:,.0f} rows/sec)")
+
+        cursor.execute(f"SELECT COUNT(DISTINCT address_hash) FROM {raw_import_DBTable}")
+        distinct_before = cursor.fetchone()[0]
+        cursor.execute(f"""
+        UPDATE {raw_import_DBTable} AS raw
+        SET
+            address_line_1 = canonical.address_line_1,
+            address_line_2 = canonical.address_line_2,
+            city = canonical.city,
+            state = canonical.state,
+            postal_code = canonical.postal_code,
+            country_code = canonical.country_code,
+            address_hash = MD5(
+                LOWER(
+                    COALESCE(canonical.address_line_1, '') ||
+                    COALESCE(canonical.address_line_2, '') ||
+                    COALESCE(canonical.city, '') ||
+                    COALESCE(canonical.state, '') ||
+                    COALESCE(canonical.postal_code, '') ||
+                    COALESCE(canonical.country_code, '')
+                )
+            )
+        FROM {canonical_DBTable} AS canonical
+        WHERE canonical.raw_address_hash = raw.address_hash
+        AND canonical.normalizer_version = '{AddressNormalizer.NORMALIZER_VERSION}';
+        """)
+        cursor.execute(f"SELECT COUNT(DISTINCT address_hash) FROM {raw_import_DBTable}")
+        distinct_after = cursor.fetchone()[0]
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+    reduction = (distinct_before - distinct_after) / distinct_before * 100 if distinct_before else 0
+    print(f"Canonicalization reduced distinct addresses from {distinct_before:,} to {distinct_after:,} ({reduction:.1f}% fewer)")
+
+def rekey_existing_addresses(alchemy_engine, address_DBTable, address_us_DBTable, address_intl_DBTable,
+                             npi_address_DBTable, import_map_DBTable, batch_size):
+    """
+    Re-key raw_address_import_map and the address_hash columns to the current canonical hashes
+    Every mapped address is canonicalized the way new ones are. Where several collapse onto one
+    canonical hash, the lowest address id survives and takes the canonical spelling. In the same
+    transaction the npi_address links of the others are moved to the survivor, and their address,
+    address_us and address_international rows are deleted.
+    """
+    address_columns = ', '.join(ADDRESS_COLUMNS)
+    mapped_addresses_sql = f"""
+    SELECT
+        a.id AS address_id,
+        us.id AS address_us_id,
+        NULL::INT AS address_international_id,
+        us.delivery_line_1 AS address_line_1,
+        us.delivery_line_2 AS address_line_2,
+        us.city_name AS city,
+        us.state_abbreviation AS state,
+        us.zipcode AS postal_code,
+        'US' AS country_code
+    FROM {address_DBTable} AS a
+    JOIN {address_us_DBTable} AS us ON us.id = a.address_us_id
+    WHERE a.id IN (SELECT address_id FROM {import_map_DBTable})
+    UNION ALL
+    SELECT
+        a.id,
+        NULL::INT,
+        intl.id,
+        intl.address1,
+        intl.address2,
+        intl.locality,
+        intl.administrative_area,
+        intl.postal_code,
+        intl.country
+    FROM {address_DBTable} AS a
+    JOIN {address_intl_DBTable} AS intl ON intl.id = a.address_international_id
+    WHERE a.id IN (SELECT address_id FROM {import_map_DBTable})
+    """
+    print(f"Re-keying existing addresses to AddressNormalizer version {AddressNormalizer.NORMALIZER_VERSION}...")
+    start_time = time.time()
+    raw_connection = alchemy_engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.execute(f"""
+        CREATE TEMP TABLE temp_address_rekey (
+            address_id INT,
+            address_us_id INT,
+            address_international_id INT,
+            address_line_1 TEXT,
+            address_line_2 TEXT,
+            city TEXT,
+            state TEXT,
+            postal_code TEXT,
+            country_code TEXT
+        ) ON COMMIT DROP;
+        """)
+        id_columns = ['address_id', 'address_us_id', 'address_international_id']
+        for chunk_df in pd.read_sql(mapped_addresses_sql, alchemy_engine, chunksize=batch_size):
+            canonical_df = AddressNormalizer.canonicalize_frame(chunk_df)
+            canonical_df[id_columns] = canonical_df[id_columns].astype('Int64')
+            copy_buffer = io.StringIO()
+            canonical_df[id_columns + ADDRESS_COLUMNS].to_csv(copy_buffer, index=False, header=False)
+            copy_buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY temp_address_rekey ({', '.join(id_columns)}, {address_columns}) FROM STDIN WITH (FORMAT csv)",
+                copy_buffer
+            )
+
+        cursor.execute(f"""
+        CREATE TEMP TABLE temp_address_rekey_hashed ON COMMIT DROP AS
+        SELECT
+            rekey.*,
+            MD5(
+                LOWER(
+                    COALESCE(address_line_1, '') ||
+                    COALESCE(address_line_2, '') ||
+                    COALESCE(city, '') ||
+                    COALESCE(state, '') ||
+                    COALESCE(postal_code, '') ||
+                    COALESCE(country_code, '')
+                )
+            ) AS address_hash
+        FROM temp_address_rekey AS rekey;
+        CREATE TEMP TABLE temp_address_rekey_survivor ON COMMIT DROP AS
+        SELECT DISTINCT ON (address_hash) *
+        FROM temp_address_rekey_hashed
+        ORDER BY address_hash, address_id;
+        CREATE TEMP TABLE temp_address_rekey_merged ON COMMIT DROP AS
+        SELECT
+            hashed.address_id,
+            hashed.address_us_id,
+            hashed.address_international_id,
+            survivor.address_id AS survivor_address_id
+        FROM temp_address_rekey_hashed AS hashed
+        JOIN temp_address_rekey_survivor AS survivor ON survivor.address_hash = hashed.address_hash
+        WHERE hashed.address_id != survivor.address_id;
+        """)
+        cursor.execute("SELECT (SELECT COUNT(*) FROM temp_address_rekey), (SELECT COUNT(*) FROM temp_address_rekey_survivor)")
+        addresses_before, addresses_after = cursor.fetchone()
+
+        # Hashes are cleared first: a survivor's new hash can equal another row's old one
+        cursor.execute(f"""
+        UPDATE {address_us_DBTable} SET address_hash = NULL
+        WHERE id IN (SELECT address_us_id FROM temp_address_rekey);
+        UPDATE {address_intl_DBTable} SET address_hash = NULL
+        WHERE id IN (SELECT address_international_id FROM temp_address_rekey);
+        UPDATE {address_us_DBTable} AS us
+        SET
+            delivery_line_1 = survivor.address_line_1,
+            delivery_line_2 = survivor.address_line_2,
+            city_name = survivor.city,
+            state_abbreviation = survivor.state,
+            zipcode = survivor.postal_code,
+            address_hash = survivor.address_hash
+        FROM temp_address_rekey_survivor AS survivor
+        WHERE us.id = survivor.address_us_id;
+        UPDATE {address_intl_DBTable} AS intl
+        SET
+            address1 = survivor.address_line_1,
+            address2 = survivor.address_line_2,
+            locality = survivor.city,
+            administrative_area = survivor.state,
+            postal_code = survivor.postal_code,
+            country = survivor.country_code,
+            address_hash = survivor.address_hash
+        FROM temp_address_rekey_survivor AS survivor
+        WHERE intl.id = survivor.address_international_id;
+        TRUNCATE {import_map_DBTable};
+        INSERT INTO {import_map_DBTable} (address_hash, address_id)
+        SELECT address_hash, address_id
+        FROM temp_address_rekey_survivor;
+        """)
+        # Links move to the survivor before the merged-away rows are deleted, dropping any that become duplicates
+        cursor.execute(f"""
+        UPDATE {npi_address_DBTable} AS na
+        SET address_id = merged.survivor_address_id
+        FROM temp_address_rekey_merged AS merged
+        WHERE na.address_id = merged.address_id;
+        DELETE FROM {npi_address_DBTable} AS na
+        USING {npi_address_DBTable} AS kept
+        WHERE na.address_id IN (SELECT survivor_address_id FROM temp_address_rekey_merged)
+        AND kept.npi_id = na.npi_id
+        AND kept.address_type_id = na.address_type_id
+        AND kept.address_id = na.address_id
+        AND kept.id < na.id;
+        DELETE FROM {address_DBTable}
+        WHERE id IN (SELECT address_id FROM temp_address_rekey_merged);
+        DELETE FROM {address_us_DBTable}
+        WHERE id IN (SELECT address_us_id FROM temp_address_rekey_merged);
+        DELETE FROM {address_intl_DBTable}
+        WHERE id IN (SELECT address_international_id FROM temp_address_rekey_merged);
+        """)
+        raw_connection.commit()
+    finally:
+        raw_connection.close()
+
+    total_seconds = time.time() - start_time
+    print(f"Re-keyed {addresses_before:,} addresses into {addresses_after:,} canonical addresses "
+          f"({addresses_before - addresses_after:,} merged) in {total_seconds:.2f} seconds")
 
 def main():
     """
@@ -19,6 +282,14 @@ def main():
     """
     # Set to True to preview SQL statements without executing them
     is_just_print = False
+    # Record each statement's EXPLAIN (ANALYZE, BUFFERS) plan in intake.sql_step_timing along with its timing
+    is_explain_analyze = False
+    # Only re-extract addresses for NPIs whose row_hash changed since the last run
+    is_incremental = True
+    # Canonicalize addresses with AddressNormalizer before they are deduplicated by hash
+    is_canonicalize_addresses = True
+    # Number of raw addresses canonicalized and written back per COPY round trip
+    batch_size = 100000
 
     print("Connecting to the database...")
     base_path = os.path.dirname(os.path.abspath(__file__))
@@ -39,6 +310,56 @@ def main():
     raw_import_DBTable = DBTable(schema='intake', table='raw_address_import')
     import_map_DBTable = DBTable(schema='intake', table='raw_address_import_map')
     not_mapped_DBTable = DBTable(schema='intake', table='address_not_mapped')
+    address_snapshot_DBTable = DBTable(schema='intake', table='address_npi_row_hash_snapshot')
+    changed_npi_DBTable = DBTable(schema='intake', table='address_changed_npi')
+    secondary_digest_DBTable = DBTable(schema='intake', table='address_secondary_digest')
+    canonical_DBTable = DBTable(schema='intake', table='raw_address_canonical')
+    map_version_DBTable = DBTable(schema='intake', table='raw_address_import_map_version')
+
+    # The hashes in raw_address_import_map are canonical hashes of this normalizer version, or 'raw'
+    map_key_version = AddressNormalizer.NORMALIZER_VERSION if is_canonicalize_addresses else 'raw'
+    is_rekey_needed = False
+    if is_canonicalize_addresses and not is_just_print:
+        with alchemy_engine.connect() as conn:
+            has_mapped_addresses = conn.execute(sqlalchemy.text(
+                "SELECT to_regclass(:table_name) IS NOT NULL"
+            ), {'table_name': str(import_map_DBTable)}).scalar()
+            if has_mapped_addresses:
+                has_mapped_addresses = conn.execute(sqlalchemy.text(
+                    f"SELECT EXISTS (SELECT 1 FROM {import_map_DBTable})"
+                )).scalar()
+            recorded_version = None
+            if conn.execute(sqlalchemy.text(
+                "SELECT to_regclass(:table_name) IS NOT NULL"
+            ), {'table_name': str(map_version_DBTable)}).scalar():
+                recorded_version = conn.execute(sqlalchemy.text(
+                    f"SELECT key_version FROM {map_version_DBTable}"
+                )).scalar()
+        if has_mapped_addresses and recorded_version != map_key_version:
+            print(f"Address map was keyed with version {recorded_version or 'raw'}, re-keying to "
+                  f"{map_key_version} and rebuilding every link")
+            is_rekey_needed = True
+            is_incremental = False
+
+    if is_incremental and not is_just_print:
+        # With no snapshot yet every NPI counts as changed, which is the same as a full run
+        with alchemy_engine.connect() as conn:
+            snapshot_exists = conn.execute(sqlalchemy.text(
+                "SELECT to_regclass(:table_name) IS NOT NULL"
+            ), {'table_name': str(address_snapshot_DBTable)}).scalar()
+            if snapshot_exists:
+                snapshot_exists = conn.execute(sqlalchemy.text(
+                    f"SELECT EXISTS (SELECT 1 FROM {address_snapshot_DBTable})"
+                )).scalar()
+        if not snapshot_exists:
+            print("No address snapshot from a previous run, running a full import")
+            is_incremental = False
+
+    if is_incremental:
+        print("Incremental mode: extracting addresses only for NPIs whose row_hash or endpoint/pl addresses changed")
+        changed_npi_filter = f"AND npi::BIGINT IN (SELECT npi FROM {changed_npi_DBTable})"
+    else:
+        changed_npi_filter = ""
 
     sql = FrostDict()
 
@@ -49,6 +370,119 @@ def main():
     );
     """
 
+    sql['create_canonical_address_table'] = f"""
+    -- The AddressNormalizer form of every raw address, keyed by the hash of the raw spelling and the
+    -- normalizer version. A cache from before the version column existed is dropped and rebuilt.
+    DO $$
+    BEGIN
+        IF to_regclass('{canonical_DBTable}') IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = to_regclass('{canonical_DBTable}') AND attname = 'normalizer_version'
+        ) THEN
+            DROP TABLE {canonical_DBTable};
+        END IF;
+    END $$;
+    CREATE TABLE IF NOT EXISTS {canonical_DBTable} (
+        raw_address_hash VARCHAR(32) NOT NULL,
+        normalizer_version VARCHAR(20) NOT NULL,
+        address_line_1 TEXT,
+        address_line_2 TEXT,
+        city TEXT,
+        state TEXT,
+        postal_code TEXT,
+        country_code TEXT,
+        PRIMARY KEY (raw_address_hash, normalizer_version)
+    );
+    DELETE FROM {canonical_DBTable}
+    WHERE normalizer_version != '{AddressNormalizer.NORMALIZER_VERSION}';
+    """
+
+    sql['create_map_version_table'] = f"""
+    -- Which hashes raw_address_import_map holds: an AddressNormalizer version, or 'raw'
+    CREATE TABLE IF NOT EXISTS {map_version_DBTable} (
+        key_version VARCHAR(20) NOT NULL
+    );
+    """
+
+    sql['create_address_snapshot_table'] = f"""
+    -- The main_file row_hash and endpoint/pl address digest of every NPI as of the last Step50 run.
+    -- Snapshots from before the digest existed get a NULL digest, so NPIs with endpoint or pl
+    -- addresses count as changed once.
+    CREATE TABLE IF NOT EXISTS {address_snapshot_DBTable} (
+        npi BIGINT PRIMARY KEY,
+        row_hash VARCHAR(32) NOT NULL
+    );
+    ALTER TABLE {address_snapshot_DBTable} ADD COLUMN IF NOT EXISTS secondary_digest VARCHAR(32);
+    """
+
+    sql['digest_secondary_addresses'] = f"""
+    -- Affiliation (endpoint) and secondary practice (pl_file) addresses are not covered by the
+    -- main_file row_hash, so each NPI's set of them is digested separately
+    DROP TABLE IF EXISTS {secondary_digest_DBTable};
+    CREATE TABLE {secondary_digest_DBTable} AS
+    SELECT
+        npi::BIGINT AS npi,
+        MD5(STRING_AGG(address_text, '|' ORDER BY address_text)) AS secondary_digest
+    FROM (
+        SELECT
+            npi,
+            '3^' || COALESCE(affiliation_address_line_1, '') || '^' || COALESCE(affiliation_address_line_2, '') || '^' ||
+            COALESCE(affiliation_address_city, '') || '^' || COALESCE(affiliation_address_state, '') || '^' ||
+            COALESCE(affiliation_address_postal_code, '') || '^' || COALESCE(affiliation_address_country, '') AS address_text
+        FROM {nppes_endpoint_DBTable}
+        WHERE affiliation_address_line_1 IS NOT NULL
+        UNION ALL
+        SELECT
+            npi,
+            '4^' || COALESCE(provider_secondary_practice_address_address_line_1, '') || '^' ||
+            COALESCE(provider_secondary_practice_address_address_line_2, '') || '^' ||
+            COALESCE(provider_secondary_practice_address_city_name, '') || '^' ||
+            COALESCE(provider_secondary_practice_address_state_name, '') || '^' ||
+            COALESCE(provider_secondary_practice_address_postal_code, '') || '^' ||
+            COALESCE(provider_secondary_practice_address_country_code, '') AS address_text
+        FROM {nppes_pl_DBTable}
+        WHERE provider_secondary_practice_address_address_line_1 IS NOT NULL
+    ) AS secondary_address
+    GROUP BY npi::BIGINT;
+    ALTER TABLE {secondary_digest_DBTable} ADD PRIMARY KEY (npi);
+    ANALYZE {secondary_digest_DBTable};
+    """
+
+    if is_incremental:
+        sql['identify_changed_npis'] = f"""
+        DROP TABLE IF EXISTS {changed_npi_DBTable};
+        CREATE TABLE {changed_npi_DBTable} AS
+        SELECT main.npi::BIGINT AS npi
+        FROM {nppes_main_DBTable} AS main
+        LEFT JOIN {address_snapshot_DBTable} AS snapshot
+            ON snapshot.npi = main.npi::BIGINT
+        LEFT JOIN {secondary_digest_DBTable} AS digest
+            ON digest.npi = main.npi::BIGINT
+        WHERE snapshot.npi IS NULL
+            OR main.row_hash IS NULL
+            OR snapshot.row_hash <> main.row_hash
+            OR snapshot.secondary_digest IS DISTINCT FROM digest.secondary_digest
+        UNION
+        -- NPIs with endpoint or pl addresses but no main_file row are never in the snapshot
+        SELECT digest.npi
+        FROM {secondary_digest_DBTable} AS digest
+        LEFT JOIN {address_snapshot_DBTable} AS snapshot
+            ON snapshot.npi = digest.npi
+        WHERE snapshot.npi IS NULL
+        UNION
+        SELECT snapshot.npi
+        FROM {address_snapshot_DBTable} AS snapshot
+        LEFT JOIN {nppes_main_DBTable} AS main
+            ON main.npi::BIGINT = snapshot.npi
+        WHERE main.npi IS NULL;
+        ALTER TABLE {changed_npi_DBTable} ADD PRIMARY KEY (npi);
+        ANALYZE {changed_npi_DBTable};
+        """
+
+        sql['create_npi_address_npi_index'] = f"""
+        CREATE INDEX IF NOT EXISTS idx_npi_address_npi_id ON {npi_address_DBTable}(npi_id);
+        """
+
     sql['aggregate_raw_addresses'] = f"""
     DROP TABLE IF EXISTS {raw_import_DBTable};
     CREATE TABLE {raw_import_DBTable} AS
@@ -75,6 +509,7 @@ def main():
         {nppes_main_DBTable}
     WHERE
         provider_first_line_business_mailing_address IS NOT NULL
+        {changed_npi_filter}
 
     UNION ALL
 
@@ -101,6 +536,7 @@ def main():
         {nppes_main_DBTable}
     WHERE
         provider_first_line_business_practice_location_address IS NOT NULL
+        {changed_npi_filter}
 
     UNION ALL
 
@@ -127,6 +563,7 @@ def main():
         {nppes_endpoint_DBTable}
     WHERE
         affiliation_address_line_1 IS NOT NULL
+        {changed_npi_filter}
 
     UNION ALL
 
@@ -152,13 +589,43 @@ def main():
     FROM
         {nppes_pl_DBTable}
     WHERE
-        provider_secondary_practice_address_address_line_1 IS NOT NULL;
+        provider_secondary_practice_address_address_line_1 IS NOT NULL
+        {changed_npi_filter};
+    """
+
+    sql['add_address_hash_columns'] = f"""
+    -- address_us and address_international carry the import hash, so new rows are matched
+    -- to the map by one indexed VARCHAR(32) column instead of five or six COALESCEd text columns
+    ALTER TABLE {address_us_DBTable} ADD COLUMN IF NOT EXISTS address_hash VARCHAR(32);
+    ALTER TABLE {address_intl_DBTable} ADD COLUMN IF NOT EXISTS address_hash VARCHAR(32);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_address_us_address_hash
+    ON {address_us_DBTable}(address_hash);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_address_international_address_hash
+    ON {address_intl_DBTable}(address_hash);
+    """
+
+    sql['backfill_address_hashes'] = f"""
+    -- Rows imported before the hash columns existed get their hash from the import map.
+    -- After the first backfill this finds nothing to update.
+    UPDATE {address_us_DBTable} AS us
+    SET address_hash = map.address_hash
+    FROM {import_map_DBTable} AS map
+    JOIN {address_DBTable} AS a ON a.id = map.address_id
+    WHERE a.address_us_id = us.id
+        AND us.address_hash IS NULL;
+    UPDATE {address_intl_DBTable} AS intl
+    SET address_hash = map.address_hash
+    FROM {import_map_DBTable} AS map
+    JOIN {address_DBTable} AS a ON a.id = map.address_id
+    WHERE a.address_international_id = intl.id
+        AND intl.address_hash IS NULL;
     """
 
     sql['identify_unmapped_addresses'] = f"""
+    -- One row per hash: spellings that differ only in case share a hash and become one address
     DROP TABLE IF EXISTS {not_mapped_DBTable};
     CREATE TABLE {not_mapped_DBTable} AS
-    SELECT DISTINCT
+    SELECT DISTINCT ON (t1.address_hash)
         t1.address_line_1,
         t1.address_line_2,
         t1.city,
@@ -173,148 +640,190 @@ def main():
     ON
         t1.address_hash = t2.address_hash
     WHERE
-        t2.address_id IS NULL;
+        t2.address_id IS NULL
+    ORDER BY
+        t1.address_hash;
     """
 
-    sql['insert_us_addresses'] = f"""
-    INSERT INTO {address_us_DBTable} (
-        delivery_line_1,
-        delivery_line_2,
-        city_name,
-        state_abbreviation,
-        zipcode
-    )
-    SELECT
-        address_line_1,
-        address_line_2,
-        city,
-        state,
-        postal_code
-    FROM
-        {not_mapped_DBTable}
-    WHERE
-        country_code IS NULL OR country_code = '' OR country_code = 'US';
-    """
-
-    sql['insert_international_addresses'] = f"""
-    INSERT INTO {address_intl_DBTable} (
-        address1,
-        address2,
-        locality,
-        administrative_area,
-        postal_code,
-        country
+    sql['insert_us_addresses_and_map'] = f"""
+    -- The new address_us rows, their ndh.address rows and their map entries all come from
+    -- RETURNING, so nothing is joined back on the address text
+    WITH new_us AS (
+        INSERT INTO {address_us_DBTable} (
+            delivery_line_1,
+            delivery_line_2,
+            city_name,
+            state_abbreviation,
+            zipcode,
+            address_hash
+        )
+        SELECT
+            address_line_1,
+            address_line_2,
+            city,
+            state,
+            postal_code,
+            address_hash
+        FROM
+            {not_mapped_DBTable}
+        WHERE
+            country_code IS NULL OR country_code = '' OR country_code = 'US'
+        RETURNING id, address_hash
+    ),
+    new_address AS (
+        INSERT INTO {address_DBTable} (address_us_id)
+        SELECT id FROM new_us
+        RETURNING id, address_us_id
     )
-    SELECT
-        address_line_1,
-        address_line_2,
-        city,
-        state,
-        postal_code,
-        country_code
-    FROM
-        {not_mapped_DBTable}
-    WHERE
-        country_code IS NOT NULL AND country_code != '' AND country_code != 'US';
-    """
-
-    sql['populate_main_address_table_us'] = f"""
-    INSERT INTO {address_DBTable} (address_us_id)
-    SELECT us.id
-    FROM {address_us_DBTable} AS us
-    JOIN {not_mapped_DBTable} AS nm
-        ON us.delivery_line_1 = nm.address_line_1
-        AND COALESCE(us.delivery_line_2, '') = COALESCE(nm.address_line_2, '')
-        AND us.city_name = nm.city
-        AND us.state_abbreviation = nm.state
-        AND us.zipcode = nm.postal_code
-    LEFT JOIN {address_DBTable} a ON a.address_us_id = us.id
-    WHERE (nm.country_code IS NULL OR nm.country_code = '' OR nm.country_code = 'US')
-    AND a.id IS NULL;
-    """
-
-    sql['populate_main_address_table_intl'] = f"""
-    INSERT INTO {address_DBTable} (address_international_id)
-    SELECT intl.id
-    FROM {address_intl_DBTable} AS intl
-    JOIN {not_mapped_DBTable} AS nm
-        ON intl.address1 = nm.address_line_1
-        AND COALESCE(intl.address2, '') = COALESCE(nm.address_line_2, '')
-        AND intl.locality = nm.city
-        AND intl.administrative_area = nm.state
-        AND intl.postal_code = nm.postal_code
-        AND intl.country = nm.country_code
-    LEFT JOIN {address_DBTable} a ON a.address_international_id = intl.id
-    WHERE (nm.country_code IS NOT NULL AND nm.country_code != '' AND nm.country_code != 'US')
-    AND a.id IS NULL;
+    INSERT INTO {import_map_DBTable} (address_hash, address_id)
+    SELECT new_us.address_hash, new_address.id
+    FROM new_address
+    JOIN new_us ON new_us.id = new_address.address_us_id
+    ON CONFLICT (address_hash) DO NOTHING;
     """
 
-    sql['update_import_map'] = f"""
-    INSERT INTO {import_map_DBTable} (address_hash, address_id)
-    WITH us_addresses AS (
+    sql['insert_international_addresses_and_map'] = f"""
+    WITH new_intl AS (
+        INSERT INTO {address_intl_DBTable} (
+            address1,
+            address2,
+            locality,
+            administrative_area,
+            postal_code,
+            country,
+            address_hash
+        )
         SELECT
-            nm.address_hash,
-            a.id AS address_id
-        FROM {not_mapped_DBTable} nm
-        JOIN {address_us_DBTable} us
-            ON nm.address_line_1 = us.delivery_line_1
-            AND COALESCE(nm.address_line_2, '') = COALESCE(us.delivery_line_2, '')
-            AND nm.city = us.city_name
-            AND nm.state = us.state_abbreviation
-            AND nm.postal_code = us.zipcode
-        JOIN {address_DBTable} a ON a.address_us_id = us.id
-        WHERE nm.country_code IS NULL OR nm.country_code = '' OR nm.country_code = 'US'
+            address_line_1,
+            address_line_2,
+            city,
+            state,
+            postal_code,
+            country_code,
+            address_hash
+        FROM
+            {not_mapped_DBTable}
+        WHERE
+            country_code IS NOT NULL AND country_code != '' AND country_code != 'US'
+        RETURNING id, address_hash
     ),
-    intl_addresses AS (
-        SELECT
-            nm.address_hash,
-            a.id AS address_id
-        FROM {not_mapped_DBTable} nm
-        JOIN {address_intl_DBTable} intl
-            ON nm.address_line_1 = intl.address1
-            AND COALESCE(nm.address_line_2, '') = COALESCE(intl.address2, '')
-            AND nm.city = intl.locality
-            AND nm.state = intl.administrative_area
-            AND nm.postal_code = intl.postal_code
-            AND nm.country_code = intl.country
-        JOIN {address_DBTable} a ON a.address_international_id = intl.id
-        WHERE nm.country_code IS NOT NULL AND nm.country_code != '' AND nm.country_code != 'US'
+    new_address AS (
+        INSERT INTO {address_DBTable} (address_international_id)
+        SELECT id FROM new_intl
+        RETURNING id, address_international_id
     )
-    SELECT address_hash, address_id FROM us_addresses
-    UNION ALL
-    SELECT address_hash, address_id FROM intl_addresses
+    INSERT INTO {import_map_DBTable} (address_hash, address_id)
+    SELECT new_intl.address_hash, new_address.id
+    FROM new_address
+    JOIN new_intl ON new_intl.id = new_address.address_international_id
     ON CONFLICT (address_hash) DO NOTHING;
     """
 
-    sql['truncate_npi_address_link'] = f"""
-    TRUNCATE TABLE {npi_address_DBTable};
-    """
+    if is_incremental:
+        sql['delete_stale_npi_address_links'] = f"""
+        -- Links of changed NPIs that the new extract no longer has
+        DELETE FROM {npi_address_DBTable} AS na
+        WHERE na.npi_id IN (SELECT npi FROM {changed_npi_DBTable})
+        AND NOT EXISTS (
+            SELECT 1
+            FROM {raw_import_DBTable} AS t1
+            JOIN {import_map_DBTable} AS t2
+                ON t1.address_hash = t2.address_hash
+            WHERE t1.npi::BIGINT = na.npi_id
+                AND t1.address_type_id = na.address_type_id
+                AND t2.address_id = na.address_id
+        );
+        """
 
-    sql['link_npi_to_address'] = f"""
-    INSERT INTO {npi_address_DBTable} (npi_id, address_type_id, address_id)
-    SELECT DISTINCT
-        t1.npi::BIGINT,
-        t1.address_type_id,
-        t2.address_id
-    FROM
-        {raw_import_DBTable} AS t1
-    JOIN
-        {import_map_DBTable} AS t2
-    ON
-        t1.address_hash = t2.address_hash;
+        sql['insert_new_npi_address_links'] = f"""
+        INSERT INTO {npi_address_DBTable} (npi_id, address_type_id, address_id)
+        SELECT DISTINCT
+            t1.npi::BIGINT,
+            t1.address_type_id,
+            t2.address_id
+        FROM
+            {raw_import_DBTable} AS t1
+        JOIN
+            {import_map_DBTable} AS t2
+        ON
+            t1.address_hash = t2.address_hash
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM {npi_address_DBTable} AS na
+            WHERE na.npi_id = t1.npi::BIGINT
+                AND na.address_type_id = t1.address_type_id
+                AND na.address_id = t2.address_id
+        );
+        """
+
+        sql['refresh_address_snapshot'] = f"""
+        DELETE FROM {address_snapshot_DBTable}
+        WHERE npi IN (SELECT npi FROM {changed_npi_DBTable});
+        INSERT INTO {address_snapshot_DBTable} (npi, row_hash, secondary_digest)
+        SELECT main.npi::BIGINT, main.row_hash, digest.secondary_digest
+        FROM {nppes_main_DBTable} AS main
+        JOIN {changed_npi_DBTable} AS changed
+            ON changed.npi = main.npi::BIGINT
+        LEFT JOIN {secondary_digest_DBTable} AS digest
+            ON digest.npi = main.npi::BIGINT
+        WHERE main.row_hash IS NOT NULL;
+        """
+    else:
+        sql['truncate_npi_address_link'] = f"""
+        TRUNCATE TABLE {npi_address_DBTable};
+        """
+
+        sql['link_npi_to_address'] = f"""
+        INSERT INTO {npi_address_DBTable} (npi_id, address_type_id, address_id)
+        SELECT DISTINCT
+            t1.npi::BIGINT,
+            t1.address_type_id,
+            t2.address_id
+        FROM
+            {raw_import_DBTable} AS t1
+        JOIN
+            {import_map_DBTable} AS t2
+        ON
+            t1.address_hash = t2.address_hash;
+        """
+
+        sql['refresh_address_snapshot'] = f"""
+        -- Rows without a row_hash are left out, so they count as changed next time
+        TRUNCATE {address_snapshot_DBTable};
+        INSERT INTO {address_snapshot_DBTable} (npi, row_hash, secondary_digest)
+        SELECT main.npi::BIGINT, main.row_hash, digest.secondary_digest
+        FROM {nppes_main_DBTable} AS main
+        LEFT JOIN {secondary_digest_DBTable} AS digest
+            ON digest.npi = main.npi::BIGINT
+        WHERE main.row_hash IS NOT NULL;
+        """
+
+    sql['record_map_key_version'] = f"""
+    DELETE FROM {map_version_DBTable};
+    INSERT INTO {map_version_DBTable} (key_version) VALUES ('{map_key_version}');
     """
 
     sql['cleanup_temp_tables'] = f"""
     DROP TABLE IF EXISTS {raw_import_DBTable};
     DROP TABLE IF EXISTS {not_mapped_DBTable};
+    DROP TABLE IF EXISTS {changed_npi_DBTable};
+    DROP TABLE IF EXISTS {secondary_digest_DBTable};
     """
 
+    # The raw extract is canonicalized in Python before the unmapped addresses are picked out
+    extract_steps = SQLPlanRunner.steps_before(sql, 'identify_unmapped_addresses')
+    load_steps = [key for key in sql if key not in extract_steps]
+
     print("Executing SQL pipeline...")
-    SQLoopcicle.run_sql_loop(
-        sql_dict=sql,
-        is_just_print=is_just_print,
-        engine=alchemy_engine
-    )
+    SQLPlanRunner.run_steps(sql, alchemy_engine, is_just_print, only_steps=extract_steps,
+                            timing_script='Step50', is_explain_analyze=is_explain_analyze)
+    if is_rekey_needed:
+        rekey_existing_addresses(alchemy_engine, address_DBTable, address_us_DBTable, address_intl_DBTable,
+                                 npi_address_DBTable, import_map_DBTable, batch_size)
+    if is_canonicalize_addresses and not is_just_print:
+        canonicalize_raw_addresses(alchemy_engine, raw_import_DBTable, canonical_DBTable, batch_size)
+    SQLPlanRunner.run_steps(sql, alchemy_engine, is_just_print, only_steps=load_steps,
+                            timing_script='Step50', is_explain_analyze=is_explain_analyze)
     print("Pipeline finished.")
 
 if __name__ == "__main__":
@@ -21,6 +21,12 @@ except ImportError:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
     from csviper.import_executor import ImportExecutor
 
+# ParallelCSVLoader lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from ParallelCSVLoader import ParallelCSVLoader
+
+CREATE_TABLE_SQL_FILE = 'pl_pfile_20050523-20250608.create_table_postgres.sql'
+
 
 @click.command()
 @click.option('--env_file_location', type=click.Path(),
@@ -35,7 +41,9 @@ except ImportError:
               help='Overwrite existing table data')
 @click.option('--import_only_lines', type=int, default=None,
               help='Limit import to a specific number of lines for testing (positive integer).')
-def main(env_file_location, csv_file, db_schema_name, table_name, trample, import_only_lines):
+@click.option('--typed_load', is_flag=True, default=False,
+              help='Create the table with the column_types from the metadata JSON (BIGINT npi) via a typed staging path, so Step05 has nothing to rewrite.')
+def main(env_file_location, csv_file, db_schema_name, table_name, trample, import_only_lines, typed_load):
     """
     Import CSV data into PostgreSQL database using pre-generated SQL scripts.
     Import CSV data into PostgreSQL database using pre-generated SQL scripts.
@@ -47,6 +55,10 @@ def main(env_file_location, csv_file, db_schema_name, table_name, trample, impor
         if import_only_lines is not None:
             if not isinstance(import_only_lines, int) or import_only_lines <= 0:
                 raise click.BadParameter('Value must be a whole positive number.', param_hint='--import_only_lines')
+        if typed_load and import_only_lines is not None:
+            raise click.BadParameter('Only supported by the single-stream import, drop --typed_load.', param_hint='--import_only_lines')
+        if typed_load and not trample:
+            raise click.BadParameter('The typed load always recreates the table, so it needs --trample.', param_hint='--typed_load')
 
         # Load and validate configuration
         try:
@@ -96,17 +108,35 @@ def main(env_file_location, csv_file, db_schema_name, table_name, trample, impor
         if trample:
             click.echo("Warning: --trample flag is set. Existing table data will be overwritten.")
         
-        # Execute PostgreSQL import using the shared executor
-        ImportExecutor.execute_postgresql_import(
-            db_config=db_config,
-            db_schema_name=db_schema_name,
-            table_name=table_name,
-            csv_file=csv_file,
-            trample=trample,
-            create_table_sql_file='pl_pfile_20050523-20250608.create_table_postgres.sql',
-            encoding=encoding,
-            import_only_lines=import_only_lines
-        )
+        if typed_load:
+            # Load into a VARCHAR staging table, then write the final table once with the metadata column_types
+            column_types = metadata.get('column_types')
+            if not column_types:
+                raise click.BadParameter('The metadata JSON has no column_types entry.', param_hint='--typed_load')
+            ParallelCSVLoader.execute_typed_import(
+                db_config=db_config,
+                db_schema_name=db_schema_name,
+                table_name=table_name,
+                csv_file=csv_file,
+                create_table_sql_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), CREATE_TABLE_SQL_FILE),
+                column_names=metadata['normalized_column_names'],
+                column_types=column_types,
+                encoding=encoding,
+                delimiter=metadata.get('delimiter', ','),
+                quote_char=metadata.get('quote_character', '"')
+            )
+        else:
+            # Execute PostgreSQL import using the shared executor
+            ImportExecutor.execute_postgresql_import(
+                db_config=db_config,
+                db_schema_name=db_schema_name,
+                table_name=table_name,
+                csv_file=csv_file,
+                trample=trample,
+                create_table_sql_file=CREATE_TABLE_SQL_FILE,
+                encoding=encoding,
+                import_only_lines=import_only_lines
+            )
         
         click.echo("✓ PostgreSQL import completed successfully!")
         
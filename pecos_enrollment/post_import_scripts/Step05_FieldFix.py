@@ -10,6 +10,11 @@ import pandas as pd
 import sqlalchemy
 from pathlib import Path
 import os
+import sys
+
+# ColumnTypeConverter lives at the repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from ColumnTypeConverter import ColumnTypeConverter
 
 def main():
 
@@ -27,33 +32,10 @@ def main():
 
     sql = FrostDict()
 
-    # Convert the NPI field from VARCHAR(11) to BIGINT
-    print(f"Converting NPI field from VARCHAR to BIGINT in {pecos_DBTable}")
-
-    sql['drop the new_npi column if exists from previous run'] = f"""
-ALTER TABLE {pecos_DBTable}
-DROP COLUMN IF EXISTS new_npi;
-"""
-
-    sql['create new_npi column'] = f"""
-ALTER TABLE {pecos_DBTable}
-ADD COLUMN new_npi BIGINT;        
-    """
-
-    sql['populate the bigint version from the varchar version'] = f"""
-UPDATE {pecos_DBTable}
-SET new_npi = "npi"::BIGINT;
-""" 
- 
-    sql['drop the varchar column'] = f"""
-ALTER TABLE {pecos_DBTable}
-DROP COLUMN "npi";
-"""
-
-    sql['rename new column'] = f"""
-ALTER TABLE {pecos_DBTable}
-RENAME COLUMN new_npi TO "npi";
-"""
+    # Convert the NPI field from VARCHAR to BIGINT with a single ALTER TABLE ... USING.
+    # ColumnTypeConverter skips the conversion when npi is already BIGINT, e.g. after a --typed_load import.
+    size_before_bytes = ColumnTypeConverter.get_table_size_bytes(alchemy_engine, pecos_DBTable)
+    ColumnTypeConverter.add_conversion_sql(sql, alchemy_engine, pecos_DBTable, {'npi': {'type': 'BIGINT'}})
 
     # Add index on npi column to improve performance
     sql['add index on npi column'] = f"""
@@ -66,6 +48,8 @@ CREATE INDEX idx_npi ON {pecos_DBTable} ("npi");
                                 engine=alchemy_engine
     )
 
+    ColumnTypeConverter.report_table_size(alchemy_engine, pecos_DBTable, size_before_bytes)
+
     print("✅ PECOS NPI field conversion completed successfully")
 
 if __name__ == "__main__":
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Report redundant and unused indexes
+Lists prefix-redundant, unique-covered and never-scanned indexes in the ndh, intake and nppes_raw schemas
+with their sizes and write cost, and writes the suggested DROP INDEX statements to a file for review.
+Nothing is dropped by this script.
+
+Usage: python report_redundant_indexes.py --output suggested_index_drops.sql
+"""
+
+import argparse
+import os
+
+from IndexAnalyzer import IndexAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report redundant and unused indexes')
+    parser.add_argument('--schemas', nargs='+', default=['ndh', 'intake', 'nppes_raw'], help='Schemas to analyze')
+    parser.add_argument('--output', default='suggested_index_drops.sql', help='File for the suggested DROP INDEX statements')
+    parser.add_argument('--include_unused', action='store_true',
+                        help='Also suggest dropping indexes that were never scanned (only meaningful after a full month of use)')
+    args = parser.parse_args()
+
+    from plainerflow import CredentialFinder  # type: ignore
+    env_location = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+    alchemy_engine = CredentialFinder.detect_config(verbose=True, env_path=env_location)
+
+    indexes = IndexAnalyzer.fetch_indexes(alchemy_engine, args.schemas)
+    stats_reset = IndexAnalyzer.fetch_stats_reset(alchemy_engine)
+    print(f"Analyzing {len(indexes)} indexes in {', '.join(args.schemas)} "
+          f"(usage counted since {stats_reset or 'the statistics were first collected'})")
+
+    prefix_redundant = IndexAnalyzer.find_prefix_redundant(indexes)
+    unique_covered = IndexAnalyzer.find_unique_covered(indexes)
+    unused = IndexAnalyzer.find_unused(indexes)
+
+    for title, findings in [('Prefix-redundant indexes', prefix_redundant),
+                            ('Indexes whose leading columns are already unique', unique_covered),
+                            ('Never-scanned indexes', unused)]:
+        print("\n" + "=" * 60)
+        print(f"{title}: {len(findings)}")
+        print("=" * 60)
+        for finding in findings:
+            index = finding['index']
+            print(f"{IndexAnalyzer.qualified_name(index):<60} {index['index_bytes'] / 1024 / 1024:>10.1f} MB "
+                  f"{index['idx_scan']:>12,} scans  {finding['reason']}")
+
+    drops = IndexAnalyzer.suggested_drops(prefix_redundant, unique_covered, *([unused] if args.include_unused else []))
+    print("\n" + "=" * 60)
+    print("Write amplification per table (index entries written per row insert or non-HOT update)")
+    print("=" * 60)
+    for table in IndexAnalyzer.write_amplification(indexes, drops):
+        print(f"{table['table']:<50} {table['index_count']} -> {table['index_count_after']} indexes, "
+              f"{table['index_writes_saved']:,} of {table['index_writes']:,} index writes avoided")
+
+    reclaimed_bytes = sum(drop['index']['index_bytes'] for drop in drops)
+    with open(args.output, 'w') as f:
+        f.write("-- Suggested index drops from report_redundant_indexes.py; review before running\n\n")
+        f.write("\n\n".join(IndexAnalyzer.drop_statements(drops)) + "\n")
+    print(f"\nWrote {len(drops)} suggested drops ({reclaimed_bytes / 1024 / 1024:,.1f} MB) to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        exit(main())
+    except Exception as e:
+        print(f"\n❌ Index report failed with error: {e}")
+        print("\nMake sure you have installed the required dependencies:")
+        print("pip install plainerflow sqlalchemy psycopg2-binary")
+        raise
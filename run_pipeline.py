@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Run the import pipeline
+Runs the imports and post-import steps in pipeline_graph.json, each as soon as the steps writing the
+tables it needs have finished, up to --workers at a time. Steps whose command, input files and upstream
+steps are unchanged since their last successful run are skipped. Each step's output goes to
+local_data/pipeline_logs/{step}.log, and a critical-path timing report is printed at the end.
+
+Usage:
+    python run_pipeline.py --dry_run
+    python run_pipeline.py --workers 4
+    python run_pipeline.py --targets nppes_main_analyze_npi_data --force
+"""
+
+import argparse
+import os
+import time
+
+from PipelineDAG import PipelineDAG
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the import pipeline from its dependency graph')
+    parser.add_argument('--graph', default='pipeline_graph.json', help='Pipeline graph to run')
+    parser.add_argument('--env', default='data_file_locations.env', help='File the graph\'s ${VAR} values come from')
+    parser.add_argument('--workers', type=int, default=4, help='Steps run at the same time')
+    parser.add_argument('--targets', nargs='+', default=None,
+                        help='Run only these steps and the steps they depend on')
+    parser.add_argument('--force', action='store_true', help='Run steps even when their inputs are unchanged')
+    parser.add_argument('--dry_run', action='store_true', help='Print each step and what it waits for')
+    parser.add_argument('--state_dir', default='local_data', help='Where the run state and step logs are kept')
+    args = parser.parse_args()
+
+    from dotenv import dotenv_values  # type: ignore
+    env = {**os.environ, **{key: value for key, value in dotenv_values(args.env).items() if value is not None}}
+    dag = PipelineDAG.load(args.graph, env)
+    step_names = dag.with_ancestors(args.targets) if args.targets else [step['name'] for step in dag.steps]
+
+    missing = dag.missing_variables(step_names)
+    if args.dry_run:
+        for name in step_names:
+            waits_for = sorted(dag.dependencies[name] & set(step_names))
+            print(f"{name}" + (f"  <- {', '.join(waits_for)}" if waits_for else "  (no dependencies)"))
+            print(f"    $ {' '.join(dag.steps_by_name[name]['command'])}")
+            if name in missing:
+                print(f"    ⚠️  unset: {', '.join(missing[name])}")
+        return 0
+    if missing:
+        print(f"❌ Set these in {args.env} before running, or narrow the run with --targets:")
+        for name, variables in missing.items():
+            print(f"- {name}: {', '.join(variables)}")
+        return 1
+
+    print(f"Running {len(step_names)} steps with {args.workers} workers")
+    start_time = time.time()
+    results = dag.run(
+        step_names, workers=args.workers,
+        state_path=os.path.join(args.state_dir, 'pipeline_state.json'),
+        log_dir=os.path.join(args.state_dir, 'pipeline_logs'),
+        is_force=args.force,
+    )
+    print()
+    print(dag.timing_report(results, time.time() - start_time))
+    failed = [name for name, result in results.items() if result['status'] in ('failed', 'blocked')]
+    if failed:
+        print(f"\n❌ {len(failed)} steps failed or were blocked: {', '.join(failed)}")
+        return 1
+    print("\n✓ Pipeline complete")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -75,7 +75,10 @@ CREATE TABLE ndh.address_us (
     lacslink_code VARCHAR(2),
     lacslink_indicator VARCHAR(1),
     suitelink_match VARCHAR(5),
-    enhanced_match VARCHAR(64)
+    enhanced_match VARCHAR(64),
+    
+    -- Import
+    address_hash VARCHAR(32) UNIQUE
 );
 
 -- International address table
@@ -114,7 +117,10 @@ CREATE TABLE ndh.address_international (
     -- Analysis
     verification_status VARCHAR(32),
     address_precision VARCHAR(32),
-    max_address_precision VARCHAR(32)
+    max_address_precision VARCHAR(32),
+    
+    -- Import
+    address_hash VARCHAR(32) UNIQUE
 );
 
 -- Non-standard address table
@@ -11,7 +11,10 @@ CREATE TABLE IF NOT EXISTS intake.npi_processing_run (
     updated_npis INTEGER,
     deactivated_npis INTEGER,
     processing_status VARCHAR(50) DEFAULT 'IN_PROGRESS',
-    notes TEXT
+    notes TEXT,
+    phase_row_counts JSONB DEFAULT '{}'::JSONB,
+    step_checkpoints JSONB DEFAULT '{}'::JSONB,
+    last_completed_step VARCHAR(100)
 );
 
 -- Track individual NPI changes detected during processing
@@ -19,7 +22,7 @@ CREATE TABLE IF NOT EXISTS intake.npi_change_log (
     id SERIAL PRIMARY KEY,
     processing_run_id INTEGER REFERENCES intake.npi_processing_run(id),
     npi BIGINT NOT NULL,
-    change_type VARCHAR(50) NOT NULL, -- 'NEW', 'UPDATED', 'DEACTIVATED', 'REACTIVATED'
+    change_type VARCHAR(50) NOT NULL, -- 'NEW', 'UPDATED', 'DEACTIVATED', 'REACTIVATED', 'REMOVED'
     change_detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     old_last_update_date DATE,
     new_last_update_date DATE,
@@ -52,6 +55,25 @@ CREATE TABLE IF NOT EXISTS intake.parent_relationship_change_log (
     processed BOOLEAN DEFAULT FALSE
 );
 
+-- The (npi, row_hash) pairs from the last completed run, diffed against the next NPPES file
+CREATE TABLE IF NOT EXISTS intake.npi_row_hash_snapshot (
+    npi BIGINT PRIMARY KEY,
+    row_hash VARCHAR(32) NOT NULL,
+    processing_run_id INTEGER REFERENCES intake.npi_processing_run(id)
+);
+
+-- Normalized organization names keyed by NPI, refreshed by Step15 for changed NPIs only
+-- and used to resolve organizational subparts to their parent organization
+CREATE TABLE IF NOT EXISTS intake.normalized_org_name (
+    npi BIGINT PRIMARY KEY,
+    legal_business_name TEXT,
+    parent_organization_lbn TEXT,
+    is_organization_subpart VARCHAR(1),
+    normalized_legal_name TEXT NOT NULL,
+    normalized_parent_name TEXT NOT NULL,
+    processing_run_id INTEGER REFERENCES intake.npi_processing_run(id)
+);
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_npi_processing_run_date ON intake.npi_processing_run(run_date);
 CREATE INDEX IF NOT EXISTS idx_npi_change_log_npi ON intake.npi_change_log(npi);
@@ -59,3 +81,4 @@ CREATE INDEX IF NOT EXISTS idx_npi_change_log_run ON intake.npi_change_log(proce
 CREATE INDEX IF NOT EXISTS idx_npi_change_log_type ON intake.npi_change_log(change_type);
 CREATE INDEX IF NOT EXISTS idx_individual_change_log_npi ON intake.individual_change_log(npi);
 CREATE INDEX IF NOT EXISTS idx_parent_relationship_change_log_child ON intake.parent_relationship_change_log(child_npi);
+CREATE INDEX IF NOT EXISTS idx_normalized_org_name_parent_candidates ON intake.normalized_org_name(normalized_legal_name) WHERE is_organization_subpart = 'N';
@@ -25,3 +25,17 @@ CREATE TABLE intake.staging_phone (
     -- Unique constraint to prevent duplicate processing of same raw phone from same source
     CONSTRAINT uc_staging_phone_raw_source UNIQUE (raw_phone, source_file, is_fax_in_source)
 );
+
+-- Persistent cache of raw phone -> E.164 parse results, reused across monthly NPPES runs.
+-- Keyed by the phonenumbers release so a library upgrade invalidates older results.
+CREATE TABLE IF NOT EXISTS intake.phone_normalization_cache (
+    raw_phone          TEXT NOT NULL,                -- phone text handed to the parser, extension already removed
+    default_country    VARCHAR(2) NOT NULL,
+    metadata_version   VARCHAR(20) NOT NULL,         -- phonenumbers.__version__ that produced the result
+    phone_e164         VARCHAR(20),
+    country_code       VARCHAR(4),
+    is_normalized_success BOOLEAN NOT NULL,
+    error_message      TEXT,
+    cached_at          TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (raw_phone, default_country, metadata_version)
+);
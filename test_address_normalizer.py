@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that AddressNormalizer maps spelling variants of the
+same address onto one canonical form, and that the distinct-value shortcut
+gives the same answer as canonicalizing every row.
+"""
+
+import pandas as pd
+
+from AddressNormalizer import AddressNormalizer
+
+
+def _address_frame(rows):
+    """Build a raw_address_import shaped frame from (line_1, line_2, city, state, postal_code, country_code) rows"""
+    return pd.DataFrame(rows, columns=['address_line_1', 'address_line_2', 'city', 'state', 'postal_code', 'country_code'])
+
+
+def test_street_line_variants_share_one_form():
+    """Suffixes, directionals, unit designators and punctuation are standardized"""
+    lines = pd.Series([
+        '123 Main St.',
+        '123 MAIN STREET',
+        '123  main   street ',
+        '100 North Park Avenue, Suite #200',
+        '100 N PARK AVE STE 200',
+        'P.O. Box 12',
+        'Post Office Box 12',
+        '',
+        None,
+    ])
+    canonical = AddressNormalizer.canonicalize_street_lines(lines).tolist()
+    assert canonical[:3] == ['123 MAIN ST'] * 3
+    assert canonical[3] == canonical[4] == '100 N PARK AVE STE 200'
+    assert canonical[5] == canonical[6] == 'PO BOX 12'
+    assert pd.isna(canonical[7]) and pd.isna(canonical[8])
+
+
+def test_words_are_only_abbreviated_in_their_usps_position():
+    """Street names that happen to be suffix, directional or unit words keep them, and decimal points stay"""
+    lines = pd.Series([
+        '100 Front Street',
+        '5 Upper Valley Road',
+        '10 Office Park Drive',
+        '100 South Street',
+        '200 Main Street North, Floor 3',
+        '1.5 Mile Road',
+        '15 Mile Road',
+    ])
+    assert AddressNormalizer.canonicalize_street_lines(lines).tolist() == [
+        '100 FRONT ST',
+        '5 UPPER VALLEY RD',
+        '10 OFFICE PARK DR',
+        '100 SOUTH ST',
+        '200 MAIN ST N FL 3',
+        '1.5 MILE RD',
+        '15 MILE RD',
+    ]
+
+
+def test_postal_codes_drop_plus_four_for_us_only():
+    """US ZIP+4 becomes the 5 digit ZIP; foreign postal codes keep their digits and letters"""
+    address_df = _address_frame([
+        ('1 A ST', None, 'Boston', 'MA', '021391234', 'US'),
+        ('1 A ST', None, 'Boston', 'MA', '02139-1234', None),
+        ('1 A ST', None, 'Toronto', 'ON', 'm5v 2t6', 'ca'),
+    ])
+    canonical_df = AddressNormalizer.canonicalize_frame(address_df)
+    assert canonical_df['postal_code'].tolist() == ['02139', '02139', 'M5V 2T6']
+    assert canonical_df['country_code'].tolist() == ['US', 'US', 'CA']
+
+
+def test_distinct_shortcut_matches_row_by_row():
+    """Canonicalizing distinct values and broadcasting back equals canonicalizing each row alone"""
+    lines = pd.Series(['12 West Elm Road', None, '12 west elm rd.', '12 West Elm Road', 'Floor 3'] * 20)
+    broadcast = AddressNormalizer.canonicalize_street_lines(lines)
+    one_by_one = [AddressNormalizer.canonicalize_street_lines(pd.Series([line])).iloc[0] for line in lines]
+    assert [None if pd.isna(value) else value for value in broadcast] == \
+        [None if pd.isna(value) else value for value in one_by_one]
+
+
+def test_benchmark_reports_distinct_reduction():
+    """Variants of one address count once after canonicalization"""
+    address_df = _address_frame([
+        ('123 Main St.', None, 'Boston', 'MA', '021391234', 'US'),
+        ('123 MAIN STREET', '', 'BOSTON ', 'ma', '02139', None),
+        ('9 Oak Lane', 'Apartment 4', 'Salem', 'MA', '01970', 'US'),
+    ])
+    result = AddressNormalizer.benchmark(address_df)
+    assert result['rows'] == 3
+    assert result['distinct_before'] == 3
+    assert result['distinct_after'] == 2
+
+
+def main():
+    """Run all tests"""
+    print("Testing AddressNormalizer...")
+    print("=" * 50)
+
+    test_street_line_variants_share_one_form()
+    print("✓ street line variants share one canonical form")
+
+    test_words_are_only_abbreviated_in_their_usps_position()
+    print("✓ words are only abbreviated in their USPS position")
+
+    test_postal_codes_drop_plus_four_for_us_only()
+    print("✓ US ZIP+4 is truncated, foreign postal codes are kept")
+
+    test_distinct_shortcut_matches_row_by_row()
+    print("✓ distinct-value canonicalization matches row by row")
+
+    test_benchmark_reports_distinct_reduction()
+    print("✓ benchmark reports the distinct-address reduction")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that ColumnTypeConverter batches every pending
+conversion into one ALTER TABLE and skips columns that are already typed.
+"""
+
+from ColumnTypeConverter import ColumnTypeConverter
+
+
+class _FakeDBTable:
+    """Stand-in for plainerflow's DBTable, which renders as schema.table"""
+
+    def __init__(self, schema, table):
+        self.schema = schema
+        self.table = table
+
+    def __str__(self):
+        return f"{self.schema}.{self.table}"
+
+
+DATE_TYPE = {'type': 'DATE', 'format': 'MM/DD/YYYY'}
+CONVERSIONS = {
+    'npi': {'type': 'BIGINT'},
+    'replacement_npi': {'type': 'BIGINT'},
+    'last_update_date': DATE_TYPE,
+    'certification_date': DATE_TYPE,
+}
+
+
+def test_pending_conversions_skip_typed_and_missing_columns():
+    """Only columns that exist and are not yet the target type are converted"""
+    column_types = {
+        'npi': 'BIGINT',
+        'replacement_npi': 'VARCHAR(11)',
+        'last_update_date': 'VARCHAR(10)',
+    }
+    pending = ColumnTypeConverter.pending_conversions(column_types, CONVERSIONS)
+    assert list(pending) == ['replacement_npi', 'last_update_date']
+    assert ColumnTypeConverter.pending_conversions({'npi': 'BIGINT'}, {'npi': {'type': 'BIGINT'}}) == {}
+
+
+def test_alter_column_types_sql_is_one_statement():
+    """Every pending column goes into the same ALTER TABLE"""
+    pending = {'npi': {'type': 'BIGINT'}, 'last_update_date': DATE_TYPE}
+    alter_sql = ColumnTypeConverter.alter_column_types_sql(_FakeDBTable('nppes_raw', 'main_file'), pending)
+
+    assert alter_sql.count('ALTER TABLE') == 1
+    assert alter_sql.count(';') == 1
+    assert 'ALTER TABLE nppes_raw.main_file' in alter_sql
+    assert 'ALTER COLUMN "npi" TYPE BIGINT USING NULLIF("npi", \'\')::BIGINT' in alter_sql
+    assert ('ALTER COLUMN "last_update_date" TYPE DATE '
+            'USING to_date(NULLIF("last_update_date", \'\'), \'MM/DD/YYYY\')') in alter_sql
+
+
+def main():
+    """Run all tests"""
+    print("Testing ColumnTypeConverter...")
+    print("=" * 50)
+
+    test_pending_conversions_skip_typed_and_missing_columns()
+    print("✓ typed and missing columns are skipped")
+
+    test_alter_column_types_sql_is_one_statement()
+    print("✓ pending conversions share one ALTER TABLE")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
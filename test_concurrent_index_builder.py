@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that ConcurrentIndexBuilder groups index steps by
+table, keeps plan order within a table, and rewrites statements for
+CREATE INDEX CONCURRENTLY.
+"""
+
+from collections import OrderedDict
+
+from ConcurrentIndexBuilder import ConcurrentIndexBuilder
+
+
+PLAN = OrderedDict([
+    ('01_create_npi_primary_index', 'CREATE INDEX IF NOT EXISTS idx_npi_npi ON ndh.npi(npi);'),
+    ('06_create_individual_names_index', 'CREATE INDEX IF NOT EXISTS idx_individual_names ON ndh.individual(last_name, first_name);'),
+    ('02_create_npi_entity_type_index', 'CREATE INDEX IF NOT EXISTS idx_npi_entity_type ON ndh.npi(entity_type_code);'),
+    ('99_analyze', 'ANALYZE ndh.npi;'),
+])
+
+
+def test_group_by_table_keeps_plan_order():
+    """Steps on the same table share a group; other statements get their own"""
+    groups = ConcurrentIndexBuilder.group_by_table(PLAN)
+    assert list(groups) == ['ndh.npi', 'ndh.individual', '99_analyze']
+    assert [key for key, _ in groups['ndh.npi']] == ['01_create_npi_primary_index', '02_create_npi_entity_type_index']
+
+
+def test_with_concurrently():
+    """CONCURRENTLY goes right after INDEX, and is never added twice"""
+    assert ConcurrentIndexBuilder.with_concurrently(PLAN['01_create_npi_primary_index']) == \
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_npi_npi ON ndh.npi(npi);'
+    assert ConcurrentIndexBuilder.with_concurrently('CREATE UNIQUE INDEX idx_a ON intake.a(npi);') == \
+        'CREATE UNIQUE INDEX CONCURRENTLY idx_a ON intake.a(npi);'
+    already = 'CREATE INDEX CONCURRENTLY idx_a ON intake.a(npi);'
+    assert ConcurrentIndexBuilder.with_concurrently(already) == already
+    assert ConcurrentIndexBuilder.with_concurrently('ANALYZE ndh.npi;') == 'ANALYZE ndh.npi;'
+
+
+def test_session_settings_sql():
+    """Each build session sets its own memory and parallel worker limits"""
+    builder = ConcurrentIndexBuilder(engine=None, maintenance_work_mem='2GB', max_parallel_maintenance_workers=3)
+    assert builder.session_settings_sql() == \
+        "SET maintenance_work_mem = '2GB'; SET max_parallel_maintenance_workers = 3;"
+
+
+def main():
+    """Run all tests"""
+    print("Testing ConcurrentIndexBuilder...")
+    print("=" * 50)
+
+    test_group_by_table_keeps_plan_order()
+    print("✓ index steps are grouped by table in plan order")
+
+    test_with_concurrently()
+    print("✓ statements are rewritten for CREATE INDEX CONCURRENTLY")
+
+    test_session_settings_sql()
+    print("✓ session settings carry memory and parallel worker limits")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that DeltaSnapshot keys rows on row_hash when a
+table has one, that a delta's count diff reproduces the current rows even
+with duplicates, that applying checks the row count, and that snapshot
+chains and the latest snapshot are resolved from the manifests.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+
+from DeltaSnapshot import DeltaSnapshot
+
+
+def test_hash_expression():
+    """Step07's row_hash is used when present, otherwise the whole row is hashed"""
+    assert DeltaSnapshot.hash_expression(['npi', 'row_hash'], 't') == 't.row_hash'
+    assert DeltaSnapshot.hash_expression(['npi', 'provider_name'], 't') == 'MD5(t::TEXT)'
+    assert DeltaSnapshot.column_list(['npi', 'Provider Name']) == '"npi", "Provider Name"'
+
+
+def _changed_hashes(base_hashes, current_hashes):
+    """Run changed_hash_sql over in-memory hash lists; SQLite stands in for PostgreSQL's temp tables"""
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TEMP TABLE base_hash (row_hash TEXT)")
+    connection.execute("CREATE TEMP TABLE current_hash (row_hash TEXT)")
+    connection.executemany("INSERT INTO base_hash VALUES (?)", [(row_hash,) for row_hash in base_hashes])
+    connection.executemany("INSERT INTO current_hash VALUES (?)", [(row_hash,) for row_hash in current_hashes])
+    connection.executescript(DeltaSnapshot.changed_hash_sql().replace('ON COMMIT DROP', ''))
+    changed = {row[0]: (row[1], row[2]) for row in connection.execute("SELECT * FROM changed_hash")}
+    connection.close()
+    return changed
+
+
+def test_count_diff_with_duplicate_rows():
+    """Deleting changed hashes and reloading their current rows turns the base into the current rows"""
+    base_rows = ['a', 'a', 'b', 'c', 'c', 'c', 'd']
+    current_rows = ['a', 'b', 'b', 'c', 'c', 'c', 'e']
+    changed = _changed_hashes(base_rows, current_rows)
+    assert changed == {'a': (2, 1), 'b': (1, 2), 'd': (1, None), 'e': (None, 1)}
+
+    deleted = {row_hash for row_hash, (base_count, _) in changed.items() if base_count is not None}
+    rewritten = {row_hash for row_hash, (_, current_count) in changed.items() if current_count is not None}
+    applied_rows = [row for row in base_rows if row not in deleted] + [row for row in current_rows if row in rewritten]
+    assert Counter(applied_rows) == Counter(current_rows)
+    assert _changed_hashes(current_rows, current_rows) == {}
+
+
+class _FakeCursor:
+    """Records statements and reads COPY FROM STDIN files, answering COUNT(*) with a fixed row count"""
+
+    def __init__(self, row_count):
+        self.row_count = row_count
+        self.statements = []
+        self.loaded = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(' '.join(statement.split()))
+
+    def copy_expert(self, copy_sql, f):
+        self.statements.append(copy_sql)
+        self.loaded.append(f.read())
+        self.rowcount = self.loaded[-1].count(b'\n')
+
+    def fetchone(self):
+        return (self.row_count,)
+
+
+class _FakeConnection:
+    def __init__(self, row_count):
+        self.cursor_ = _FakeCursor(row_count)
+        self.committed = False
+        self.rolled_back = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def test_apply_delta_table():
+    """A delta deletes its changed hashes, loads their rows and only commits at the expected row count"""
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        files = DeltaSnapshot.file_names('nppes_raw', 'main_file')
+        with gzip.open(os.path.join(snapshot_dir, files['deleted']), 'wb') as f:
+            f.write(b'hash_a\n')
+        with gzip.open(os.path.join(snapshot_dir, files['rows']), 'wb') as f:
+            f.write(b'1\thash_b\n')
+        table_manifest = {'columns': ['npi', 'row_hash'], 'row_count': 3, 'files': files}
+
+        connection = _FakeConnection(row_count=3)
+        assert DeltaSnapshot.apply_table(connection, snapshot_dir, 'nppes_raw', 'main_file', table_manifest, is_base=False) == 3
+        statements = connection.cursor_.statements
+        assert any(statement.startswith('DELETE FROM "nppes_raw"."main_file" AS t WHERE t.row_hash IN')
+                   for statement in statements)
+        assert statements[-2] == 'COPY "nppes_raw"."main_file" ("npi", "row_hash") FROM STDIN'
+        assert connection.cursor_.loaded == [b'hash_a\n', b'1\thash_b\n']
+        assert connection.committed
+
+        connection = _FakeConnection(row_count=4)
+        try:
+            DeltaSnapshot.apply_table(connection, snapshot_dir, 'nppes_raw', 'main_file', table_manifest, is_base=False)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a row count that differs from the manifest should raise ValueError")
+        assert connection.rolled_back and not connection.committed
+
+
+def test_snapshot_chain():
+    """Deltas are applied after their parents, starting from the base"""
+    with tempfile.TemporaryDirectory() as snapshot_root:
+        for label, parent in [('2025_06', None), ('2025_07', '2025_06'), ('2025_08', '2025_07')]:
+            snapshot_dir = os.path.join(snapshot_root, label)
+            os.makedirs(snapshot_dir)
+            DeltaSnapshot.write_manifest(snapshot_dir, label, parent, {})
+        chain = DeltaSnapshot.snapshot_chain(snapshot_root, '2025_08')
+        assert [manifest['label'] for manifest in chain] == ['2025_06', '2025_07', '2025_08']
+        assert [manifest['kind'] for manifest in chain] == ['base', 'delta', 'delta']
+    assert DeltaSnapshot.latest_label(os.path.join(snapshot_root, 'missing')) is None
+
+
+def test_latest_label():
+    """The latest snapshot is the one created last, not the one whose label sorts last"""
+    with tempfile.TemporaryDirectory() as snapshot_root:
+        for label, created_at in [('2025_06', '2025-07-02T09:00:00'), ('rerun_2025_07', '2025-08-03T09:00:00'),
+                                  ('2025_07', '2025-08-01T09:00:00')]:
+            snapshot_dir = os.path.join(snapshot_root, label)
+            os.makedirs(snapshot_dir)
+            manifest_path = DeltaSnapshot.write_manifest(snapshot_dir, label, None, {})
+            manifest = DeltaSnapshot.read_manifest(snapshot_dir)
+            manifest['created_at'] = created_at
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f)
+        assert DeltaSnapshot.latest_label(snapshot_root) == 'rerun_2025_07'
+
+
+def main():
+    """Run all tests"""
+    print("Testing DeltaSnapshot...")
+    print("=" * 50)
+
+    test_hash_expression()
+    print("✓ rows are keyed on row_hash or the whole row")
+
+    test_count_diff_with_duplicate_rows()
+    print("✓ count diffs reproduce the current rows with duplicates")
+
+    test_apply_delta_table()
+    print("✓ deltas apply their deletes and rows and check the row count")
+
+    test_snapshot_chain()
+    print("✓ snapshot chains resolve from the base")
+
+    test_latest_label()
+    print("✓ the latest snapshot is the one created last")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that IndexAnalyzer flags left-prefix and
+unique-covered indexes, never suggests constraint-backing indexes, and
+estimates the index writes saved by its suggestions.
+"""
+
+from IndexAnalyzer import IndexAnalyzer
+
+
+def _index(index_name, key_columns, table_name='individual', schema_name='ndh', is_unique=False,
+           is_constraint=False, predicate=None, idx_scan=10, index_writes=1000):
+    """One row shaped like IndexAnalyzer.fetch_indexes output"""
+    return {
+        'schema_name': schema_name, 'table_name': table_name, 'index_name': index_name,
+        'access_method': 'btree', 'is_unique': is_unique, 'is_constraint': is_constraint,
+        'key_columns': key_columns, 'predicate': predicate, 'index_bytes': 8192,
+        'idx_scan': idx_scan, 'index_writes': index_writes, 'index_definition': '',
+    }
+
+
+INDEXES = [
+    _index('idx_individual_last_name', ['last_name']),
+    _index('idx_individual_names', ['last_name', 'first_name']),
+    _index('idx_individual_full_name', ['last_name', 'first_name', 'middle_name']),
+    _index('idx_individual_complete_name', ['last_name', 'first_name', 'middle_name', 'name_prefix', 'name_suffix']),
+    _index('individual_pkey', ['id'], is_unique=True, is_constraint=True, idx_scan=0),
+    _index('main_file_npi_key', ['npi'], table_name='main_file', schema_name='nppes_raw', is_unique=True),
+    _index('idx_main_file_npi_entity', ['npi', 'entity_type_code'], table_name='main_file', schema_name='nppes_raw'),
+    _index('idx_main_file_deactivated', ['npi'], table_name='main_file', schema_name='nppes_raw',
+           predicate='(npi_deactivation_date IS NOT NULL)', idx_scan=0),
+]
+
+
+def test_left_prefix_chain_is_flagged():
+    """Each name index is covered by the next longer one; the longest is kept"""
+    flagged = [finding['index']['index_name'] for finding in IndexAnalyzer.find_prefix_redundant(INDEXES)]
+    assert flagged == ['idx_individual_last_name', 'idx_individual_names', 'idx_individual_full_name']
+
+
+def test_exact_duplicates_keep_one():
+    """Of two identical indexes only one is suggested"""
+    duplicates = [_index('idx_b', ['npi']), _index('idx_a', ['npi'])]
+    flagged = [finding['index']['index_name'] for finding in IndexAnalyzer.find_prefix_redundant(duplicates)]
+    assert flagged == ['idx_b']
+
+
+def test_unique_covered_and_unused():
+    """A composite index led by a unique key is flagged; constraint indexes never are"""
+    covered = IndexAnalyzer.find_unique_covered(INDEXES)
+    assert [finding['index']['index_name'] for finding in covered] == ['idx_main_file_npi_entity']
+    unused = IndexAnalyzer.find_unused(INDEXES)
+    assert [finding['index']['index_name'] for finding in unused] == ['idx_main_file_deactivated']
+
+
+def test_suggested_drops_and_write_savings():
+    """Drops are merged across findings and the saved index writes are summed per table"""
+    drops = IndexAnalyzer.suggested_drops(
+        IndexAnalyzer.find_prefix_redundant(INDEXES), IndexAnalyzer.find_unique_covered(INDEXES)
+    )
+    assert len(drops) == 4
+    tables = {table['table']: table for table in IndexAnalyzer.write_amplification(INDEXES, drops)}
+    assert tables['ndh.individual']['index_count'] == 5
+    assert tables['ndh.individual']['index_count_after'] == 2
+    assert tables['ndh.individual']['index_writes_saved'] == 3000
+    statements = IndexAnalyzer.drop_statements(drops)
+    assert statements[0].endswith('DROP INDEX CONCURRENTLY IF EXISTS ndh.idx_individual_full_name;')
+
+
+def main():
+    """Run all tests"""
+    print("Testing IndexAnalyzer...")
+    print("=" * 50)
+
+    test_left_prefix_chain_is_flagged()
+    print("✓ left-prefix chains are flagged")
+
+    test_exact_duplicates_keep_one()
+    print("✓ exact duplicates keep one index")
+
+    test_unique_covered_and_unused()
+    print("✓ unique-covered and never-scanned indexes are found")
+
+    test_suggested_drops_and_write_savings()
+    print("✓ suggested drops merge findings and estimate write savings")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that ParallelCSVLoader splits a CSV only on record
+boundaries, so that quoted fields containing newlines stay in one piece.
+"""
+
+import csv
+import io
+import os
+import tempfile
+
+import xxhash
+
+from ParallelCSVLoader import ParallelCSVLoader, _ByteRangeReader, _RowHashingReader
+
+
+def _write_sample_csv(path, rows):
+    """Write a header plus rows, with some quoted fields that contain newlines and doubled quotes"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(['npi', 'name', 'note'])
+        for i in range(rows):
+            note = f'line one\nline "two" for {i}' if i % 3 == 0 else f'plain {i}'
+            writer.writerow([str(1000000000 + i), f'Provider, {i}', note])
+
+
+def _read_ranges(path, byte_ranges):
+    """Parse every byte range on its own and concatenate the records"""
+    records = []
+    for start, end in byte_ranges:
+        reader = _ByteRangeReader(path, start, end)
+        text = reader.read().decode('utf-8')
+        reader.close()
+        records.extend(csv.reader(io.StringIO(text, newline='')))
+    return records
+
+
+def test_ranges_cover_every_record_exactly_once():
+    """Parsing the pieces separately must give the same records as parsing the whole file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'sample.csv')
+        _write_sample_csv(path, 500)
+        with open(path, newline='', encoding='utf-8') as f:
+            expected = list(csv.reader(f))[1:]
+
+        for pieces in (1, 2, 7, 64):
+            byte_ranges = ParallelCSVLoader.find_record_boundaries(path, pieces)
+            assert byte_ranges[-1][1] == os.path.getsize(path)
+            assert all(a[1] == b[0] for a, b in zip(byte_ranges, byte_ranges[1:]))
+            assert _read_ranges(path, byte_ranges) == expected, pieces
+
+
+def test_ranges_with_small_read_blocks():
+    """Boundaries that fall across read block edges must still respect quote state"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'sample.csv')
+        _write_sample_csv(path, 200)
+        with open(path, newline='', encoding='utf-8') as f:
+            expected = list(csv.reader(f))[1:]
+
+        original_block_size = ParallelCSVLoader.READ_BLOCK_SIZE
+        ParallelCSVLoader.READ_BLOCK_SIZE = 13
+        try:
+            byte_ranges = ParallelCSVLoader.find_record_boundaries(path, 9)
+        finally:
+            ParallelCSVLoader.READ_BLOCK_SIZE = original_block_size
+        assert len(byte_ranges) == 9
+        assert _read_ranges(path, byte_ranges) == expected
+
+
+def test_header_only_file_has_no_ranges():
+    """A CSV with only a header has nothing to load"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'empty.csv')
+        _write_sample_csv(path, 0)
+        assert ParallelCSVLoader.find_record_boundaries(path, 4) == []
+
+
+def test_typed_select_expressions():
+    """Metadata column_types become the same casts the Step05 fixers apply"""
+    assert ParallelCSVLoader.typed_select_expression('entity_type_code', None) == '"entity_type_code"'
+    assert ParallelCSVLoader.typed_select_expression('npi', {'type': 'BIGINT'}) == \
+        'NULLIF("npi", \'\')::BIGINT AS "npi"'
+    assert ParallelCSVLoader.typed_select_expression('last_update_date', {'type': 'DATE', 'format': 'MM/DD/YYYY'}) == \
+        'to_date(NULLIF("last_update_date", \'\'), \'MM/DD/YYYY\') AS "last_update_date"'
+
+
+def test_row_hashing_reader_appends_hash_of_raw_record():
+    """Every record gets the XXH3 hash of its own raw bytes as one extra field"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'sample.csv')
+        _write_sample_csv(path, 300)
+        with open(path, newline='', encoding='utf-8') as f:
+            expected = list(csv.reader(f))[1:]
+
+        byte_ranges = ParallelCSVLoader.find_record_boundaries(path, 3)
+        original_block_size = _RowHashingReader.READ_BLOCK_SIZE
+        _RowHashingReader.READ_BLOCK_SIZE = 17
+        try:
+            hashed_records = []
+            for start, end in byte_ranges:
+                reader = _RowHashingReader(path, start, end)
+                chunks = []
+                while True:
+                    chunk = reader.read(50)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                reader.close()
+                hashed_records.extend(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'), newline='')))
+        finally:
+            _RowHashingReader.READ_BLOCK_SIZE = original_block_size
+
+        assert [record[:-1] for record in hashed_records] == expected
+        for record, hashed_record in zip(expected, hashed_records):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(record)
+            raw_record = buffer.getvalue().rstrip('\r\n').encode('utf-8')
+            assert hashed_record[-1] == xxhash.xxh3_128_hexdigest(raw_record)
+
+
+def main():
+    """Run all tests"""
+    print("Testing ParallelCSVLoader...")
+    print("=" * 50)
+
+    test_ranges_cover_every_record_exactly_once()
+    print("✓ byte ranges cover every record exactly once")
+
+    test_ranges_with_small_read_blocks()
+    print("✓ boundaries respect quotes across read block edges")
+
+    test_header_only_file_has_no_ranges()
+    print("✓ header-only file yields no ranges")
+
+    test_typed_select_expressions()
+    print("✓ metadata column_types become typed casts")
+
+    test_row_hashing_reader_appends_hash_of_raw_record()
+    print("✓ row hashes are appended while the CSV streams")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that ParquetExporter maps PostgreSQL column types
+to Arrow types, builds the COPY statement it streams from, and round-trips
+PostgreSQL's CSV output, including an empty table, through pyarrow.
+"""
+
+import importlib.util
+import tempfile
+from datetime import date, datetime, timezone
+
+import pytest
+
+from ParquetExporter import ParquetExporter
+
+
+COLUMNS = [
+    {'name': 'npi', 'data_type': 'bigint'},
+    {'name': 'entity_type_code', 'data_type': 'smallint'},
+    {'name': 'provider_enumeration_date', 'data_type': 'date'},
+    {'name': 'provider_business_practice_location_address_state_name', 'data_type': 'character varying'},
+]
+
+
+def test_arrow_type_names():
+    """Known types map to Arrow types and everything else stays a string"""
+    assert [ParquetExporter.arrow_type_name(column['data_type']) for column in COLUMNS] == [
+        'int64', 'int16', 'date32', 'string',
+    ]
+    assert ParquetExporter.arrow_type_name('timestamp with time zone') == 'timestamptz'
+    assert ParquetExporter.arrow_type_name('jsonb') == 'string'
+
+
+def test_copy_sql():
+    """Columns are quoted in table order and the optional filter is applied"""
+    copy_sql = ParquetExporter.copy_sql('nppes_raw', 'main_file', COLUMNS[:2], where='entity_type_code = 2')
+    assert copy_sql == (
+        'COPY (SELECT "npi", "entity_type_code" FROM "nppes_raw"."main_file" WHERE entity_type_code = 2) '
+        'TO STDOUT WITH (FORMAT csv)'
+    )
+
+
+class _FakeCursor:
+    """Answers the information_schema query and writes COPY output the way PostgreSQL's CSV format does"""
+
+    def __init__(self, columns, copy_output):
+        self.columns = columns
+        self.copy_output = copy_output
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, parameters=None):
+        pass
+
+    def fetchall(self):
+        return [(column['name'], column['data_type']) for column in self.columns]
+
+    def copy_expert(self, copy_sql, f):
+        f.write(self.copy_output)
+
+
+class _FakeConnection:
+    def __init__(self, columns, copy_output):
+        self.columns = columns
+        self.copy_output = copy_output
+
+    def cursor(self):
+        return _FakeCursor(self.columns, self.copy_output)
+
+    def commit(self):
+        pass
+
+
+ROUND_TRIP_COLUMNS = [
+    {'name': 'npi', 'data_type': 'bigint'},
+    {'name': 'is_sole_proprietor', 'data_type': 'boolean'},
+    {'name': 'provider_enumeration_date', 'data_type': 'date'},
+    {'name': 'imported_at', 'data_type': 'timestamp with time zone'},
+    {'name': 'provider_credential_text', 'data_type': 'text'},
+]
+
+
+def test_round_trip_through_pyarrow():
+    """Booleans, dates and timestamptz convert, NULL stays null and a quoted empty string stays ''"""
+    pyarrow_dataset = pytest.importorskip('pyarrow.dataset')
+    copy_output = (
+        b'1234567890,t,2007-05-24,2025-07-01 12:30:00+00,"M.D."\n'
+        b'1234567891,f,,2025-07-01 12:30:00.5+00,""\n'
+        b'1234567892,,2010-01-02,,\n'
+    )
+    connection = _FakeConnection(ROUND_TRIP_COLUMNS, copy_output)
+    with tempfile.TemporaryDirectory() as output_root:
+        result = ParquetExporter.export_table(connection, 'nppes_raw', 'main_file', output_root)
+        assert result['rows'] == 3 and result['files'] == 1
+        table = pyarrow_dataset.dataset(ParquetExporter.output_dir(output_root, 'nppes_raw', 'main_file')).to_table()
+        assert table.schema == ParquetExporter.arrow_schema(ROUND_TRIP_COLUMNS)
+        assert table.to_pydict() == {
+            'npi': [1234567890, 1234567891, 1234567892],
+            'is_sole_proprietor': [True, False, None],
+            'provider_enumeration_date': [date(2007, 5, 24), None, date(2010, 1, 2)],
+            'imported_at': [datetime(2025, 7, 1, 12, 30, tzinfo=timezone.utc),
+                            datetime(2025, 7, 1, 12, 30, 0, 500000, tzinfo=timezone.utc), None],
+            'provider_credential_text': ['M.D.', '', None],
+        }
+
+
+def test_empty_table_keeps_schema():
+    """An empty table is written as one zero-row file per format, replacing any earlier export"""
+    pyarrow_dataset = pytest.importorskip('pyarrow.dataset')
+    with tempfile.TemporaryDirectory() as output_root:
+        for output_format in ParquetExporter.FORMATS:
+            connection = _FakeConnection(ROUND_TRIP_COLUMNS, b'1234567890,t,2007-05-24,,\n')
+            ParquetExporter.export_table(connection, 'nppes_raw', output_format, output_root,
+                                         output_format=output_format)
+            connection = _FakeConnection(ROUND_TRIP_COLUMNS, b'')
+            result = ParquetExporter.export_table(connection, 'nppes_raw', output_format, output_root,
+                                                  output_format=output_format)
+            assert result['rows'] == 0 and result['files'] == 1
+            destination = ParquetExporter.output_dir(output_root, 'nppes_raw', output_format)
+            table = pyarrow_dataset.dataset(
+                destination, format='parquet' if output_format == 'parquet' else 'ipc'
+            ).to_table()
+            assert table.num_rows == 0
+            assert table.schema == ParquetExporter.arrow_schema(ROUND_TRIP_COLUMNS)
+
+
+def main():
+    """Run all tests"""
+    print("Testing ParquetExporter...")
+    print("=" * 50)
+
+    test_arrow_type_names()
+    print("✓ column types map to Arrow types")
+
+    test_copy_sql()
+    print("✓ COPY statements quote columns and apply filters")
+
+    if importlib.util.find_spec('pyarrow') is None:
+        print("- pyarrow is not installed, skipping the round-trip tests")
+    else:
+        test_round_trip_through_pyarrow()
+        print("✓ COPY output round-trips through pyarrow")
+
+        test_empty_table_keeps_schema()
+        print("✓ empty tables are written with their schema")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that PgArchiveTools builds version-appropriate
+pg_dump compression arguments and restore commands, finds dumps by format,
+reads table data entries from an archive table of contents and works out
+per-table dump durations.
+"""
+
+import os
+import tempfile
+
+from PgArchiveTools import PgArchiveTools
+
+
+TOC_TEXT = """;
+; Archive created at 2025-01-01 00:00:00 UTC
+;
+215; 1259 16402 TABLE nppes_raw main_file postgres
+3456; 0 16402 TABLE DATA nppes_raw main_file postgres
+3457; 0 16410 TABLE DATA nppes_raw othername_file postgres
+3301; 1259 16420 INDEX nppes_raw idx_main_file_npi postgres
+"""
+
+
+def test_compress_arguments():
+    """pg_dump 16+ gets method:level; older versions get a gzip level and reject zstd"""
+    assert PgArchiveTools.compress_arguments('zstd', 3, 16) == ['--compress=zstd:3']
+    assert PgArchiveTools.compress_arguments('gzip', None, 17) == ['--compress=gzip']
+    assert PgArchiveTools.compress_arguments('gzip', 9, 15) == ['--compress=9']
+    assert PgArchiveTools.compress_arguments('none', None, 14) == ['--compress=0']
+    try:
+        PgArchiveTools.compress_arguments('zstd', None, 15)
+        assert False, "zstd should need pg_dump 16"
+    except ValueError:
+        pass
+
+
+def test_dump_command():
+    """Only directory dumps get --jobs and only plain dumps get --clean"""
+    connection_args = PgArchiveTools.connection_arguments('user', 'localhost', 5432)
+    directory = PgArchiveTools.dump_command(connection_args, 'ndh', 'nppes_raw', 'directory', 'out.dir',
+                                            jobs=4, compress_args=['--compress=zstd'])
+    assert directory[-1] == 'ndh' and '--jobs' in directory and '--compress=zstd' in directory
+    assert '--clean' not in directory
+    plain = PgArchiveTools.dump_command(connection_args, 'ndh', 'nppes_raw', 'plain', 'out.pg.sql', jobs=4)
+    assert '--clean' in plain and '--jobs' not in plain
+
+
+def test_table_data_bytes_and_format():
+    """Data files are matched to tables by dump id and archive formats are detected"""
+    with tempfile.TemporaryDirectory() as directory_path:
+        with open(os.path.join(directory_path, 'toc.dat'), 'wb') as f:
+            f.write(b'PGDMP')
+        with open(os.path.join(directory_path, '3456.dat.zst'), 'wb') as f:
+            f.write(b'x' * 100)
+        assert PgArchiveTools.table_data_bytes(directory_path, TOC_TEXT) == {
+            'nppes_raw.main_file': 100,
+            'nppes_raw.othername_file': 0,
+        }
+        assert PgArchiveTools.detect_format(directory_path) == 'directory'
+        assert PgArchiveTools.detect_format(os.path.join(directory_path, 'toc.dat')) == 'custom'
+
+
+def test_restore_command_and_find_archives():
+    """Deferred restores split by section and dumps are found in all three formats"""
+    connection_args = PgArchiveTools.connection_arguments('user', 'localhost', 5432)
+    command = PgArchiveTools.restore_command(connection_args, 'ndh', 'nppes_raw.dir', jobs=4,
+                                             sections=['pre-data', 'data'], is_clean=True)
+    assert command.count('--section') == 2 and '--clean' in command and command[-1] == 'nppes_raw.dir'
+    with tempfile.TemporaryDirectory() as import_dir:
+        os.makedirs(os.path.join(import_dir, 'nppes_raw.dir'))
+        open(os.path.join(import_dir, 'nppes_raw.dir', 'toc.dat'), 'wb').close()
+        with open(os.path.join(import_dir, 'pecos_raw.dump'), 'wb') as f:
+            f.write(b'PGDMP')
+        open(os.path.join(import_dir, 'nucc_raw.pg.sql'), 'w').close()
+        open(os.path.join(import_dir, 'manifest.json'), 'w').close()
+        open(os.path.join(import_dir, 'suggested_index_drops.sql'), 'w').close()
+        assert [(archive['name'], archive['format']) for archive in PgArchiveTools.find_archives(import_dir)] == [
+            ('nppes_raw', 'directory'), ('nucc_raw', 'plain'), ('pecos_raw', 'custom'),
+        ]
+
+
+def test_table_durations():
+    """Parallel dumps end tables at their finished message, serial dumps at the next table"""
+    serial_lines = [
+        (0.0, 'pg_dump: dumping contents of table "nppes_raw.main_file"'),
+        (50.0, 'pg_dump: dumping contents of table "nppes_raw.othername_file"'),
+    ]
+    assert PgArchiveTools.table_durations(serial_lines, 60.0) == {
+        'nppes_raw.main_file': 50.0, 'nppes_raw.othername_file': 10.0,
+    }
+    parallel_lines = serial_lines[:1] + [
+        (1.0, 'pg_dump: dumping contents of table "nppes_raw.othername_file"'),
+        (5.0, 'pg_dump: finished item 3457 TABLE DATA othername_file'),
+        (40.0, 'pg_dump: finished item 3456 TABLE DATA main_file'),
+    ]
+    assert PgArchiveTools.table_durations(parallel_lines, 60.0) == {
+        'nppes_raw.main_file': 40.0, 'nppes_raw.othername_file': 4.0,
+    }
+
+
+def main():
+    """Run all tests"""
+    print("Testing PgArchiveTools...")
+    print("=" * 50)
+
+    test_compress_arguments()
+    print("✓ compression arguments match the pg_dump version")
+
+    test_dump_command()
+    print("✓ pg_dump commands fit the archive format")
+
+    test_table_data_bytes_and_format()
+    print("✓ table data files and archive formats are recognized")
+
+    test_restore_command_and_find_archives()
+    print("✓ restore commands and dump discovery work")
+
+    test_table_durations()
+    print("✓ per-table durations are read from pg_dump progress")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
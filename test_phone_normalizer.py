@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that PhoneNormalizer gives the same answers no matter
+how the work is spread out (single process vs. a pool of worker processes),
+and that the 10 digit fast path agrees with the phonenumbers library.
+"""
+
+import random
+
+import phonenumbers
+
+from PhoneNormalizer import PhoneNormalizer
+from PhoneNormalizationCache import PhoneNormalizationCache
+
+SAMPLE_PHONES = [
+    '4155552671',
+    '(415) 555-2671',
+    '415-555-2671 ext. 123',
+    '415.555.2671 x45',
+    '2025550143 extension 9',
+    ('7035551234', '77'),
+    '+44 20 7946 0958',
+    '0000000000',
+    '12345',
+    'not a phone',
+    '',
+    None,
+]
+
+
+def test_normalize_many_matches_single_record_calls():
+    """normalize_many in-process must match calling normalize_staging_record one at a time"""
+    expected = []
+    for item in SAMPLE_PHONES:
+        raw_phone, raw_extension = item if isinstance(item, tuple) else (item, None)
+        expected.append(PhoneNormalizer.normalize_staging_record(raw_phone, raw_extension))
+
+    assert PhoneNormalizer.normalize_many(SAMPLE_PHONES) == expected
+
+
+def test_normalize_many_pool_matches_single_process():
+    """The process pool must return byte-for-byte the same results, in input order"""
+    phones = SAMPLE_PHONES * 50
+    single_process = PhoneNormalizer.normalize_many(phones, workers=1)
+    pooled = PhoneNormalizer.normalize_many(phones, workers=2, chunksize=7)
+
+    assert repr(pooled) == repr(single_process)
+
+
+# Edge cases around the NANP rules: N11 codes, leading 0/1, toll free, premium, Canada, Caribbean
+NANP_EDGE_CASES = [
+    '4155552671', '2125551212', '4115552671', '4152112671', '0155552671', '1155552671',
+    '4150552671', '4151552671', '8005551234', '8885550000', '9005551234', '6045551234',
+    '2685551234', '7875551234', '5555555555', '9995551234', '2015550123', '3105550000',
+]
+
+
+def _library_normalize(raw_phone):
+    """Reference answer straight from the phonenumbers library, no fast path"""
+    try:
+        parsed_number = phonenumbers.parse(raw_phone, 'US')
+    except phonenumbers.NumberParseException as e:
+        return None, None, False, f"Parse error: {str(e)}"
+    if not phonenumbers.is_valid_number(parsed_number):
+        return None, None, False, "Invalid phone number format"
+    e164_format = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
+    return e164_format, str(parsed_number.country_code), True, None
+
+
+def test_fast_path_parity_on_nanp_edge_cases():
+    """Hand picked NANP edge cases must normalize exactly as the library does"""
+    for raw_phone in NANP_EDGE_CASES:
+        assert PhoneNormalizer._normalize_phone_number(raw_phone) == _library_normalize(raw_phone), raw_phone
+
+
+def test_fast_path_parity_on_random_ten_digit_numbers():
+    """Random 10 digit strings must normalize exactly as the library does"""
+    generator = random.Random(20250608)
+    for _ in range(20000):
+        raw_phone = ''.join(generator.choice('0123456789') for _ in range(10))
+        assert PhoneNormalizer._normalize_phone_number(raw_phone) == _library_normalize(raw_phone), raw_phone
+
+
+def test_fast_path_only_takes_well_formed_numbers():
+    """The fast path handles bare 10 digit US numbers and leaves everything else to the library"""
+    assert PhoneNormalizer._fast_path_e164('4155552671') == '+14155552671'
+    assert PhoneNormalizer._fast_path_e164('(415) 555-2671') is None
+    assert PhoneNormalizer._fast_path_e164('14155552671') is None
+    assert PhoneNormalizer._fast_path_e164('4115552671') is None
+    assert PhoneNormalizer._fast_path_e164('4155552671', default_country='CA') is None
+
+
+def test_path_counts_track_fast_and_slow_hits():
+    """Each normalized number is counted as either a fast path or a slow path hit"""
+    counts_before = PhoneNormalizer.path_counts.copy()
+    PhoneNormalizer.normalize_many(['4155552671', '2125551212', '(415) 555-2671'])
+    counts = PhoneNormalizer.path_counts - counts_before
+    assert counts['fast'] == 2
+    assert counts['slow'] == 1
+
+
+def test_cache_reuses_results_without_reparsing():
+    """A second pass over the same phones is answered entirely from the cache"""
+    cache = PhoneNormalizationCache()
+    first_pass = PhoneNormalizer.normalize_many(SAMPLE_PHONES, cache=cache)
+
+    counts_before = PhoneNormalizer.path_counts.copy()
+    second_pass = PhoneNormalizer.normalize_many(SAMPLE_PHONES, cache=cache)
+    parsed_again = PhoneNormalizer.path_counts - counts_before
+
+    assert second_pass == first_pass == PhoneNormalizer.normalize_many(SAMPLE_PHONES)
+    assert sum(parsed_again.values()) == 0
+    assert cache.metadata_version == phonenumbers.__version__
+
+
+def test_cache_lru_evicts_least_recently_used():
+    """The in-process layer never holds more than lru_size phones"""
+    cache = PhoneNormalizationCache(lru_size=2)
+    cache.put_many({
+        '4155552671': ('+14155552671', '1', True, None),
+        '2125551212': ('+12125551212', '1', True, None),
+    })
+    cache.get_many(['4155552671'])
+    cache.put_many({'2025550143': ('+12025550143', '1', True, None)})
+
+    assert set(cache.get_many(['4155552671', '2125551212', '2025550143'])) == {'4155552671', '2025550143'}
+
+
+def test_cache_copy_fields_keep_nulls_apart_from_empty_strings():
+    """Rows written through COPY load None as NULL and '' as an empty string"""
+    fields = ['415 "555"', None, '', True, False]
+    line = ','.join(PhoneNormalizationCache._copy_csv_field(field) for field in fields)
+    assert line == '"415 ""555""",,"","true","false"'
+
+
+def main():
+    """Run all tests"""
+    print("Testing PhoneNormalizer...")
+    print("=" * 50)
+
+    test_normalize_many_matches_single_record_calls()
+    print("✓ normalize_many matches single record normalization")
+
+    test_normalize_many_pool_matches_single_process()
+    print("✓ pooled normalize_many matches the single-process fallback")
+
+    test_fast_path_parity_on_nanp_edge_cases()
+    print("✓ fast path matches phonenumbers on NANP edge cases")
+
+    test_fast_path_parity_on_random_ten_digit_numbers()
+    print("✓ fast path matches phonenumbers on random 10 digit numbers")
+
+    test_fast_path_only_takes_well_formed_numbers()
+    print("✓ fast path only takes well-formed 10 digit numbers")
+
+    test_path_counts_track_fast_and_slow_hits()
+    print("✓ fast/slow path counters are tracked")
+
+    test_cache_reuses_results_without_reparsing()
+    print("✓ cached results are reused without reparsing")
+
+    test_cache_lru_evicts_least_recently_used()
+    print("✓ cache LRU evicts the least recently used phone")
+
+    test_cache_copy_fields_keep_nulls_apart_from_empty_strings()
+    print("✓ cache COPY rows keep NULLs apart from empty strings")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
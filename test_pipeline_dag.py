@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that PipelineDAG derives dependencies from the
+tables steps read and write, runs independent steps in parallel, skips
+steps whose inputs are unchanged and finds the critical path.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from PipelineDAG import PipelineDAG
+
+
+def _step(name, reads=(), writes=(), after=(), seconds=0.0):
+    """A step whose command sleeps for seconds and records that it ran"""
+    command = [sys.executable, '-c',
+               f"import time; time.sleep({seconds}); open('ran_{name}', 'w').close()"]
+    return {'name': name, 'command': command, 'reads': list(reads), 'writes': list(writes), 'after': list(after)}
+
+
+STEPS = [
+    _step('import_main', writes=['nppes_raw.main_file']),
+    _step('import_pl', writes=['nppes_raw.pl_file']),
+    _step('fix_main', reads=['nppes_raw.main_file'], writes=['nppes_raw.main_file']),
+    _step('core_tables', reads=['nppes_raw.main_file'], writes=['ndh.npi']),
+    _step('addresses', reads=['nppes_raw.main_file', 'nppes_raw.pl_file'], writes=['ndh.address']),
+    _step('reimport_pl', writes=['nppes_raw.pl_file']),
+]
+
+
+def test_dependencies_from_tables():
+    """Readers wait for the last writer, and a later writer waits for earlier readers"""
+    dag = PipelineDAG(STEPS, env={})
+    assert dag.dependencies['import_main'] == set()
+    assert dag.dependencies['fix_main'] == {'import_main'}
+    assert dag.dependencies['core_tables'] == {'fix_main'}
+    assert dag.dependencies['addresses'] == {'fix_main', 'import_pl'}
+    assert dag.dependencies['reimport_pl'] == {'import_pl', 'addresses'}
+    assert dag.with_ancestors(['core_tables']) == ['import_main', 'fix_main', 'core_tables']
+
+
+def test_missing_variables():
+    """Unset ${VAR} references are reported per step"""
+    dag = PipelineDAG([{'name': 'import', 'command': ['csviper', '--table_name=${NPPES_MAIN_TABLE}']}],
+                      env={'NPPES_RAW_SCHEMA': 'nppes_raw'})
+    assert dag.missing_variables(['import']) == {'import': ['NPPES_MAIN_TABLE']}
+
+
+def test_shipped_graph_resolves():
+    """Every ${VAR} in pipeline_graph.json is defined in data_file_locations.env, and NUCC's fix follows its imports"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {}
+    with open(os.path.join(base_dir, 'data_file_locations.env')) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                env[key.strip()] = value.strip()
+    dag = PipelineDAG.load(os.path.join(base_dir, 'pipeline_graph.json'), env)
+    assert dag.missing_variables([step['name'] for step in dag.steps]) == {}
+    assert dag.dependencies['nucc_fix_column_types'] == {
+        'import_nucc_merged', 'import_nucc_sources', 'import_nucc_ancestor',
+    }
+
+
+def test_critical_path():
+    """The longest chain of dependent durations is reported"""
+    dag = PipelineDAG(STEPS, env={})
+    durations = {'import_main': 10.0, 'import_pl': 1.0, 'fix_main': 5.0, 'core_tables': 20.0, 'addresses': 2.0}
+    assert dag.critical_path(durations) == ['import_main', 'fix_main', 'core_tables']
+
+
+def test_run_and_skip():
+    """Independent steps overlap, and a second run skips everything until an input changes"""
+    with tempfile.TemporaryDirectory() as base_dir:
+        input_path = os.path.join(base_dir, 'pl.csv')
+        with open(input_path, 'w') as f:
+            f.write('npi\n1\n')
+        steps = [
+            _step('import_a', writes=['a'], seconds=0.5),
+            _step('import_b', writes=['b'], seconds=0.5),
+            _step('join', reads=['a', 'b'], writes=['c']),
+        ]
+        steps[1]['inputs'] = ['pl.csv']
+        graph_path = os.path.join(base_dir, 'graph.json')
+        with open(graph_path, 'w') as f:
+            json.dump({'steps': steps}, f)
+        state_path = os.path.join(base_dir, 'state.json')
+        log_dir = os.path.join(base_dir, 'logs')
+
+        dag = PipelineDAG.load(graph_path, env={})
+        results = dag.run(['import_a', 'import_b', 'join'], workers=2, state_path=state_path, log_dir=log_dir)
+        assert all(result['status'] == 'ran' for result in results.values())
+        assert abs(results['import_a']['started_at'] - results['import_b']['started_at']) < 0.4
+        assert os.path.exists(os.path.join(base_dir, 'ran_join'))
+
+        results = dag.run(['import_a', 'import_b', 'join'], workers=2, state_path=state_path, log_dir=log_dir)
+        assert all(result['status'] == 'skipped' for result in results.values())
+
+        with open(input_path, 'a') as f:
+            f.write('2\n')
+        results = dag.run(['import_a', 'import_b', 'join'], workers=2, state_path=state_path, log_dir=log_dir)
+        assert {name: result['status'] for name, result in results.items()} == {
+            'import_a': 'skipped', 'import_b': 'ran', 'join': 'ran',
+        }
+
+
+def main():
+    """Run all tests"""
+    print("Testing PipelineDAG...")
+    print("=" * 50)
+
+    test_dependencies_from_tables()
+    print("✓ dependencies follow table reads and writes")
+
+    test_missing_variables()
+    print("✓ unset variables are reported")
+
+    test_shipped_graph_resolves()
+    print("✓ the shipped graph resolves against the shipped env")
+
+    test_critical_path()
+    print("✓ the critical path is found")
+
+    test_run_and_skip()
+    print("✓ steps run in parallel and unchanged steps are skipped")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify how SQLPlanRunner picks resume points and decides
+which steps can be captured with EXPLAIN (ANALYZE, BUFFERS).
+"""
+
+from collections import OrderedDict
+
+from ScratchTables import ScratchTables
+from SQLPlanRunner import SQLPlanRunner
+
+
+PLAN = OrderedDict([
+    ('00a_create_npi_processing_run', 'CREATE TABLE IF NOT EXISTS intake.npi_processing_run (id SERIAL);'),
+    ('01_start_processing_run', 'INSERT INTO intake.npi_processing_run DEFAULT VALUES;'),
+    ('13a_delete_changed_normalized_org_names', 'DELETE FROM intake.normalized_org_name;'),
+    ('13b_insert_changed_normalized_org_names', 'INSERT INTO intake.normalized_org_name SELECT 1;'),
+])
+
+
+def test_steps_before_accepts_keys_and_prefixes():
+    """A step prefix resumes at the first matching key"""
+    assert SQLPlanRunner.steps_before(PLAN, '13b') == list(PLAN)[:3]
+    assert SQLPlanRunner.steps_before(PLAN, '13') == list(PLAN)[:2]
+    assert SQLPlanRunner.steps_before(PLAN, '00a_create_npi_processing_run') == []
+    try:
+        SQLPlanRunner.steps_before(PLAN, '99')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("an unknown step should raise ValueError")
+
+
+def test_explainable_statement():
+    """Only single DML or CREATE TABLE AS statements run under EXPLAIN (ANALYZE)"""
+    assert SQLPlanRunner.explainable_statement("""
+    -- refresh the snapshot
+    INSERT INTO intake.npi_row_hash_snapshot SELECT npi, row_hash FROM nppes_raw.main_file;
+    """) == 'INSERT INTO intake.npi_row_hash_snapshot SELECT npi, row_hash FROM nppes_raw.main_file'
+    assert SQLPlanRunner.explainable_statement('CREATE INDEX idx_a ON intake.a(npi);') is None
+    assert SQLPlanRunner.explainable_statement('SET enable_hashjoin = off; SELECT 1; RESET enable_hashjoin;') is None
+
+
+def test_scratch_table_steps_are_split_for_explain():
+    """A ScratchTables step splits into its statements and only the CREATE TABLE ... AS is explained"""
+    step_sql = "SET enable_hashjoin = off;" + ScratchTables().create_table_as_sql('intake.temp_npi_hash_diff', """
+    SELECT npi, 'CHANGED; or NEW' AS change_type FROM intake.npi_row_hash_snapshot;
+    CREATE INDEX ON intake.temp_npi_hash_diff (npi);
+    """)
+    statements = SQLPlanRunner.split_statements(step_sql)
+    assert [statement.split()[0] for statement in statements] == ['SET', 'DROP', 'CREATE', 'CREATE', 'ANALYZE']
+    explainable = [SQLPlanRunner.explainable_statement(statement) for statement in statements]
+    assert explainable == [None, None, statements[2], None, None]
+    assert statements[2].startswith('CREATE UNLOGGED TABLE intake.temp_npi_hash_diff AS')
+    assert "'CHANGED; or NEW'" in statements[2]
+    assert SQLPlanRunner.split_statements("DO $$ BEGIN PERFORM 1; END $$; ANALYZE ndh.npi;") == [
+        'DO $$ BEGIN PERFORM 1; END $$', 'ANALYZE ndh.npi',
+    ]
+
+
+def test_plan_row_count():
+    """DML row counts come from the input of the ModifyTable node"""
+    insert_plan = [{'Plan': {'Node Type': 'ModifyTable', 'Actual Rows': 0, 'Actual Loops': 1,
+                             'Plans': [{'Node Type': 'Seq Scan', 'Actual Rows': 42, 'Actual Loops': 1}]}}]
+    select_plan = [{'Plan': {'Node Type': 'Seq Scan', 'Actual Rows': 7, 'Actual Loops': 1}}]
+    assert SQLPlanRunner.plan_row_count(insert_plan) == 42
+    assert SQLPlanRunner.plan_row_count(select_plan) == 7
+
+
+def main():
+    """Run all tests"""
+    print("Testing SQLPlanRunner...")
+    print("=" * 50)
+
+    test_steps_before_accepts_keys_and_prefixes()
+    print("✓ resume points accept step keys and prefixes")
+
+    test_explainable_statement()
+    print("✓ only single explainable statements are captured")
+
+    test_scratch_table_steps_are_split_for_explain()
+    print("✓ scratch table steps are split so their CREATE TABLE AS is explained")
+
+    test_plan_row_count()
+    print("✓ row counts are read from EXPLAIN plans")
+
+    print("=" * 50)
+    print("✓ All tests passed!")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())